@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AnalisadorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analisador'
+
+    def ready(self):
+        # Conecta os sinais que invalidam o cache das análises e o que
+        # registra as funções SQL usadas pelo índice de busca
+        from . import busca, cache_analise  # noqa: F401
@@ -0,0 +1,96 @@
+# busca.py (BUSCA TEXTUAL NAS TRANSAÇÕES COM SQLITE FTS5)
+#
+# A tabela virtual `analisador_transacao_busca` (migração 0015) espelha a
+# descrição e a descrição limpa de cada transação, com rowid = id da
+# transação. Triggers no banco a mantêm em dia em INSERT, UPDATE e DELETE,
+# inclusive nos bulk_create e nos DELETEs em cascata, que não disparam sinais.
+#
+# A descrição limpa é calculada pelo próprio SQLite chamando a função Python
+# `descricao_limpa`, registrada em cada conexão aberta. Por isso as triggers só
+# funcionam em conexões do Django (um INSERT pelo cliente sqlite3 falha).
+# Em outros bancos a busca cai para um icontains simples.
+#
+# ATENÇÃO: no SQLite, migrações que recriam a tabela analisador_transacao
+# (AlterField, RemoveField...) apagam as triggers junto com a tabela antiga;
+# elas precisam ser recriadas na mesma migração (ver 0015_transacao_busca).
+
+import re
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .models import Transacao, extrair_descricao_limpa
+
+TABELA_BUSCA = 'analisador_transacao_busca'
+LIMITE_RESULTADOS = 200
+
+# Peso de cada coluna no bm25: descricao, descricao_limpa, usuario.
+# A descrição limpa (nome do pagador/recebedor) pesa mais.
+PESOS_BM25 = (1.0, 2.0, 0.0)
+
+_PALAVRA = re.compile(r'\w+')
+
+
+def registrar_funcoes_sqlite(conexao_sqlite):
+    conexao_sqlite.create_function('descricao_limpa', 1, extrair_descricao_limpa, deterministic=True)
+
+
+@receiver(connection_created)
+def _registrar_funcoes(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        registrar_funcoes_sqlite(connection.connection)
+
+
+def busca_textual_disponivel():
+    return connection.vendor == 'sqlite'
+
+
+def consulta_fts(termo):
+    """
+    Converte o texto digitado em uma consulta FTS5: cada palavra vira um
+    prefixo entre aspas (o usuário não consegue injetar operadores) e todas
+    precisam aparecer. Retorna None se não sobrar nenhuma palavra.
+    """
+    palavras = _PALAVRA.findall(termo or '')
+    if not palavras:
+        return None
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def _ids_por_relevancia(usuario_id, consulta, limite):
+    # O usuário também é um termo da consulta (coluna `usuario` = 'u<id>'):
+    # o FTS cruza as listas de documentos e não pontua transações de outros.
+    sql = (
+        f"SELECT rowid FROM {TABELA_BUSCA} "
+        f"WHERE {TABELA_BUSCA} MATCH %s "
+        f"ORDER BY bm25({TABELA_BUSCA}, %s, %s, %s), rowid DESC "
+        f"LIMIT %s"
+    )
+    parametros = [f'usuario:u{usuario_id} AND ({consulta})', *PESOS_BM25, limite]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def buscar_transacoes(usuario, termo, limite=LIMITE_RESULTADOS):
+    """
+    Busca `termo` em todas as transações do usuário, de todos os extratos.
+    Retorna uma lista de Transacao (com o extrato carregado), da mais
+    relevante para a menos relevante.
+    """
+    if not busca_textual_disponivel():
+        transacoes = Transacao.objects.filter(usuario=usuario)
+        palavras = _PALAVRA.findall(termo or '')
+        if not palavras:
+            return []
+        for palavra in palavras:
+            transacoes = transacoes.filter(descricao__icontains=palavra)
+        return list(transacoes.select_related('extrato').order_by('-data', '-id')[:limite])
+
+    consulta = consulta_fts(termo)
+    if consulta is None:
+        return []
+    ids = _ids_por_relevancia(usuario.id, consulta, limite)
+    encontradas = Transacao.objects.filter(usuario=usuario).select_related('extrato').in_bulk(ids)
+    return [encontradas[i] for i in ids if i in encontradas]
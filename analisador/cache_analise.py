@@ -0,0 +1,145 @@
+# cache_analise.py (CACHE POR USUÁRIO: REGRAS COMPILADAS E CONTEXTO DOS RELATÓRIOS)
+#
+# Usa o cache do Django (settings.CACHES, em disco) e invalidação por
+# VERSÃO: cada usuário tem uma versão das regras e uma dos dados (transações,
+# resumos e extratos). A versão entra na chave, então incrementá-la basta para
+# que as entradas antigas deixem de ser lidas; elas saem sozinhas pelo TTL ou
+# pelo descarte ao passar de MAX_ENTRIES (aleatório no FileBasedCache, não LRU).
+#
+# As versões ficam no próprio cache, que precisa ser compartilhado (ex.:
+# FileBasedCache): só assim a invalidação vale para todos os processos do
+# gunicorn, inclusive a versão dos dados usada pelas exportações. O
+# FileBasedCache não tem incr atômico (é get + set), por isso a versão nova é
+# sempre o relógio gravado com set: dois workers invalidando ao mesmo tempo
+# gravam valores novos, e nenhum dos dois volta a uma versão já usada.
+
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Extrato, Regra, Transacao
+from .motor_regras import compilar_regras
+
+REGRAS = 'regras'
+DADOS = 'dados'
+
+_contadores = Counter()
+_trava_contadores = threading.Lock()
+
+
+def _contar(tipo, resultado):
+    with _trava_contadores:
+        _contadores[(tipo, resultado)] += 1
+
+
+def estatisticas_cache():
+    """Acertos e falhas de cada tipo de entrada, contados neste processo."""
+    with _trava_contadores:
+        copia = dict(_contadores)
+    estatisticas = {}
+    for tipo in ('motor_regras', 'relatorio'):
+        acertos = copia.get((tipo, 'acerto'), 0)
+        falhas = copia.get((tipo, 'falha'), 0)
+        total = acertos + falhas
+        estatisticas[tipo] = {
+            'acertos': acertos,
+            'falhas': falhas,
+            'taxa_acerto': round(acertos / total, 3) if total else None,
+        }
+    return estatisticas
+
+
+def _chave_versao(tipo, usuario_id):
+    return f'analise:versao:{tipo}:{usuario_id}'
+
+
+def versao(tipo, usuario_id):
+    chave = _chave_versao(tipo, usuario_id)
+    valor = cache.get(chave)
+    if valor is None:
+        # Começa do relógio (e não de 1) para que, se a chave da versão for
+        # descartada, entradas antigas com versão baixa não voltem a valer.
+        cache.add(chave, time.time_ns(), timeout=None)
+        valor = cache.get(chave)
+    return valor
+
+
+def _incrementar_versao(tipo, usuario_id):
+    # Não usa incr: o valor novo vem do relógio, então duas invalidações
+    # simultâneas nunca perdem o aumento. O max() só cobre relógio que volta.
+    chave = _chave_versao(tipo, usuario_id)
+    anterior = cache.get(chave) or 0
+    cache.set(chave, max(time.time_ns(), anterior + 1), timeout=None)
+
+
+def invalidar(tipo, usuario_id):
+    """
+    Invalida o cache do usuário. Incrementa já (quem está dentro da mesma
+    transação não pode ler a versão antiga) e de novo no commit (outro request
+    pode ter guardado os dados ainda não confirmados na versão nova).
+    """
+    if usuario_id is None:
+        return
+    _incrementar_versao(tipo, usuario_id)
+    transaction.on_commit(lambda: _incrementar_versao(tipo, usuario_id))
+
+
+def motor_regras_do_usuario(usuario):
+    """Retorna o MotorRegras do usuário, compilando só quando as regras mudaram."""
+    usuario_id = getattr(usuario, 'id', usuario)
+    chave = f'analise:motor_regras:{usuario_id}:v{versao(REGRAS, usuario_id)}'
+    motor = cache.get(chave)
+    if motor is not None:
+        _contar('motor_regras', 'acerto')
+        return motor
+    _contar('motor_regras', 'falha')
+    motor = compilar_regras(Regra.objects.filter(usuario_id=usuario_id))
+    cache.set(chave, motor)
+    return motor
+
+
+def _chave_relatorio(usuario_id, extrato_id, filtros):
+    # Os filtros vêm do usuário: entram como hash para a chave ter tamanho fixo.
+    resumo_filtros = hashlib.sha1(repr(filtros).encode('utf-8')).hexdigest()
+    return f'analise:relatorio:{usuario_id}:{extrato_id}:v{versao(DADOS, usuario_id)}:{resumo_filtros}'
+
+
+def contexto_relatorio_em_cache(usuario_id, extrato_id, filtros, montar_contexto):
+    """
+    Retorna o contexto de pagina_relatorio para (usuário, extrato, filtros),
+    chamando `montar_contexto()` só quando ele não está no cache.
+    """
+    chave = _chave_relatorio(usuario_id, extrato_id, filtros)
+    contexto = cache.get(chave)
+    if contexto is not None:
+        _contar('relatorio', 'acerto')
+        return contexto
+    _contar('relatorio', 'falha')
+    contexto = montar_contexto()
+    cache.set(chave, contexto)
+    return contexto
+
+
+# --- INVALIDAÇÃO POR SINAIS ---
+# Operações em massa (bulk_create, bulk_update, queryset.delete() e os UPDATEs
+# do ResumoExtrato) não disparam sinais e chamam invalidar() diretamente.
+# Não há receptor de post_delete para Transacao de propósito: ele faria o
+# Django carregar e apagar linha a linha as transações de um extrato.
+
+@receiver(post_save, sender=Regra)
+@receiver(post_delete, sender=Regra)
+def _regra_alterada(sender, instance, **kwargs):
+    invalidar(REGRAS, instance.usuario_id)
+
+
+@receiver(post_save, sender=Transacao)
+@receiver(post_save, sender=Extrato)
+@receiver(post_delete, sender=Extrato)
+def _dados_alterados(sender, instance, **kwargs):
+    invalidar(DADOS, instance.usuario_id)
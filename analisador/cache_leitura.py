@@ -0,0 +1,120 @@
+# cache_leitura.py (CACHE EM DISCO DOS ARQUIVOS JÁ LIDOS)
+#
+# Quem refaz uma conciliação costuma reenviar o mesmo extrato e os mesmos
+# CSVs. O DataFrame padronizado de cada arquivo fica gravado em
+# DIRETORIO_CACHE_LEITURA com a chave (tipo, hash do conteúdo, versão dos
+# leitores): um reenvio idêntico pula a leitura e vai direto para a
+# conciliação. O hash é calculado enquanto o upload é gravado em disco
+# (tarefas.salvar_uploads), sem reler o arquivo.
+#
+# VERSAO_LEITORES precisa ser incrementada sempre que a saída de algum leitor
+# mudar (colunas, tipos, limpeza das descrições): as entradas antigas deixam
+# de ser encontradas e saem pelo limite de tamanho.
+#
+# Formato: Parquet (colunar, pyarrow está no requirements.txt). Se o pyarrow
+# não estiver instalado o cache continua funcionando em pickle.
+# O tamanho total é limitado a LIMITE_CACHE_LEITURA_MB, descartando primeiro
+# os arquivos usados há mais tempo (a data de modificação é atualizada a cada
+# leitura).
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    FORMATO = 'parquet'
+except ImportError:
+    FORMATO = 'pkl'
+
+VERSAO_LEITORES = 2
+
+_trava_limite = threading.Lock()
+
+
+def novo_hash():
+    return hashlib.sha256()
+
+
+def hash_do_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """Hash de um arquivo já salvo (para tarefas criadas antes do hash no upload)."""
+    resumo = novo_hash()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def _diretorio():
+    diretorio = Path(getattr(settings, 'DIRETORIO_CACHE_LEITURA', Path(settings.BASE_DIR) / 'cache_leitura'))
+    diretorio.mkdir(parents=True, exist_ok=True)
+    return diretorio
+
+
+def _caminho(tipo, hash_conteudo):
+    return _diretorio() / f'{tipo}_{hash_conteudo}_v{VERSAO_LEITORES}.{FORMATO}'
+
+
+def ler(tipo, hash_conteudo):
+    """DataFrame em cache para o arquivo, ou None."""
+    caminho = _caminho(tipo, hash_conteudo)
+    try:
+        if FORMATO == 'parquet':
+            df = pd.read_parquet(caminho)
+        else:
+            df = pd.read_pickle(caminho)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Arquivo corrompido ou de outra versão do pandas: descarta e lê de novo.
+        logger.debug("Cache de leitura inválido (%s): %s", caminho.name, e)
+        caminho.unlink(missing_ok=True)
+        return None
+    try:
+        os.utime(caminho)
+    except FileNotFoundError:
+        pass
+    return df
+
+
+def gravar(tipo, hash_conteudo, df):
+    destino = _caminho(tipo, hash_conteudo)
+    descritor, temporario = tempfile.mkstemp(dir=destino.parent, prefix='.tmp_', suffix=destino.suffix)
+    os.close(descritor)
+    try:
+        if FORMATO == 'parquet':
+            df.to_parquet(temporario)
+        else:
+            df.to_pickle(temporario)
+        os.replace(temporario, destino)
+    finally:
+        Path(temporario).unlink(missing_ok=True)
+    aplicar_limite()
+
+
+def aplicar_limite(limite_bytes=None):
+    """Apaga os arquivos usados há mais tempo até o cache caber no limite."""
+    if limite_bytes is None:
+        limite_bytes = getattr(settings, 'LIMITE_CACHE_LEITURA_MB', 512) * 1024 * 1024
+    with _trava_limite:
+        arquivos = []
+        for caminho in _diretorio().glob(f'*.{FORMATO}'):
+            try:
+                estado = caminho.stat()
+            except FileNotFoundError:
+                continue
+            arquivos.append((estado.st_mtime, estado.st_size, caminho))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos, key=lambda item: item[0]):
+            if total <= limite_bytes:
+                break
+            caminho.unlink(missing_ok=True)
+            total -= tamanho
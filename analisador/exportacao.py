@@ -0,0 +1,245 @@
+# exportacao.py (EXPORTAÇÃO CSV / XLSX DE EXTRATOS E CONCILIAÇÕES)
+#
+# O CSV é gerado linha a linha a partir de QuerySet.iterator() e enviado com
+# StreamingHttpResponse; o XLSX usa o modo write-only do openpyxl, que grava
+# as linhas em arquivo temporário em vez de montar a planilha na memória.
+# Nos dois casos a memória não cresce com o número de linhas.
+#
+# Cada exportação fica gravada em DIRETORIO_EXPORTACOES com a versão dos
+# dados na chave (a mesma do cache das análises, cache_analise.DADOS): um
+# novo download do mesmo extrato sem alterações é só o envio do arquivo.
+
+import csv
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import openpyxl
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+
+from .cache_analise import DADOS, versao
+from .models import LinhaConciliacao, Transacao
+
+logger = logging.getLogger(__name__)
+
+CSV = 'csv'
+XLSX = 'xlsx'
+FORMATOS = (CSV, XLSX)
+
+TIPOS_CONTEUDO = {
+    CSV: 'text/csv; charset=utf-8',
+    XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (cabeçalho, função que extrai o valor da linha)
+COLUNAS_TRANSACAO = [
+    ('Data', lambda t: t.data),
+    ('Descrição', lambda t: t.descricao),
+    ('Valor', lambda t: t.valor),
+    ('Tópico', lambda t: t.topico),
+    ('Subtópico', lambda t: t.subtopico),
+    ('Origem', lambda t: t.origem_descricao or ''),
+    ('Categorização Manual', lambda t: 'Sim' if t.categorizacao_manual else 'Não'),
+]
+
+COLUNAS_LINHA_CONCILIACAO = [
+    ('Seção', lambda l: l.get_secao_display()),
+    ('Tipo', lambda l: l.tipo),
+    ('Data', lambda l: l.data),
+    ('Valor', lambda l: l.valor),
+    ('Descrição no Banco', lambda l: l.descricao_banco),
+    ('Data no Relatório', lambda l: l.data_relatorio),
+    ('Valor no Relatório', lambda l: l.valor_relatorio),
+    ('Descrição no Relatório', lambda l: l.descricao_relatorio),
+    ('Fornecedor', lambda l: l.fornecedor),
+    ('Desvio (dias)', lambda l: l.desvio_dias),
+    ('Desvio (valor)', lambda l: l.desvio_valor),
+]
+
+
+class Eco:
+    """Arquivo de mentira para o csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_csv(valor):
+    # Formato que o Excel em português abre direto: data dd/mm/aaaa e vírgula decimal
+    if valor is None:
+        return ''
+    if hasattr(valor, 'strftime'):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, (int, float)) or hasattr(valor, 'as_tuple'):
+        return str(valor).replace('.', ',')
+    return valor
+
+
+def _tamanho_bloco():
+    return getattr(settings, 'TAMANHO_LOTE_TRANSACOES', 1000)
+
+
+def linhas_csv(queryset, colunas):
+    """
+    Gera o CSV (separado por ';', com BOM para o Excel). O primeiro item é o
+    cabeçalho; depois vem um pedaço de texto a cada bloco de linhas lidas.
+    """
+    escritor = csv.writer(Eco(), delimiter=';')
+    tamanho_bloco = _tamanho_bloco()
+    yield '\ufeff' + escritor.writerow([cabecalho for cabecalho, _ in colunas])
+    bloco = []
+    for objeto in queryset.iterator(chunk_size=tamanho_bloco):
+        bloco.append(escritor.writerow([_valor_csv(extrair(objeto)) for _, extrair in colunas]))
+        if len(bloco) == tamanho_bloco:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def gravar_xlsx(caminho, planilhas):
+    """
+    Grava um XLSX em modo write-only. `planilhas` é uma lista de
+    (título, queryset, colunas); cada uma vira uma aba.
+    """
+    pasta = openpyxl.Workbook(write_only=True)
+    for titulo, queryset, colunas in planilhas:
+        aba = pasta.create_sheet(title=titulo[:31])
+        aba.append([cabecalho for cabecalho, _ in colunas])
+        for objeto in queryset.iterator(chunk_size=_tamanho_bloco()):
+            aba.append([extrair(objeto) for _, extrair in colunas])
+    pasta.save(caminho)
+
+
+# --- CACHE EM DISCO ---
+
+def _diretorio_exportacoes():
+    diretorio = Path(getattr(settings, 'DIRETORIO_EXPORTACOES', Path(settings.BASE_DIR) / 'exportacoes'))
+    diretorio.mkdir(parents=True, exist_ok=True)
+    return diretorio
+
+
+def _caminho_em_cache(prefixo, versao_dados, formato):
+    return _diretorio_exportacoes() / f'{prefixo}_v{versao_dados}.{formato}'
+
+
+def _descartar_versoes_antigas(prefixo, atual):
+    for antigo in _diretorio_exportacoes().glob(f'{prefixo}_v*'):
+        if antigo.name != atual.name and antigo.suffix == atual.suffix:
+            antigo.unlink(missing_ok=True)
+
+
+def _arquivo_temporario(destino):
+    descritor, caminho = tempfile.mkstemp(dir=destino.parent, prefix='.tmp_', suffix=destino.suffix)
+    os.close(descritor)
+    return caminho
+
+
+def _csv_gravando_em_cache(linhas, destino, prefixo):
+    """
+    Repassa as linhas do CSV para a resposta e, ao mesmo tempo, grava no
+    arquivo de cache. Se o download for interrompido o arquivo parcial é
+    descartado; o rename só acontece com o CSV completo.
+    """
+    temporario = _arquivo_temporario(destino)
+    completo = False
+    try:
+        with open(temporario, 'w', encoding='utf-8', newline='') as arquivo:
+            for linha in linhas:
+                arquivo.write(linha)
+                yield linha
+        os.replace(temporario, destino)
+        completo = True
+        _descartar_versoes_antigas(prefixo, destino)
+    finally:
+        if not completo:
+            Path(temporario).unlink(missing_ok=True)
+
+
+def _resposta_do_arquivo(caminho, formato, nome_download):
+    return FileResponse(
+        open(caminho, 'rb'), as_attachment=True, filename=nome_download, content_type=TIPOS_CONTEUDO[formato]
+    )
+
+
+def exportar(prefixo, versao_dados, formato, nome_download, planilhas):
+    """
+    Resposta de download de `planilhas` ([(título, queryset, colunas)]).
+    Usa o arquivo em cache se ele existir para a versão atual dos dados.
+    No CSV as planilhas são concatenadas (as colunas são as da primeira).
+    """
+    destino = _caminho_em_cache(prefixo, versao_dados, formato)
+    if destino.exists():
+        logger.debug("Exportação %s servida do cache.", destino.name)
+        return _resposta_do_arquivo(destino, formato, nome_download)
+
+    if formato == CSV:
+        colunas = planilhas[0][2]
+
+        def todas_as_linhas():
+            for indice, (_, queryset, _) in enumerate(planilhas):
+                linhas = linhas_csv(queryset, colunas)
+                if indice:
+                    next(linhas)  # cabeçalho só uma vez
+                yield from linhas
+
+        resposta = StreamingHttpResponse(
+            _csv_gravando_em_cache(todas_as_linhas(), destino, prefixo), content_type=TIPOS_CONTEUDO[CSV]
+        )
+        resposta['Content-Disposition'] = f'attachment; filename="{nome_download}"'
+        return resposta
+
+    temporario = _arquivo_temporario(destino)
+    try:
+        gravar_xlsx(temporario, planilhas)
+        os.replace(temporario, destino)
+    finally:
+        Path(temporario).unlink(missing_ok=True)
+    _descartar_versoes_antigas(prefixo, destino)
+    return _resposta_do_arquivo(destino, formato, nome_download)
+
+
+def descartar_exportacoes(prefixo):
+    """Apaga do disco as exportações (todas as versões) com o prefixo dado."""
+    for arquivo in _diretorio_exportacoes().glob(f'{prefixo}_*'):
+        arquivo.unlink(missing_ok=True)
+
+
+def prefixo_extrato(extrato):
+    return f'extrato_{extrato.usuario_id}_{extrato.id}'
+
+
+def prefixo_conciliacao(relatorio):
+    return f'conciliacao_{relatorio.usuario_id}_{relatorio.id}'
+
+
+def exportar_extrato(extrato, formato):
+    transacoes = Transacao.objects.filter(extrato=extrato).order_by('data', 'id')
+    return exportar(
+        prefixo=prefixo_extrato(extrato),
+        versao_dados=versao(DADOS, extrato.usuario_id),
+        formato=formato,
+        nome_download=f'extrato_{extrato.id}.{formato}',
+        planilhas=[('Transações', transacoes, COLUNAS_TRANSACAO)],
+    )
+
+
+def exportar_conciliacao(relatorio, secoes, formato):
+    """
+    `secoes` é uma lista de (valor de LinhaConciliacao.secao, título).
+    A conciliação não muda depois de gerada, então a chave é só o id.
+    """
+    planilhas = [
+        (titulo, LinhaConciliacao.objects.filter(relatorio=relatorio, secao=secao).order_by('data', 'id'), COLUNAS_LINHA_CONCILIACAO)
+        for secao, titulo in secoes
+    ]
+    nome_secoes = '_'.join(secao for secao, _ in secoes)
+    return exportar(
+        prefixo=f'{prefixo_conciliacao(relatorio)}_{nome_secoes}',
+        versao_dados=0,
+        formato=formato,
+        nome_download=f'conciliacao_{relatorio.id}.{formato}',
+        planilhas=planilhas,
+    )
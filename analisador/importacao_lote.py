@@ -0,0 +1,271 @@
+# importacao_lote.py (IMPORTAÇÃO DE VÁRIOS MESES DE UMA VEZ, A PARTIR DE UM ZIP)
+#
+# O ZIP pode trazer extratos (.html do Sicoob, .xlsx da Caixa/Sicoob) e
+# relatórios CSV do "Seu Condomínio" de vários meses, em qualquer pasta.
+# Roda como tarefa em segundo plano (tarefas.py, tipo 'importacao_lote'):
+#
+#   1. extrai os arquivos para o diretório da tarefa (só o nome de cada um,
+#      nunca o caminho de dentro do ZIP), calculando o hash do conteúdo;
+#   2. lê todos em paralelo com leitura_paralela, aproveitando o cache_leitura;
+#   3. descobre o mês de cada arquivo pelas datas dos lançamentos (o mês mais
+#      frequente) ou, sem datas, pelo nome do arquivo;
+#   4. por mês, em uma transação: cria o Extrato com as transações (ou, no modo
+#      incremental, acrescenta as linhas novas ao Extrato já importado do mês)
+#      e, se houver relatórios do mesmo mês, concilia e grava o RelatorioConciliacao.
+#
+# Um arquivo com problema não impede os outros; cada um tem sua linha no
+# resumo devolvido como resultado da tarefa.
+
+import logging
+import re
+import shutil
+import time
+import zipfile
+from collections import defaultdict
+from pathlib import Path, PurePosixPath
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.utils.text import get_valid_filename
+
+from . import cache_leitura, leitura_paralela
+from .models import Extrato
+from .motor_analise import (
+    categorizar_extrato, colunas_para_conciliacao, conciliar_dataframes, ler_arquivos_com_cache,
+    salvar_relatorio_conciliacao, salvar_transacoes_em_lote,
+)
+from .perfil import estagio
+
+logger = logging.getLogger(__name__)
+
+MESES = [
+    'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro',
+]
+
+EXTENSOES = {
+    '.html': leitura_paralela.EXTRATO,
+    '.xlsx': leitura_paralela.EXTRATO,
+    '.csv': leitura_paralela.RELATORIO,
+}
+
+# Situação de cada arquivo no resumo
+IMPORTADO = 'importado'
+SEM_EXTRATO = 'sem_extrato'
+IGNORADO = 'ignorado'
+ERRO = 'erro'
+
+_ANO_MES = re.compile(r'(20\d\d)[-_. ]?(0[1-9]|1[0-2])(?!\d)')
+_MES_ANO = re.compile(r'(?<!\d)(0?[1-9]|1[0-2])[-_. ](20\d\d)')
+
+
+def nome_do_mes(ano, mes):
+    return f"{MESES[mes - 1]}/{ano}"
+
+
+def _mes_pelo_nome(nome):
+    """Mês a partir do nome do arquivo: '2025-07', '07_2025', 'julho 2025'..."""
+    nome = nome.lower()
+    for indice, mes in enumerate(MESES, start=1):
+        encontrado = re.search(rf'{mes.lower()}\D{{0,3}}(20\d\d)', nome)
+        if encontrado:
+            return nome_do_mes(int(encontrado.group(1)), indice)
+    encontrado = _ANO_MES.search(nome)
+    if encontrado:
+        return nome_do_mes(int(encontrado.group(1)), int(encontrado.group(2)))
+    encontrado = _MES_ANO.search(nome)
+    if encontrado:
+        return nome_do_mes(int(encontrado.group(2)), int(encontrado.group(1)))
+    return None
+
+
+def inferir_mes(df, nome):
+    """Mês de referência do arquivo: o mês mais frequente nas datas ou, sem datas, o do nome."""
+    if df is not None and 'Data' in df.columns:
+        datas = pd.to_datetime(df['Data'], errors='coerce').dropna()
+        if len(datas):
+            periodo = datas.dt.to_period('M').mode().iloc[0]
+            return nome_do_mes(periodo.year, periodo.month)
+    return _mes_pelo_nome(nome)
+
+
+def _membros_validos(z):
+    """Membros do ZIP que são arquivos de verdade (sem pastas e metadados do macOS)."""
+    for item in z.infolist():
+        caminho = PurePosixPath(item.filename)
+        if item.is_dir() or '__MACOSX' in caminho.parts or caminho.name.startswith('.'):
+            continue
+        yield item
+
+
+def extrair_zip(caminho_zip, diretorio):
+    """
+    Extrai os arquivos do ZIP para `diretorio` e retorna uma lista de dicts
+    (nome, tipo, caminho, hash). Arquivos de extensão desconhecida vêm com
+    tipo None. Recusa ZIPs com arquivos demais ou grandes demais descompactados.
+    O tamanho declarado no cabeçalho do ZIP pode ser falso: o limite vale para
+    os bytes realmente gravados, e ao passar dele `diretorio` é apagado.
+    """
+    limite_arquivos = getattr(settings, 'LIMITE_ARQUIVOS_LOTE', 100)
+    limite_bytes = getattr(settings, 'LIMITE_TAMANHO_LOTE_MB', 500) * 1024 * 1024
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+
+    try:
+        z = zipfile.ZipFile(caminho_zip)
+    except zipfile.BadZipFile:
+        raise ValueError("O arquivo enviado não é um ZIP válido.")
+    arquivos = []
+    gravados = 0
+    try:
+        with z:
+            membros = list(_membros_validos(z))
+            if len(membros) > limite_arquivos:
+                raise ValueError(f"O ZIP tem {len(membros)} arquivos; o limite é {limite_arquivos}.")
+            if sum(item.file_size for item in membros) > limite_bytes:
+                raise ValueError(f"O conteúdo do ZIP passa de {limite_bytes // (1024 * 1024)} MB.")
+
+            for i, item in enumerate(membros):
+                nome = PurePosixPath(item.filename).name
+                tipo = EXTENSOES.get(PurePosixPath(nome).suffix.lower())
+                arquivo = {'nome': nome, 'tipo': tipo, 'caminho': None, 'hash': None}
+                arquivos.append(arquivo)
+                if tipo is None:
+                    continue
+                destino = diretorio / f"{i:03d}_{get_valid_filename(nome)}"
+                resumo = cache_leitura.novo_hash()
+                with z.open(item) as origem, open(destino, 'wb') as saida:
+                    for bloco in iter(lambda: origem.read(1024 * 1024), b''):
+                        gravados += len(bloco)
+                        if gravados > limite_bytes:
+                            raise ValueError(f"O conteúdo do ZIP passa de {limite_bytes // (1024 * 1024)} MB.")
+                        resumo.update(bloco)
+                        saida.write(bloco)
+                arquivo['caminho'] = str(destino)
+                arquivo['hash'] = resumo.hexdigest()
+    except zipfile.BadZipFile as e:
+        shutil.rmtree(diretorio, ignore_errors=True)
+        raise ValueError(f"O ZIP está corrompido: {e}")
+    except BaseException:
+        # Não deixa arquivos extraídos pela metade ocupando o disco
+        shutil.rmtree(diretorio, ignore_errors=True)
+        raise
+    return arquivos
+
+
+def _importar_mes(usuario, mes, extratos, relatorios, tolerancia_dias, tolerancia_valor, incremental=False):
+    """
+    Grava o mês em uma transação: um Extrato por extrato do mês e, se houver
+    relatórios, a conciliação do primeiro extrato com todos eles juntos.
+    No modo incremental, os extratos do mês vão para o Extrato mais recente
+    já importado com o mesmo mês (ou um novo), e só as linhas que ele ainda
+    não tem são gravadas.
+    """
+    with transaction.atomic():
+        extrato_do_mes = None
+        if incremental:
+            extrato_do_mes = Extrato.objects.filter(usuario=usuario, mes_referencia=mes).order_by('-data_upload').first()
+        for arquivo in extratos:
+            df = categorizar_extrato(arquivo['df'], usuario)
+            extrato = extrato_do_mes or Extrato.objects.create(usuario=usuario, mes_referencia=mes)
+            gravadas = salvar_transacoes_em_lote(df, extrato, usuario, incremental=incremental)
+            arquivo.update(situacao=IMPORTADO, extrato_id=extrato.id)
+            if incremental:
+                extrato_do_mes = extrato
+                arquivo['mensagem'] = f'{gravadas} lançamento(s) novo(s), {len(df) - gravadas} já importado(s).'
+
+        if relatorios and extratos:
+            df_banco = colunas_para_conciliacao(extratos[0]['df'])
+            df_relatorio = pd.concat([arquivo['df'] for arquivo in relatorios], ignore_index=True)
+            conciliadas, apenas_banco, apenas_relatorio = conciliar_dataframes(
+                df_banco, df_relatorio, tolerancia_dias=tolerancia_dias, tolerancia_valor=tolerancia_valor
+            )
+            relatorio = salvar_relatorio_conciliacao(usuario, mes, conciliadas, apenas_banco, apenas_relatorio)
+            for arquivo in relatorios:
+                arquivo.update(situacao=IMPORTADO, relatorio_id=relatorio.id)
+            extratos[0]['relatorio_id'] = relatorio.id
+
+
+def _linha_do_resumo(arquivo):
+    return {
+        'arquivo': arquivo['nome'],
+        'tipo': arquivo['tipo'],
+        'mes': arquivo.get('mes'),
+        'linhas': arquivo.get('linhas'),
+        'situacao': arquivo['situacao'],
+        'mensagem': arquivo.get('mensagem', ''),
+        'extrato_id': arquivo.get('extrato_id'),
+        'relatorio_id': arquivo.get('relatorio_id'),
+    }
+
+
+def importar_lote(usuario, caminho_zip, diretorio, tolerancia_dias=0, tolerancia_valor=0, incremental=False,
+                  progresso=None):
+    """
+    Importa todos os extratos e relatórios do ZIP. Retorna o resumo: uma
+    linha por arquivo, os totais e a vazão em arquivos por minuto.
+    `incremental` atualiza os extratos já importados dos mesmos meses em vez
+    de criar novos (ver _importar_mes).
+    """
+    progresso = progresso or (lambda etapa, percentual: None)
+    inicio = time.perf_counter()
+
+    progresso('Extraindo o ZIP', 2)
+    with estagio('extrair_zip') as registro:
+        arquivos = extrair_zip(caminho_zip, diretorio)
+        registro.linhas = len(arquivos)
+    for arquivo in arquivos:
+        if arquivo['tipo'] is None:
+            arquivo.update(situacao=IGNORADO, mensagem='Extensão não suportada (use .html, .xlsx ou .csv).')
+    legiveis = [arquivo for arquivo in arquivos if arquivo['tipo'] is not None]
+    if not legiveis:
+        raise ValueError("O ZIP não contém extratos (.html/.xlsx) nem relatórios (.csv).")
+
+    progresso('Lendo os arquivos', 5)
+    resultados = ler_arquivos_com_cache(
+        [(arquivo['tipo'], arquivo['caminho']) for arquivo in legiveis],
+        [arquivo['hash'] for arquivo in legiveis],
+        progresso,
+    )
+
+    # Agrupa por mês: {mês: {tipo: [arquivos]}}, na ordem do ZIP
+    por_mes = defaultdict(lambda: defaultdict(list))
+    for arquivo, (df, erro) in zip(legiveis, resultados):
+        if erro:
+            arquivo.update(situacao=ERRO, mensagem=erro)
+            continue
+        arquivo.update(df=df, linhas=len(df), mes=inferir_mes(df, arquivo['nome']))
+        if arquivo['mes'] is None:
+            arquivo.update(situacao=ERRO, mensagem='Não foi possível descobrir o mês (arquivo sem datas).')
+            continue
+        por_mes[arquivo['mes']][arquivo['tipo']].append(arquivo)
+
+    for indice, (mes, grupos) in enumerate(por_mes.items()):
+        progresso(f'Gravando {mes}', 70 + 28 * indice // len(por_mes))
+        extratos = grupos[leitura_paralela.EXTRATO]
+        relatorios = grupos[leitura_paralela.RELATORIO]
+        try:
+            _importar_mes(usuario, mes, extratos, relatorios, tolerancia_dias, tolerancia_valor, incremental)
+        except Exception as e:
+            logger.exception("Erro ao importar %s", mes)
+            for arquivo in extratos + relatorios:
+                arquivo.update(situacao=ERRO, mensagem=str(e), extrato_id=None, relatorio_id=None)
+            continue
+        if not extratos:
+            for arquivo in relatorios:
+                arquivo.update(situacao=SEM_EXTRATO, mensagem=f'Nenhum extrato de {mes} no ZIP para conciliar.')
+        elif len(extratos) > 1 and relatorios:
+            for arquivo in extratos[1:]:
+                aviso = f'A conciliação de {mes} usou {extratos[0]["nome"]}.'
+                arquivo['mensagem'] = ' '.join(filter(None, [arquivo.get('mensagem'), aviso]))
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'arquivos': [_linha_do_resumo(arquivo) for arquivo in arquivos],
+        'extratos': sum(1 for arquivo in arquivos if arquivo.get('extrato_id')),
+        'conciliacoes': len({arquivo['relatorio_id'] for arquivo in arquivos if arquivo.get('relatorio_id')}),
+        'erros': sum(1 for arquivo in arquivos if arquivo['situacao'] == ERRO),
+        'segundos': round(segundos, 2),
+        'arquivos_por_minuto': round(len(legiveis) * 60 / segundos, 1) if segundos else None,
+    }
@@ -0,0 +1,105 @@
+# leitura_paralela.py (LEITURA DOS ARQUIVOS EM VÁRIOS PROCESSOS)
+#
+# A leitura dos extratos/relatórios é CPU pura (pandas, parser HTML, openpyxl)
+# e não libera o GIL, então threads não ajudam: cada arquivo vai para um
+# processo do ProcessPoolExecutor. O pool é criado uma vez por processo do
+# Django e reaproveitado, para não pagar a inicialização a cada upload.
+#
+# Este módulo não importa motor_analise no topo: com o contexto 'spawn' os
+# processos filhos precisam rodar django.setup() antes de importar os models.
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+EXTRATO = 'extrato'
+RELATORIO = 'relatorio'
+
+_pool = None
+_trava_pool = threading.Lock()
+
+
+def _inicializar_processo():
+    import django
+    django.setup()
+
+
+def _ler_arquivo(tipo, caminho):
+    """Roda dentro do processo filho: lê um arquivo salvo em disco."""
+    from .motor_analise import ler_extrato_bancario, _processar_relatorio_seu_condominio_csv
+
+    with open(caminho, 'rb') as arquivo:
+        if tipo == EXTRATO:
+            return ler_extrato_bancario(arquivo)
+        return _processar_relatorio_seu_condominio_csv(arquivo)
+
+
+def quantidade_processos():
+    return getattr(settings, 'PROCESSOS_LEITURA', None) or os.cpu_count() or 1
+
+
+def _obter_pool():
+    global _pool
+    with _trava_pool:
+        if _pool is None:
+            # 'spawn' porque o pool é criado a partir de threads (tarefas.py);
+            # fork em processo com threads pode herdar travas seguradas.
+            contexto = multiprocessing.get_context(getattr(settings, 'PROCESSOS_LEITURA_CONTEXTO', 'spawn'))
+            _pool = ProcessPoolExecutor(
+                max_workers=quantidade_processos(),
+                mp_context=contexto,
+                initializer=_inicializar_processo,
+            )
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _trava_pool:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def ler_arquivos(arquivos, progresso=None):
+    """
+    Lê uma lista de (tipo, caminho) e retorna uma lista de (DataFrame, erro) na
+    MESMA ordem da entrada, independente da ordem em que os processos terminam.
+    Um arquivo com problema não derruba os outros: seu erro vem na posição dele.
+    `progresso(lidos, total)` é chamado a cada arquivo concluído.
+    """
+    resultados = [None] * len(arquivos)
+
+    if len(arquivos) <= 1 or quantidade_processos() <= 1:
+        # Sem ganho em paralelizar: lê no próprio processo.
+        for i, (tipo, caminho) in enumerate(arquivos):
+            try:
+                resultados[i] = (_ler_arquivo(tipo, caminho), None)
+            except Exception as e:
+                resultados[i] = (None, str(e))
+            if progresso:
+                progresso(i + 1, len(arquivos))
+        return resultados
+
+    pool = _obter_pool()
+    try:
+        futuros = {pool.submit(_ler_arquivo, tipo, caminho): i for i, (tipo, caminho) in enumerate(arquivos)}
+        for lidos, futuro in enumerate(as_completed(futuros), start=1):
+            i = futuros[futuro]
+            try:
+                resultados[i] = (futuro.result(), None)
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                resultados[i] = (None, str(e))
+            if progresso:
+                progresso(lidos, len(arquivos))
+    except BrokenProcessPool:
+        # Um processo filho morreu (ex.: falta de memória); o próximo upload cria outro pool.
+        _descartar_pool()
+        raise ValueError("Um processo de leitura foi encerrado inesperadamente. Tente novamente.")
+    return resultados
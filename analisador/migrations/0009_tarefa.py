@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0008_relatorioconciliacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('etapa', models.CharField(blank=True, default='', max_length=100)),
+                ('progresso', models.PositiveSmallIntegerField(default=0)),
+                ('parametros', models.JSONField(default=dict)),
+                ('resultado', models.JSONField(default=dict)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'data_criacao'], name='analisador__status_785cf9_idx')],
+            },
+        ),
+    ]
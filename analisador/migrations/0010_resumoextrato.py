@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def preencher_resumos(apps, schema_editor):
+    """Calcula o resumo dos extratos que já existem (uma agregação por extrato)."""
+    Transacao = apps.get_model('analisador', 'Transacao')
+    ResumoExtrato = apps.get_model('analisador', 'ResumoExtrato')
+
+    linhas = (
+        Transacao.objects.filter(extrato__isnull=False)
+        .values('extrato_id', 'topico', 'subtopico')
+        .annotate(quantidade=Count('id'), total=Sum('valor'))
+    )
+    ResumoExtrato.objects.bulk_create(
+        [ResumoExtrato(**linha) for linha in linhas.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0009_tarefa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoExtrato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topico', models.CharField(max_length=50)),
+                ('subtopico', models.CharField(max_length=100)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('extrato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos', to='analisador.extrato')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('extrato', 'topico', 'subtopico'), name='resumo_unico_por_categoria')],
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def _converter_data(texto):
+    """'2025-07-01', '2025-07-01 00:00:00' (Timestamp gravado como texto) ou '01/07/2025'."""
+    texto = (texto or '').strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto[:10], formato).date()
+        except ValueError:
+            pass
+    return None
+
+
+def copiar_datas(apps, schema_editor):
+    Transacao = apps.get_model('analisador', 'Transacao')
+    lote = []
+    for transacao in Transacao.objects.only('id', 'data').iterator(chunk_size=2000):
+        transacao.data_nova = _converter_data(transacao.data)
+        lote.append(transacao)
+        if len(lote) >= 2000:
+            Transacao.objects.bulk_update(lote, ['data_nova'])
+            lote = []
+    if lote:
+        Transacao.objects.bulk_update(lote, ['data_nova'])
+
+
+def copiar_datas_de_volta(apps, schema_editor):
+    Transacao = apps.get_model('analisador', 'Transacao')
+    lote = []
+    for transacao in Transacao.objects.only('id', 'data_nova').iterator(chunk_size=2000):
+        transacao.data = transacao.data_nova.isoformat() if transacao.data_nova else ''
+        lote.append(transacao)
+        if len(lote) >= 2000:
+            Transacao.objects.bulk_update(lote, ['data'])
+            lote = []
+    if lote:
+        Transacao.objects.bulk_update(lote, ['data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0010_resumoextrato'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transacao',
+            name='data_nova',
+            field=models.DateField(null=True, blank=True),
+        ),
+        migrations.RunPython(copiar_datas, copiar_datas_de_volta),
+        # Default só para a volta da migração conseguir recriar a coluna antiga
+        migrations.AlterField(
+            model_name='transacao',
+            name='data',
+            field=models.CharField(max_length=20, default=''),
+        ),
+        migrations.RemoveField(
+            model_name='transacao',
+            name='data',
+        ),
+        migrations.RenameField(
+            model_name='transacao',
+            old_name='data_nova',
+            new_name='data',
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['extrato', 'data'], name='transacao_extrato_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['usuario', 'data'], name='transacao_usuario_data_idx'),
+        ),
+    ]
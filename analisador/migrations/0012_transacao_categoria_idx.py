@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0011_transacao_data_datefield'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['usuario', 'extrato', 'topico', 'subtopico'], name='transacao_categoria_idx'),
+        ),
+    ]
@@ -0,0 +1,141 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:09
+
+import django.db.models.deletion
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+# Cópia da lista usada na época para marcar destaques (não importar do app:
+# a migração precisa continuar igual se a lista mudar).
+PALAVRAS_DESTAQUE = [
+    "taxa de condomínio", "taxas de condomínio", "arrec extra", "juros por atraso",
+    "multa por atraso", "consumo de gás", "(-) tarifas de recebimentos",
+    "(-) descontos nas cobranças", "fundo de reserva", "fundo reserva", "tar pix", "TAXA DE CONDOMÍNIO JUNHO/2025"
+]
+
+# seção -> campo JSON antigo
+SECOES = {
+    'conciliada': 'conciliadas',
+    'apenas_banco': 'apenas_banco',
+    'apenas_relatorio': 'apenas_relatorio',
+}
+
+
+def _data(texto):
+    try:
+        return datetime.strptime(str(texto)[:10], '%Y-%m-%d').date() if texto else None
+    except ValueError:
+        return None
+
+
+def _decimal(valor):
+    if valor is None or valor == '':
+        return None
+    try:
+        return Decimal(str(valor)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor)
+
+
+def _destaque(descricao):
+    if not isinstance(descricao, str):
+        return False
+    desc_lower = descricao.lower().strip()
+    return any(palavra in desc_lower for palavra in PALAVRAS_DESTAQUE)
+
+
+def copiar_linhas_do_json(apps, schema_editor):
+    RelatorioConciliacao = apps.get_model('analisador', 'RelatorioConciliacao')
+    LinhaConciliacao = apps.get_model('analisador', 'LinhaConciliacao')
+
+    for relatorio in RelatorioConciliacao.objects.iterator():
+        linhas = []
+        for secao, campo in SECOES.items():
+            for item in getattr(relatorio, campo) or []:
+                linhas.append(LinhaConciliacao(
+                    relatorio=relatorio,
+                    secao=secao,
+                    tipo=_texto(item.get('Tipo')),
+                    data=_data(item.get('Data')),
+                    valor=_decimal(item.get('Valor')),
+                    descricao_banco=_texto(item.get('Descricao_banco')),
+                    data_relatorio=_data(item.get('Data_relatorio')),
+                    valor_relatorio=_decimal(item.get('Valor_relatorio')),
+                    descricao_relatorio=_texto(item.get('Descricao_relatorio')),
+                    fornecedor=_texto(item.get('Fornecedor')),
+                    desvio_dias=item.get('Desvio_dias'),
+                    desvio_valor=_decimal(item.get('Desvio_valor')),
+                    # O extrato do banco nunca era destacado, só o lado do relatório
+                    destaque=secao != 'apenas_banco' and _destaque(item.get('Descricao_relatorio')),
+                ))
+        LinhaConciliacao.objects.bulk_create(linhas, batch_size=1000)
+
+
+def copiar_linhas_para_o_json(apps, schema_editor):
+    RelatorioConciliacao = apps.get_model('analisador', 'RelatorioConciliacao')
+    LinhaConciliacao = apps.get_model('analisador', 'LinhaConciliacao')
+
+    for relatorio in RelatorioConciliacao.objects.iterator():
+        listas = {campo: [] for campo in SECOES.values()}
+        for linha in LinhaConciliacao.objects.filter(relatorio=relatorio).order_by('data', 'id'):
+            listas[SECOES[linha.secao]].append({
+                'Data': linha.data.isoformat() if linha.data else None,
+                'Valor': float(linha.valor) if linha.valor is not None else None,
+                'Tipo': linha.tipo,
+                'Descricao_banco': linha.descricao_banco or None,
+                'Descricao_relatorio': linha.descricao_relatorio or None,
+                'Fornecedor': linha.fornecedor or None,
+            })
+        for campo, lista in listas.items():
+            setattr(relatorio, campo, lista)
+        relatorio.save(update_fields=list(listas))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0012_transacao_categoria_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinhaConciliacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('secao', models.CharField(choices=[('conciliada', 'Conciliada'), ('apenas_banco', 'Apenas no banco'), ('apenas_relatorio', 'Apenas no relatório')], max_length=20)),
+                ('tipo', models.CharField(blank=True, default='', max_length=20)),
+                ('data', models.DateField(blank=True, null=True)),
+                ('valor', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('descricao_banco', models.TextField(blank=True, default='')),
+                ('data_relatorio', models.DateField(blank=True, null=True)),
+                ('valor_relatorio', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('descricao_relatorio', models.TextField(blank=True, default='')),
+                ('fornecedor', models.TextField(blank=True, default='')),
+                ('desvio_dias', models.IntegerField(blank=True, null=True)),
+                ('desvio_valor', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('destaque', models.BooleanField(default=False)),
+                ('relatorio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='linhas', to='analisador.relatorioconciliacao')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['relatorio', 'secao', 'data'], name='linha_conc_secao_data_idx')],
+            },
+        ),
+        migrations.RunPython(copiar_linhas_do_json, copiar_linhas_para_o_json),
+        migrations.RemoveField(
+            model_name='relatorioconciliacao',
+            name='apenas_banco',
+        ),
+        migrations.RemoveField(
+            model_name='relatorioconciliacao',
+            name='apenas_relatorio',
+        ),
+        migrations.RemoveField(
+            model_name='relatorioconciliacao',
+            name='conciliadas',
+        ),
+    ]
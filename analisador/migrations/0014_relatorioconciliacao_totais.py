@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:11
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def calcular_totais(apps, schema_editor):
+    """Preenche os totais dos relatórios existentes a partir das linhas já gravadas."""
+    RelatorioConciliacao = apps.get_model('analisador', 'RelatorioConciliacao')
+    LinhaConciliacao = apps.get_model('analisador', 'LinhaConciliacao')
+
+    for relatorio in RelatorioConciliacao.objects.iterator():
+        linhas = LinhaConciliacao.objects.filter(relatorio=relatorio)
+        contagens = dict(linhas.values('secao').annotate(quantidade=Count('id')).values_list('secao', 'quantidade'))
+        apuradas = linhas.filter(secao__in=['conciliada', 'apenas_banco'])
+        somas = dict(apuradas.values('tipo').annotate(total=Sum('valor')).values_list('tipo', 'total'))
+        tarifas = apuradas.filter(tipo='Despesa', descricao_banco__icontains='TAR PIX').aggregate(total=Sum('valor'))['total']
+
+        relatorio.total_conciliadas = contagens.get('conciliada', 0)
+        relatorio.total_apenas_banco = contagens.get('apenas_banco', 0)
+        relatorio.total_apenas_relatorio = contagens.get('apenas_relatorio', 0)
+        relatorio.total_receitas_apuradas = round(somas.get('Receita') or 0, 2)
+        relatorio.total_despesas_apuradas = round(somas.get('Despesa') or 0, 2)
+        relatorio.total_tarifas_pix = round(tarifas or 0, 2)
+        relatorio.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0013_linhaconciliacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatorioconciliacao',
+            name='total_apenas_banco',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='relatorioconciliacao',
+            name='total_apenas_relatorio',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='relatorioconciliacao',
+            name='total_conciliadas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='relatorioconciliacao',
+            name='total_despesas_apuradas',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='relatorioconciliacao',
+            name='total_receitas_apuradas',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='relatorioconciliacao',
+            name='total_tarifas_pix',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(calcular_totais, migrations.RunPython.noop),
+    ]
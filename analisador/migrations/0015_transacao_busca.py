@@ -0,0 +1,69 @@
+# Índice de busca textual (SQLite FTS5) das transações. Em outros bancos a
+# migração não faz nada e a busca usa icontains (ver analisador/busca.py).
+
+from django.db import migrations
+
+CRIAR_TABELA = """
+CREATE VIRTUAL TABLE analisador_transacao_busca USING fts5(
+    descricao, descricao_limpa, usuario,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER analisador_transacao_busca_insert AFTER INSERT ON analisador_transacao BEGIN
+        INSERT INTO analisador_transacao_busca(rowid, descricao, descricao_limpa, usuario)
+        VALUES (new.id, new.descricao, descricao_limpa(new.descricao), 'u' || new.usuario_id);
+    END
+    """,
+    """
+    CREATE TRIGGER analisador_transacao_busca_delete AFTER DELETE ON analisador_transacao BEGIN
+        DELETE FROM analisador_transacao_busca WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER analisador_transacao_busca_update AFTER UPDATE OF descricao, usuario_id ON analisador_transacao BEGIN
+        UPDATE analisador_transacao_busca
+        SET descricao = new.descricao, descricao_limpa = descricao_limpa(new.descricao), usuario = 'u' || new.usuario_id
+        WHERE rowid = new.id;
+    END
+    """,
+]
+
+PREENCHER = """
+INSERT INTO analisador_transacao_busca(rowid, descricao, descricao_limpa, usuario)
+SELECT id, descricao, descricao_limpa(descricao), 'u' || usuario_id FROM analisador_transacao
+"""
+
+
+def criar_indice_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from analisador.busca import registrar_funcoes_sqlite
+
+    schema_editor.connection.ensure_connection()
+    registrar_funcoes_sqlite(schema_editor.connection.connection)
+    schema_editor.execute(CRIAR_TABELA)
+    for trigger in TRIGGERS:
+        schema_editor.execute(trigger)
+    schema_editor.execute(PREENCHER)
+
+
+def remover_indice_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sufixo in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS analisador_transacao_busca_{sufixo}')
+    schema_editor.execute('DROP TABLE IF EXISTS analisador_transacao_busca')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0014_relatorioconciliacao_totais'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+# A coluna é anulável e sem default para que o SQLite a crie com ALTER TABLE
+# ADD COLUMN, sem recriar a tabela (o que apagaria os triggers da busca, 0015).
+#
+# As transações já gravadas recebem a impressão calculada pelo que está no
+# banco. O número do documento (extratos HTML do Sicoob) não era guardado e
+# entra vazio: nesses extratos, a primeira atualização incremental não
+# reconhece as linhas antigas que tinham documento.
+
+
+def preencher_impressoes(apps, schema_editor):
+    from analisador.models import impressao_digital, normalizar_descricao
+
+    Transacao = apps.get_model('analisador', 'Transacao')
+    transacoes = Transacao.objects.order_by('extrato_id', 'id').only('id', 'extrato_id', 'data', 'valor', 'topico', 'descricao')
+    extrato_atual = None
+    ocorrencias = {}
+    lote = []
+    for transacao in transacoes.iterator(chunk_size=1000):
+        if transacao.extrato_id != extrato_atual:
+            extrato_atual = transacao.extrato_id
+            ocorrencias = {}
+        centavos = int(round(transacao.valor * 100))
+        chave = (transacao.data, centavos, transacao.topico, '', normalizar_descricao(transacao.descricao))
+        ocorrencia = ocorrencias.get(chave, 0)
+        ocorrencias[chave] = ocorrencia + 1
+        transacao.impressao = impressao_digital(*chave, ocorrencia=ocorrencia)
+        lote.append(transacao)
+        if len(lote) >= 1000:
+            Transacao.objects.bulk_update(lote, ['impressao'])
+            lote = []
+    if lote:
+        Transacao.objects.bulk_update(lote, ['impressao'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analisador', '0015_transacao_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transacao',
+            name='impressao',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['extrato', 'impressao'], name='transacao_impressao_idx'),
+        ),
+        migrations.RunPython(preencher_impressoes, migrations.RunPython.noop),
+    ]
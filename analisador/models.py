@@ -1,3 +1,6 @@
+import hashlib
+import unicodedata
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -25,15 +28,23 @@ class Transacao(models.Model):
     extrato = models.ForeignKey(Extrato, on_delete=models.CASCADE, null=True) # ADICIONADO
 
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
-    data = models.CharField(max_length=20)
+    data = models.DateField(null=True, blank=True)
     descricao = models.CharField(max_length=200)
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     topico = models.CharField(max_length=50)
     subtopico = models.CharField(max_length=100)
     origem_descricao = models.CharField(max_length=50, null=True, blank=True)
     categorizacao_manual = models.BooleanField(default=False)
+    # Identifica a linha do extrato de origem na importação incremental (ver impressao_digital)
+    impressao = models.CharField(max_length=40, null=True, blank=True, editable=False)
 
-
+    class Meta:
+        indexes = [
+            models.Index(fields=['extrato', 'data'], name='transacao_extrato_data_idx'),
+            models.Index(fields=['extrato', 'impressao'], name='transacao_impressao_idx'),
+            models.Index(fields=['usuario', 'data'], name='transacao_usuario_data_idx'),
+            models.Index(fields=['usuario', 'extrato', 'topico', 'subtopico'], name='transacao_categoria_idx'),
+        ]
 
     def __str__(self):
         return f"{self.data} - {self.descricao} - {self.valor}"
@@ -45,39 +56,168 @@ class Transacao(models.Model):
         Retorna uma versão limpa da descrição, tentando extrair a parte mais
         relevante, assim como na view do relatório.
         """
-        descricao_str = str(self.descricao or '') # Garante que temos uma string
-        if not descricao_str.strip():
-            return descricao_str 
-
-        try:
-            parts = descricao_str.split(' - ')
-            if len(parts) > 1:
-                
-                for part in parts[1:]:
-                    cleaned_part = part.strip()
-                    
-                    if cleaned_part and not any(char.isdigit() for char in cleaned_part[:4]):
-                        return cleaned_part
-                
-                
-                return parts[1].strip()
-        except Exception:
-            
-            return descricao_str
-            
-        
+        return extrair_descricao_limpa(self.descricao)
+
+
+def extrair_descricao_limpa(descricao):
+    """
+    Lógica de Transacao.descricao_limpa como função, para poder ser usada
+    também como função SQL no índice de busca (analisador/busca.py).
+    """
+    descricao_str = str(descricao or '') # Garante que temos uma string
+    if not descricao_str.strip():
         return descricao_str
-    
+
+    try:
+        parts = descricao_str.split(' - ')
+        if len(parts) > 1:
+            for part in parts[1:]:
+                cleaned_part = part.strip()
+                if cleaned_part and not any(char.isdigit() for char in cleaned_part[:4]):
+                    return cleaned_part
+
+            return parts[1].strip()
+    except Exception:
+        return descricao_str
+
+    return descricao_str
+
+
+def normalizar_descricao(descricao):
+    """Descrição sem acentos, em maiúsculas e com os espaços repetidos reduzidos a um."""
+    texto = str(descricao or '')
+    if not texto.isascii():
+        texto = ''.join(char for char in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(char))
+    return ' '.join(texto.upper().split())
+
+
+def impressao_digital(data, centavos, topico, documento, descricao_normalizada, ocorrencia=0):
+    """
+    Impressão digital de uma linha do extrato: (data, valor em centavos, tipo,
+    documento, descrição já passada por normalizar_descricao) mais o número da
+    ocorrência, para que
+    duas linhas idênticas no mesmo arquivo (duas tarifas iguais no mesmo dia)
+    continuem sendo duas transações. Uma linha reenviada em um extrato
+    atualizado tem a mesma impressão que tinha na primeira importação.
+    """
+    chave = '|'.join([
+        data.isoformat() if data else '', str(int(centavos)), str(topico or ''),
+        str(documento or '').strip(), descricao_normalizada, str(ocorrencia),
+    ])
+    return hashlib.sha1(chave.encode('utf-8')).hexdigest()
+
+
+class ResumoExtrato(models.Model):
+    """
+    Totais materializados de um extrato por (tópico, subtópico). É mantido
+    junto com as transações (importação, edição e recategorização) para que o
+    relatório sem filtros não precise carregar o extrato inteiro.
+    """
+    extrato = models.ForeignKey(Extrato, on_delete=models.CASCADE, related_name='resumos')
+    topico = models.CharField(max_length=50)
+    subtopico = models.CharField(max_length=100)
+    quantidade = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['extrato', 'topico', 'subtopico'], name='resumo_unico_por_categoria'),
+        ]
+
+    def __str__(self):
+        return f"{self.extrato_id} - {self.topico}/{self.subtopico}: {self.total}"
+
 
 class RelatorioConciliacao(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     mes_referencia = models.CharField(max_length=100)
     data_criacao = models.DateTimeField(auto_now_add=True)
     
-    # Usamos campos JSON para guardar as listas de resultados de forma flexível
-    conciliadas = models.JSONField(default=list)
-    apenas_banco = models.JSONField(default=list)
-    apenas_relatorio = models.JSONField(default=list)
+    # As linhas do resultado ficam em LinhaConciliacao (relatorio.linhas)
+
+    # Valores calculados uma única vez, quando a conciliação é gerada
+    total_conciliadas = models.PositiveIntegerField(default=0)
+    total_apenas_banco = models.PositiveIntegerField(default=0)
+    total_apenas_relatorio = models.PositiveIntegerField(default=0)
+    total_receitas_apuradas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_despesas_apuradas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_tarifas_pix = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Conciliação de {self.mes_referencia} por {self.usuario.username}"
+
+
+class LinhaConciliacao(models.Model):
+    """Uma linha do resultado de uma conciliação, em uma das três seções."""
+    CONCILIADA = 'conciliada'
+    APENAS_BANCO = 'apenas_banco'
+    APENAS_RELATORIO = 'apenas_relatorio'
+    SECAO_CHOICES = [
+        (CONCILIADA, 'Conciliada'),
+        (APENAS_BANCO, 'Apenas no banco'),
+        (APENAS_RELATORIO, 'Apenas no relatório'),
+    ]
+
+    relatorio = models.ForeignKey(RelatorioConciliacao, on_delete=models.CASCADE, related_name='linhas')
+    secao = models.CharField(max_length=20, choices=SECAO_CHOICES)
+    tipo = models.CharField(max_length=20, blank=True, default='')  # Receita / Despesa
+
+    # Lado do banco (ou do relatório, nas linhas que só existem lá)
+    data = models.DateField(null=True, blank=True)
+    valor = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    descricao_banco = models.TextField(blank=True, default='')
+
+    # Lado do relatório "Seu Condomínio"
+    data_relatorio = models.DateField(null=True, blank=True)
+    valor_relatorio = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    descricao_relatorio = models.TextField(blank=True, default='')
+    fornecedor = models.TextField(blank=True, default='')
+
+    # Diferença entre os lados quando a conciliação usa tolerância
+    desvio_dias = models.IntegerField(null=True, blank=True)
+    desvio_valor = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+
+    destaque = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['relatorio', 'secao', 'data'], name='linha_conc_secao_data_idx')]
+
+    def __str__(self):
+        return f"{self.get_secao_display()}: {self.data} - {self.valor}"
+
+class Tarefa(models.Model):
+    """
+    Trabalho executado em segundo plano (ver analisador/tarefas.py).
+    A view só cria o registro e devolve a resposta; o executor atualiza a
+    etapa/progresso aqui e a página consulta o status por JSON.
+    """
+    PENDENTE = 'pendente'
+    EXECUTANDO = 'executando'
+    CONCLUIDA = 'concluida'
+    ERRO = 'erro'
+    STATUS_CHOICES = [
+        (PENDENTE, 'Pendente'),
+        (EXECUTANDO, 'Executando'),
+        (CONCLUIDA, 'Concluída'),
+        (ERRO, 'Erro'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    etapa = models.CharField(max_length=100, blank=True, default='')
+    progresso = models.PositiveSmallIntegerField(default=0)  # 0 a 100
+
+    # Entrada (mês, tolerâncias, arquivos salvos em disco) e saída (ex.: id do relatório)
+    parametros = models.JSONField(default=dict)
+    resultado = models.JSONField(default=dict)
+    erro = models.TextField(blank=True, default='')
+
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'data_criacao'])]
 
     def __str__(self):
-        return f"Conciliação de {self.mes_referencia} por {self.usuario.username}"
\ No newline at end of file
+        return f"Tarefa {self.id} ({self.tipo}) - {self.get_status_display()}"
@@ -2,33 +2,138 @@
 
 import pandas as pd
 import numpy as np
-from .models import Regra, Transacao, Extrato
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Count, Sum
+from .models import Regra, Transacao, Extrato, RelatorioConciliacao, LinhaConciliacao, ResumoExtrato, impressao_digital, normalizar_descricao
+from .cache_analise import motor_regras_do_usuario, invalidar, DADOS
+from . import cache_leitura, leitura_paralela
+from .perfil import estagio, medir_estagio
 from bs4 import BeautifulSoup
+import openpyxl
 import zipfile
+import os
 import re
 import io
+import tempfile
+import shutil
 import csv
+import time
+import codecs
+import warnings
+import logging
+from decimal import Decimal
+from html.parser import HTMLParser
 
+logger = logging.getLogger(__name__)
 
+
+# Atributo de número de linha que quebra a leitura de algumas planilhas exportadas.
+PADRAO_ATRIBUTO_R = re.compile(rb' r="\d+"')
+TAMANHO_BLOCO_ZIP = 64 * 1024
+# Acima disso o arquivo sanitizado vai para o disco em vez de ficar em memória.
+LIMITE_MEMORIA_SANITIZACAO = 8 * 1024 * 1024
+
+# --- REPRESENTAÇÃO DOS DATAFRAMES DO MOTOR ---
+# 'Valor' é int64 em centavos desde a leitura de cada arquivo até a gravação:
+# somas e junções por (Data, Valor, Tipo) são exatas, sem arredondar float.
+# Só na gravação no banco o valor volta a ser reais (Decimal, ver _reais).
+# As colunas de texto com poucos valores distintos (Topico/Tipo, Subtopico,
+# origem_descricao) são categóricas. Tópico do extrato e Tipo do relatório
+# usam o mesmo dtype, para que a junção compare os códigos; as categorias
+# ficam em ordem alfabética, a mesma em que as strings eram ordenadas.
+TIPOS = pd.CategoricalDtype(['Despesa', 'Receita'])
+
+
+def _centavos(valores):
+    """Converte uma Series de valores em reais para centavos inteiros (int64)."""
+    return (valores * 100).round().astype('int64')
+
+
+def _reais(centavos):
+    """Centavos (int) em reais, como Decimal com duas casas."""
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def _tipos(receita):
+    """Coluna Topico/Tipo (categórica) a partir de uma máscara booleana de receitas."""
+    return pd.Categorical(np.where(receita, 'Receita', 'Despesa'), dtype=TIPOS)
+
+
+def _e_planilha(nome_membro):
+    return nome_membro.startswith('xl/worksheets/sheet')
+
+
+def _blocos_xml(membro, tamanho_bloco=TAMANHO_BLOCO_ZIP):
+    """
+    Lê o XML em blocos cortados logo após um '>'. Como atributos só existem
+    dentro de tags, nenhum ' r="..."' fica dividido entre dois blocos.
+    """
+    resto = b''
+    while True:
+        bloco = membro.read(tamanho_bloco)
+        if not bloco:
+            if resto:
+                yield resto
+            return
+        bloco = resto + bloco
+        corte = bloco.rfind(b'>') + 1
+        if not corte:
+            resto = bloco
+            continue
+        yield bloco[:corte]
+        resto = bloco[corte:]
+
+
+def _precisa_sanitizar(z_in):
+    """Varre as planilhas e para no primeiro atributo r="..." encontrado."""
+    for item in z_in.infolist():
+        if _e_planilha(item.filename):
+            with z_in.open(item) as membro:
+                if any(PADRAO_ATRIBUTO_R.search(bloco) for bloco in _blocos_xml(membro)):
+                    return True
+    return False
+
+
+def _novo_membro(item):
+    """ZipInfo para regravar `item` com o mesmo nome, data, compressão e atributos."""
+    novo_item = zipfile.ZipInfo(item.filename, date_time=item.date_time)
+    novo_item.compress_type = item.compress_type
+    novo_item.external_attr = item.external_attr
+    return novo_item
+
+
+@medir_estagio('sanitizar', linhas=None)
 def sanitize_excel_file(uploaded_file):
+    """
+    Remove os atributos r="..." das planilhas de um .xlsx, em streaming.
+    Se nenhuma planilha tiver o atributo, devolve o próprio arquivo sem reescrever.
+    Os demais membros são copiados em blocos pela API pública do zipfile
+    (descomprimidos e comprimidos de novo) e o resultado é gravado em um
+    arquivo temporário (em disco se for grande).
+    """
     print("--- INICIANDO SANITIZAÇÃO DO ARQUIVO EXCEL ---")
     uploaded_file.seek(0)
-    sanitized_file_in_memory = io.BytesIO()
-    with zipfile.ZipFile(sanitized_file_in_memory, 'w', zipfile.ZIP_DEFLATED) as z_out:
-        with zipfile.ZipFile(uploaded_file, 'r') as z_in:
+    with zipfile.ZipFile(uploaded_file, 'r') as z_in:
+        if not _precisa_sanitizar(z_in):
+            print("--- NADA A SANITIZAR ---")
+            uploaded_file.seek(0)
+            return uploaded_file
+
+        arquivo_sanitizado = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_SANITIZACAO)
+        with zipfile.ZipFile(arquivo_sanitizado, 'w', zipfile.ZIP_DEFLATED) as z_out:
             for item in z_in.infolist():
-                content = z_in.read(item.filename)
-                if item.filename.startswith('xl/worksheets/sheet'):
-                    xml_content_str = content.decode('utf-8')
-                    sanitized_xml_content = re.sub(r' r="\d+"', '', xml_content_str)
-                    if xml_content_str != sanitized_xml_content:
-                        print("DEBUG: Sanitização aplicada.")
-                    z_out.writestr(item, sanitized_xml_content.encode('utf-8'))
-                else:
-                    z_out.writestr(item, content)
-    sanitized_file_in_memory.seek(0)
+                with z_in.open(item) as membro_in, z_out.open(_novo_membro(item), 'w') as membro_out:
+                    if not _e_planilha(item.filename):
+                        shutil.copyfileobj(membro_in, membro_out, TAMANHO_BLOCO_ZIP)
+                        continue
+                    for bloco in _blocos_xml(membro_in):
+                        membro_out.write(PADRAO_ATRIBUTO_R.sub(b'', bloco))
+                print(f"DEBUG: Sanitização aplicada em {item.filename}.")
+
+    arquivo_sanitizado.seek(0)
     print("--- SANITIZAÇÃO CONCLUÍDA ---")
-    return sanitized_file_in_memory
+    return arquivo_sanitizado
 
 
 
@@ -37,68 +142,212 @@ def converter_data_robusta(data):
     try: return pd.to_datetime(data, unit='D', origin='1899-12-30')
     except (ValueError, TypeError): return pd.to_datetime(data, dayfirst=True, errors='coerce')
 
-def _processar_formato_sicoob_html(arquivo_html):
-    print("--- INICIANDO PROCESSAMENTO SICOOB HTML (COM LIMPEZA DE DESCRIÇÃO) ---")
-    try:
-        conteudo = arquivo_html.read().decode('utf-8', errors='ignore')
-        soup = BeautifulSoup(conteudo, 'html.parser')
-        
-        tabela_lancamentos = None
-        all_tables = soup.find_all('table')
-        for table in all_tables:
-            header = table.find('th', string=lambda t: t and 'DOCUMENTO' in t.upper())
-            if header:
-                tabela_lancamentos = table
+# Tamanho dos blocos lidos do arquivo HTML no modo streaming.
+TAMANHO_BLOCO_HTML = 64 * 1024
+
+
+def _linha_sicoob_html(celulas):
+    """
+    Converte as células de uma <tr> (cada célula é a lista dos seus trechos de
+    texto) em [Data, Documento, Descricao, Valor, Lancamento], ou None se a
+    linha não for uma transação (saldo, cabeçalho, linha vazia...).
+    """
+    if len(celulas) != 4:
+        return None
+    textos = [''.join(trechos) for trechos in celulas]
+    if not textos[0].strip() or "SALDO" in textos[2].upper():
+        return None
+
+    data = textos[0].strip()
+    documento = textos[1].strip()
+
+    # === LÓGICA PARA EXTRAIR APENAS A ÚLTIMA LINHA DA DESCRIÇÃO ===
+    # Junta os trechos usando '\n' como separador para manter as linhas
+    texto_completo_com_linhas = '\n'.join(celulas[2]).strip()
+    # Divide o texto em uma lista de linhas e remove as que estiverem vazias
+    linhas = [linha.strip() for linha in texto_completo_com_linhas.split('\n') if linha.strip()]
+    descricao_final = ' '.join(linhas) # Um fallback caso a lógica falhe
+    if linhas:
+        descricao_final = linhas[-1]
+
+    valor_str = textos[3].strip()
+
+    # Lógica para extrair C/D do valor
+    lancamento = ''
+    valor_limpo = '0'
+    if valor_str and valor_str[-1] in ['C', 'D']:
+        lancamento = valor_str[-1]
+        valor_limpo = valor_str[:-1].strip()
+
+    return [data, documento, descricao_final, valor_limpo, lancamento]
+
+
+class _LeitorSicoobHTML(HTMLParser):
+    """
+    Parser orientado a eventos do extrato Sicoob em HTML. Procura a tabela que
+    tem um <th> com DOCUMENTO e, dentro do <tbody> dela, monta uma <tr> por vez.
+    As linhas prontas ficam em `linhas_prontas` até serem consumidas, então a
+    memória usada não depende do tamanho do arquivo.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.linhas_prontas = []
+        self.tabela_encontrada = False
+        self.tbody_encontrado = False
+        self.finalizado = False
+
+        self._profundidade_tabela = 0
+        self._texto_th = None
+        self._profundidade_tbody = None
+        self._celulas = None
+        self._trechos = None
+        self._texto_atual = []
+
+    def _fechar_trecho(self):
+        # O HTMLParser pode entregar um mesmo nó de texto em pedaços (na
+        # fronteira entre blocos); os pedaços só são separados por tags.
+        if self._texto_atual:
+            if self._trechos is not None:
+                self._trechos.append(''.join(self._texto_atual))
+            self._texto_atual = []
+
+    def _fechar_celula(self):
+        self._fechar_trecho()
+        if self._trechos is not None and self._celulas is not None:
+            self._celulas.append(self._trechos)
+        self._trechos = None
+
+    def _fechar_linha(self):
+        self._fechar_celula()
+        if self._celulas is not None:
+            self.linhas_prontas.append(self._celulas)
+        self._celulas = None
+
+    def handle_starttag(self, tag, attrs):
+        self._fechar_trecho()
+        if self.finalizado:
+            return
+        if tag == 'table':
+            self._profundidade_tabela += 1
+        elif tag == 'th' and not self.tabela_encontrada and self._profundidade_tabela:
+            self._texto_th = []
+        elif tag == 'tbody' and self.tabela_encontrada and self._profundidade_tbody is None:
+            self.tbody_encontrado = True
+            self._profundidade_tbody = self._profundidade_tabela
+        elif self._profundidade_tbody == self._profundidade_tabela:
+            if tag == 'tr':
+                self._fechar_linha()
+                self._celulas = []
+            elif tag == 'td' and self._celulas is not None:
+                self._fechar_celula()
+                self._trechos = []
+
+    def handle_endtag(self, tag):
+        self._fechar_trecho()
+        if self.finalizado:
+            return
+        if tag == 'th' and self._texto_th is not None:
+            if 'DOCUMENTO' in ''.join(self._texto_th).upper():
+                self.tabela_encontrada = True
                 print("DEBUG: Tabela de lançamentos encontrada.")
-                break
-        
-        if not tabela_lancamentos:
-            raise ValueError("Nenhuma tabela de lançamentos com o cabeçalho 'DOCUMENTO' foi encontrada.")
+            self._texto_th = None
+        elif self._profundidade_tbody == self._profundidade_tabela and tag in ('tbody', 'table'):
+            # Fim do corpo da tabela de lançamentos: nada mais interessa.
+            self._fechar_linha()
+            self.finalizado = True
+        elif self._profundidade_tbody == self._profundidade_tabela and tag == 'tr':
+            self._fechar_linha()
+        elif self._profundidade_tbody == self._profundidade_tabela and tag == 'td':
+            self._fechar_celula()
+        elif tag == 'table':
+            self._profundidade_tabela = max(self._profundidade_tabela - 1, 0)
+            if self.tabela_encontrada and not self._profundidade_tabela:
+                # A tabela de lançamentos terminou sem <tbody>.
+                self.finalizado = True
 
-        dados = []
-        tbody = tabela_lancamentos.find('tbody')
-        if not tbody:
-            raise ValueError("Corpo da tabela (tbody) não encontrado.")
-            
-        for i, linha_tr in enumerate(tbody.find_all('tr')):
-            
-            celulas_obj = linha_tr.find_all('td')
-            
-            
-            if len(celulas_obj) == 4 and celulas_obj[0].get_text().strip() and "SALDO" not in celulas_obj[2].get_text().upper():
-                
-                data = celulas_obj[0].get_text().strip()
-                documento = celulas_obj[1].get_text().strip()
-                
-                # ==============================================================================
-                # === LÓGICA PARA EXTRAIR APENAS A ÚLTIMA LINHA DA DESCRIÇÃO ===
-                # ==============================================================================
-                descricao_cell = celulas_obj[2]
-                # Pega todo o texto, usando '\n' como separador para manter as linhas
-                texto_completo_com_linhas = descricao_cell.get_text(separator='\n').strip()
-                # Divide o texto em uma lista de linhas e remove as que estiverem vazias
-                linhas = [linha.strip() for linha in texto_completo_com_linhas.split('\n') if linha.strip()]
-                
-                descricao_final = ' '.join(linhas) # Um fallback caso a lógica falhe
-                if linhas:
-                
-                    descricao_final = linhas[-1]
-                # ==============================================================================
-
-                valor_str = celulas_obj[3].get_text().strip()
-
-                # Lógica para extrair C/D do valor 
-                lancamento = ''
-                valor_limpo = '0'
-                if valor_str and valor_str[-1] in ['C', 'D']:
-                    lancamento = valor_str[-1]
-                    valor_limpo = valor_str[:-1].strip()
-                
-                print(f"DEBUG: Linha #{i+1} -> VÁLIDA. Descrição limpa: '{descricao_final}'")
-                dados.append([data, documento, descricao_final, valor_limpo, lancamento])
-            else:
-                print(f"DEBUG: Linha #{i+1} -> IGNORADA (não é transação).")
+    def handle_data(self, data):
+        if self._texto_th is not None:
+            self._texto_th.append(data)
+        if self._trechos is not None:
+            self._texto_atual.append(data)
+
+    def close(self):
+        super().close()
+        self._fechar_trecho()
+        if not self.finalizado:
+            self._fechar_linha()
+
+
+def _drenar_linhas_sicoob_html(leitor):
+    prontas, leitor.linhas_prontas = leitor.linhas_prontas, []
+    for celulas in prontas:
+        linha = _linha_sicoob_html(celulas)
+        if linha is not None:
+            yield linha
+
+
+def _ler_linhas_sicoob_html(arquivo_html, tamanho_bloco=TAMANHO_BLOCO_HTML):
+    """Lê o arquivo em blocos e gera as linhas de transação conforme aparecem."""
+    decodificador = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    leitor = _LeitorSicoobHTML()
+
+    while not leitor.finalizado:
+        bloco = arquivo_html.read(tamanho_bloco)
+        if not bloco:
+            leitor.feed(decodificador.decode(b'', final=True))
+            leitor.close()
+            break
+        leitor.feed(decodificador.decode(bloco))
+        yield from _drenar_linhas_sicoob_html(leitor)
+
+    yield from _drenar_linhas_sicoob_html(leitor)
+
+    if not leitor.tabela_encontrada:
+        raise ValueError("Nenhuma tabela de lançamentos com o cabeçalho 'DOCUMENTO' foi encontrada.")
+    if not leitor.tbody_encontrado:
+        raise ValueError("Corpo da tabela (tbody) não encontrado.")
+
+
+def _ler_linhas_sicoob_html_bs4(arquivo_html):
+    """Implementação original: monta a árvore inteira com BeautifulSoup."""
+    conteudo = arquivo_html.read().decode('utf-8', errors='ignore')
+    soup = BeautifulSoup(conteudo, 'html.parser')
+
+    tabela_lancamentos = None
+    all_tables = soup.find_all('table')
+    for table in all_tables:
+        header = table.find('th', string=lambda t: t and 'DOCUMENTO' in t.upper())
+        if header:
+            tabela_lancamentos = table
+            print("DEBUG: Tabela de lançamentos encontrada.")
+            break
+
+    if not tabela_lancamentos:
+        raise ValueError("Nenhuma tabela de lançamentos com o cabeçalho 'DOCUMENTO' foi encontrada.")
+
+    tbody = tabela_lancamentos.find('tbody')
+    if not tbody:
+        raise ValueError("Corpo da tabela (tbody) não encontrado.")
 
+    for linha_tr in tbody.find_all('tr'):
+        linha = _linha_sicoob_html([list(td.strings) for td in linha_tr.find_all('td')])
+        if linha is not None:
+            yield linha
+
+
+def _processar_formato_sicoob_html(arquivo_html, streaming=True):
+    """
+    Lê o extrato Sicoob em HTML. Por padrão usa o parser em streaming; com
+    `streaming=False` usa a árvore completa do BeautifulSoup (mais lento e com
+    memória proporcional ao arquivo).
+    """
+    print("--- INICIANDO PROCESSAMENTO SICOOB HTML (COM LIMPEZA DE DESCRIÇÃO) ---")
+    try:
+        if streaming:
+            dados = list(_ler_linhas_sicoob_html(arquivo_html))
+        else:
+            dados = list(_ler_linhas_sicoob_html_bs4(arquivo_html))
 
         if not dados:
             raise ValueError("Nenhuma linha de transação válida foi encontrada na tabela após a análise.")
@@ -110,21 +359,22 @@ def _processar_formato_sicoob_html(arquivo_html):
     except Exception as e:
         import traceback
         traceback.print_exc()
-        raise ValueError(f"Não foi possível processar o arquivo HTML com BeautifulSoup. Erro: {e}")
+        raise ValueError(f"Não foi possível processar o arquivo HTML do Sicoob. Erro: {e}")
     
     # O restante do processamento para padronizar o DataFrame continua igual
     df_padronizado = df
-    df_padronizado['Topico'] = np.where(df_padronizado['Lancamento'] == 'C', 'Receita', 'Despesa')
+    df_padronizado['Topico'] = _tipos(df_padronizado['Lancamento'] == 'C')
     
-    df_padronizado['Valor'] = pd.to_numeric(
+    df_padronizado['Valor'] = _centavos(pd.to_numeric(
         df_padronizado['Valor'].str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
         errors='coerce'
-    ).fillna(0).abs()
+    ).fillna(0).abs())
     
-    df_padronizado['origem_descricao'] = 'Historico'
+    df_padronizado['origem_descricao'] = pd.Series('Historico', index=df_padronizado.index, dtype='category')
     df_padronizado['Data'] = df_padronizado['Data'].apply(converter_data_robusta)
     
-    return df_padronizado
+    # 'Lancamento' (C/D) já está em Topico
+    return df_padronizado.drop(columns='Lancamento')
 
 
 
@@ -150,16 +400,16 @@ def _processar_formato_caixa(df):
     # --- FIM DA CORREÇÃO ---
 
     # O restante do seu código original continua a partir daqui, agora com dados limpos.
-    df['origem_descricao'] = np.where(df['Nome/Razão Social'].replace(r'^\s*$', np.nan, regex=True).isna(), 'Historico', 'Nome/Razao Social')
+    df['origem_descricao'] = pd.Categorical(np.where(df['Nome/Razão Social'].replace(r'^\s*$', np.nan, regex=True).isna(), 'Historico', 'Nome/Razao Social'))
     df['Nome/Razão Social'] = df['Nome/Razão Social'].replace(r'^\s*$', np.nan, regex=True)
     df['Nome/Razão Social'] = df['Nome/Razão Social'].fillna(df['Histórico'])
     
-    # Renomeia as colunas DEPOIS de usá-las para o filtro
-    df_padronizado = df.rename(columns={'Valor Lançamento': 'Valor', 'Nome/Razão Social': 'Descricao', 'Data Lançamento': 'Data'})
+    # Renomeia as colunas DEPOIS de usá-las para o filtro ('Histórico' já foi usado acima)
+    df_padronizado = df.drop(columns='Histórico').rename(columns={'Valor Lançamento': 'Valor', 'Nome/Razão Social': 'Descricao', 'Data Lançamento': 'Data'})
     
     # A lógica de tipo e valor absoluto agora opera em um DataFrame limpo
-    df_padronizado['Topico'] = np.where(df_padronizado['Valor'] < 0, 'Despesa', 'Receita')
-    df_padronizado['Valor'] = df_padronizado['Valor'].abs()
+    df_padronizado['Topico'] = _tipos(df_padronizado['Valor'] >= 0)
+    df_padronizado['Valor'] = _centavos(df_padronizado['Valor'].abs())
     
     return df_padronizado
 
@@ -170,126 +420,485 @@ def _processar_formato_sicoob(df):
     df_padronizado = df.rename(columns={'HISTÓRICO': 'Descricao', 'VALOR': 'Valor', 'DATA': 'Data'})
     df_padronizado['Data'] = df_padronizado['Data'].apply(converter_data_robusta)
     df_padronizado['Valor'] = df_padronizado['Valor'].astype(str)
-    df_padronizado['Topico'] = np.where(df_padronizado['Valor'].str.contains('C', na=False), 'Receita', 'Despesa')
+    df_padronizado['Topico'] = _tipos(df_padronizado['Valor'].str.contains('C', na=False))
     df_padronizado['Valor'] = df_padronizado['Valor'].str.replace('C', '', regex=False).str.replace('D', '', regex=False).str.strip()
     df_padronizado['Valor'] = df_padronizado['Valor'].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-    df_padronizado['Valor'] = pd.to_numeric(df_padronizado['Valor'], errors='coerce').fillna(0)
+    df_padronizado['Valor'] = _centavos(pd.to_numeric(df_padronizado['Valor'], errors='coerce').fillna(0))
     return df_padronizado[['Data', 'Descricao', 'Valor', 'Topico']]
 
 
-def processar_extrato(arquivo_extrato, usuario_logado, extrato_obj):
-    # ... (código inalterado) ...
+# Quantas linhas do topo da planilha são lidas para descobrir o layout.
+LINHAS_SONDAGEM_EXCEL = 10
+
+# Layouts de extrato em Excel: colunas que identificam o banco, colunas que
+# o processamento usa e os tipos com que elas devem ser lidas.
+FORMATOS_EXCEL = {
+    'caixa': {
+        'identificadoras': ('Data Lançamento', 'Valor Lançamento'),
+        'colunas': ('Data Lançamento', 'Nome/Razão Social', 'Histórico', 'Valor Lançamento'),
+        'dtype': {'Nome/Razão Social': str, 'Histórico': str},
+        'processador': _processar_formato_caixa,
+    },
+    'sicoob': {
+        'identificadoras': ('DATA', 'HISTÓRICO'),
+        'colunas': ('DATA', 'HISTÓRICO', 'VALOR'),
+        'dtype': {'HISTÓRICO': str, 'VALOR': str},
+        'processador': _processar_formato_sicoob,
+    },
+}
+
+
+def detectar_formato_excel(arquivo_excel, linhas_sondagem=LINHAS_SONDAGEM_EXCEL):
+    """
+    Lê só as primeiras linhas da primeira planilha (openpyxl em modo read-only)
+    e retorna (formato, linha_do_cabecalho), sem carregar o arquivo inteiro.
+    """
+    arquivo_excel.seek(0)
+    try:
+        pasta = openpyxl.load_workbook(arquivo_excel, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Não foi possível ler o ficheiro Excel. Erro: {e}")
+
+    try:
+        planilha = pasta.worksheets[0]
+        linhas_lidas = []
+        for indice, linha in enumerate(planilha.iter_rows(max_row=linhas_sondagem, values_only=True)):
+            valores = set(linha)
+            for formato, config in FORMATOS_EXCEL.items():
+                if all(coluna in valores for coluna in config['identificadoras']):
+                    logger.debug("Layout %r detectado, cabeçalho na linha %d.", formato, indice + 1)
+                    return formato, indice
+            linhas_lidas.append(linha)
+    finally:
+        pasta.close()
+
+    logger.debug("Linhas lidas na detecção do formato: %s", linhas_lidas)
+    raise ValueError("Formato de extrato não reconhecido.")
+
+
+def ler_extrato_excel(arquivo_excel):
+    """Detecta o layout e carrega a planilha uma única vez, só com as colunas usadas."""
+    formato, linha_cabecalho = detectar_formato_excel(arquivo_excel)
+    config = FORMATOS_EXCEL[formato]
+    colunas = set(config['colunas'])
+
+    arquivo_excel.seek(0)
+    try:
+        df = pd.read_excel(
+            arquivo_excel, skiprows=linha_cabecalho,
+            usecols=lambda coluna: coluna in colunas, dtype=config['dtype']
+        )
+    except Exception as e:
+        raise ValueError(f"Não foi possível ler o ficheiro Excel. Erro: {e}")
+    return config['processador'](df)
+
+
+@medir_estagio('ler_extrato')
+def ler_extrato_bancario(arquivo_extrato):
+    """Lê o extrato do banco (.html do Sicoob ou .xlsx da Caixa/Sicoob) e o padroniza."""
     if arquivo_extrato.name.lower().endswith('.html'):
-        df_processado = _processar_formato_sicoob_html(arquivo_extrato)
-    else:
-        try:
-            df_normal = pd.read_excel(arquivo_extrato)
-            df_com_skip = pd.read_excel(arquivo_extrato, skiprows=1)
-        except Exception as e:
-            raise ValueError(f"Não foi possível ler o ficheiro Excel. Erro: {e}")
-        if 'Data Lançamento' in df_com_skip.columns and 'Valor Lançamento' in df_com_skip.columns:
-            df_processado = _processar_formato_caixa(df_com_skip)
-        elif 'DATA' in df_com_skip.columns and 'HISTÓRICO' in df_com_skip.columns:
-            df_processado = _processar_formato_sicoob(df_com_skip)
+        return _processar_formato_sicoob_html(arquivo_extrato)
+    return ler_extrato_excel(arquivo_extrato)
+
+
+def _coluna_ou_padrao(df, coluna, padrao):
+    """Retorna os valores da coluna como lista, ou uma lista com `padrao` se ela não existir."""
+    if coluna in df.columns:
+        return df[coluna].tolist()
+    return [padrao] * len(df)
+
+
+def recalcular_resumo_extrato(extrato_id):
+    """Reconstrói o resumo (ResumoExtrato) do extrato com uma única agregação no banco."""
+    linhas = (
+        Transacao.objects.filter(extrato_id=extrato_id)
+        .values('topico', 'subtopico')
+        .annotate(quantidade=Count('id'), total=Sum('valor'))
+    )
+    with transaction.atomic():
+        ResumoExtrato.objects.filter(extrato_id=extrato_id).delete()
+        ResumoExtrato.objects.bulk_create([ResumoExtrato(extrato_id=extrato_id, **linha) for linha in linhas])
+
+
+def acumular_delta_resumo(deltas, extrato_id, topico, subtopico, quantidade, valor):
+    """Soma uma variação em `deltas` ({(extrato, topico, subtopico): [quantidade, total]})."""
+    if extrato_id is None:
+        return
+    delta = deltas.setdefault((extrato_id, topico, subtopico), [0, 0])
+    delta[0] += quantidade
+    delta[1] += valor
+
+
+def aplicar_deltas_resumo(deltas):
+    """
+    Aplica as variações acumuladas no ResumoExtrato sem recalcular o extrato:
+    um UPDATE com F() por categoria afetada (ou INSERT, se ela ainda não
+    existia). Categorias que ficam sem transações são removidas.
+    """
+    if not deltas:
+        return
+    with transaction.atomic():
+        for (extrato_id, topico, subtopico), (quantidade, total) in deltas.items():
+            if not quantidade and not total:
+                continue
+            atualizadas = ResumoExtrato.objects.filter(
+                extrato_id=extrato_id, topico=topico, subtopico=subtopico
+            ).update(quantidade=F('quantidade') + quantidade, total=F('total') + total)
+            if not atualizadas:
+                ResumoExtrato.objects.create(
+                    extrato_id=extrato_id, topico=topico, subtopico=subtopico,
+                    quantidade=quantidade, total=total
+                )
+        extratos_afetados = {extrato_id for extrato_id, _, _ in deltas}
+        ResumoExtrato.objects.filter(extrato_id__in=extratos_afetados, quantidade__lte=0).delete()
+
+
+def _coluna_de_datas(df):
+    """Coluna 'Data' como datetime.date (None onde a data é vazia ou inválida), para o DateField."""
+    if 'Data' not in df.columns:
+        return [None] * len(df)
+    datas = pd.to_datetime(df['Data'], errors='coerce')
+    return [None if pd.isna(data) else data.date() for data in datas]
+
+
+def impressoes_digitais(df, datas=None):
+    """
+    Impressão digital (models.impressao_digital) de cada linha do extrato
+    padronizado, na ordem do DataFrame. Linhas repetidas recebem o número da
+    ocorrência dentro do arquivo. `datas` é a saída de _coluna_de_datas, se
+    já tiver sido calculada.
+    """
+    if datas is None:
+        datas = _coluna_de_datas(df)
+    centavos = _coluna_ou_padrao(df, 'Valor', 0)
+    descricoes = [normalizar_descricao(descricao) for descricao in _coluna_ou_padrao(df, 'Descricao', '')]
+    chaves = zip(datas, centavos, _coluna_ou_padrao(df, 'Topico', ''), _coluna_ou_padrao(df, 'Documento', ''), descricoes)
+
+    ocorrencias = {}
+    impressoes = []
+    for chave in chaves:
+        ocorrencia = ocorrencias.get(chave, 0)
+        ocorrencias[chave] = ocorrencia + 1
+        impressoes.append(impressao_digital(*chave, ocorrencia=ocorrencia))
+    return impressoes
+
+
+# Impressões por consulta IN, abaixo do limite de 999 parâmetros das versões antigas do SQLite.
+IMPRESSOES_POR_CONSULTA = 900
+
+
+def _impressoes_existentes(extrato_obj, impressoes):
+    """Quais das impressões já estão gravadas no extrato (consultas pelo índice transacao_impressao_idx)."""
+    existentes = set()
+    for inicio in range(0, len(impressoes), IMPRESSOES_POR_CONSULTA):
+        existentes.update(
+            Transacao.objects.filter(extrato=extrato_obj, impressao__in=impressoes[inicio:inicio + IMPRESSOES_POR_CONSULTA])
+            .values_list('impressao', flat=True)
+        )
+    return existentes
+
+
+@medir_estagio('gravar_transacoes', linhas=lambda total: total)
+def salvar_transacoes_em_lote(df_processado, extrato_obj, usuario_logado, tamanho_lote=None, incremental=False):
+    """
+    Substitui as transações do extrato pelas linhas do DataFrame.
+    As instâncias são montadas direto das colunas (sem iterrows) e gravadas com
+    bulk_create em lotes, tudo dentro de uma única transação do banco.
+
+    Com `incremental=True` (extrato atualizado reenviado) nada é apagado: só
+    as linhas cuja impressão digital ainda não está no extrato são gravadas, e
+    as já existentes ficam como estão, inclusive a categorização manual. O
+    resumo é atualizado pelas variações das linhas novas. Retorna quantas
+    transações foram gravadas.
+    """
+    if tamanho_lote is None:
+        tamanho_lote = getattr(settings, 'TAMANHO_LOTE_TRANSACOES', 1000)
+
+    datas = _coluna_de_datas(df_processado)
+    impressoes = impressoes_digitais(df_processado, datas)
+
+    logger.debug("Gravando %d transações em lotes de %d (incremental: %s).", len(df_processado), tamanho_lote, incremental)
+    inicio_total = time.perf_counter()
+    with transaction.atomic():
+        if incremental:
+            existentes = _impressoes_existentes(extrato_obj, impressoes)
+            novas = [i for i, impressao in enumerate(impressoes) if impressao not in existentes]
+            logger.debug("%d linha(s) já estavam no extrato, %d nova(s).", len(impressoes) - len(novas), len(novas))
+            df_processado = df_processado.iloc[novas]
+            datas = [datas[i] for i in novas]
+            impressoes = [impressoes[i] for i in novas]
+        else:
+            Transacao.objects.filter(extrato=extrato_obj).delete()
+
+        total = len(df_processado)
+        colunas = zip(
+            datas,
+            _coluna_ou_padrao(df_processado, 'Descricao', ''),
+            (_reais(centavos) for centavos in _coluna_ou_padrao(df_processado, 'Valor', 0)),
+            _coluna_ou_padrao(df_processado, 'Topico', ''),
+            _coluna_ou_padrao(df_processado, 'Subtopico', ''),
+            _coluna_ou_padrao(df_processado, 'origem_descricao', ''),
+            impressoes,
+        )
+        transacoes = [
+            Transacao(
+                extrato=extrato_obj, usuario=usuario_logado, data=data,
+                descricao=descricao, valor=valor,
+                topico=topico, subtopico=subtopico,
+                origem_descricao=origem_descricao, impressao=impressao
+            )
+            for data, descricao, valor, topico, subtopico, origem_descricao, impressao in colunas
+        ]
+
+        for inicio in range(0, total, tamanho_lote):
+            inicio_lote = time.perf_counter()
+            lote = transacoes[inicio:inicio + tamanho_lote]
+            Transacao.objects.bulk_create(lote, batch_size=tamanho_lote)
+            gravadas = inicio + len(lote)
+            logger.debug("Lote gravado: %d/%d (%.3fs)", gravadas, total, time.perf_counter() - inicio_lote)
+
+        if incremental:
+            deltas = {}
+            for transacao_obj in transacoes:
+                acumular_delta_resumo(deltas, extrato_obj.id, transacao_obj.topico, transacao_obj.subtopico, 1, transacao_obj.valor)
+            aplicar_deltas_resumo(deltas)
         else:
-            print("Colunas encontradas (tentativa 1):", df_normal.columns)
-            print("Colunas encontradas (tentativa 2):", df_com_skip.columns)
-            raise ValueError("Formato de extrato não reconhecido.")
+            recalcular_resumo_extrato(extrato_obj.id)
+        if total or not incremental:
+            invalidar(DADOS, usuario_logado.id)
+    logger.debug("Gravação concluída em %.3fs.", time.perf_counter() - inicio_total)
+    return total
+
 
+def categorizar_extrato(df_processado, usuario):
+    """Descarta as linhas vazias e preenche 'Subtopico' com as regras do usuário."""
     df_processado.dropna(subset=['Data', 'Descricao'], how='all', inplace=True)
-    regras_do_usuario = Regra.objects.filter(usuario=usuario_logado)
-    regras_de_categorizacao = {regra.palavra_chave: regra.categoria for regra in regras_do_usuario}
+    with estagio('categorizar', linhas=len(df_processado)):
+        motor_regras = motor_regras_do_usuario(usuario)
+        df_processado['Descricao'] = df_processado['Descricao'].fillna('').astype(str)
+        df_processado['Subtopico'] = motor_regras.categorizar_serie(df_processado['Descricao']).astype('category')
+    return df_processado
 
-    
-    def categorizar_transacao(descricao):
-        if not isinstance(descricao, str): return 'Não categorizado'
-        for palavra_chave, categoria in regras_de_categorizacao.items():
-            if palavra_chave.lower() in descricao.lower(): return categoria
-        return 'Não categorizado'
-    df_processado['Descricao'] = df_processado['Descricao'].fillna('').astype(str)
-    df_processado['Subtopico'] = df_processado['Descricao'].apply(categorizar_transacao)
-    Transacao.objects.filter(extrato=extrato_obj).delete()
-    for index, linha in df_processado.iterrows():
-        Transacao.objects.create(
-            extrato=extrato_obj, usuario=usuario_logado, data=linha.get('Data', None),
-            descricao=linha.get('Descricao', ''), valor=linha.get('Valor', 0.0),
-            topico=linha.get('Topico', ''), subtopico=linha.get('Subtopico', ''),
-            origem_descricao=linha.get('origem_descricao', '')
-        )
-    df_receitas = df_processado.loc[df_processado['Topico'] == 'Receita'].copy()
-    df_despesas = df_processado.loc[df_processado['Topico'] == 'Despesa'].copy()
-    total_despesas = df_despesas['Valor'].sum()
-    total_receitas = df_receitas['Valor'].sum()
-    saldo_liquido = total_receitas - total_despesas
-    resumo_despesas = df_despesas.groupby('Subtopico')['Valor'].sum().sort_values(ascending=False)
-    resumo_receitas = df_receitas.groupby('Subtopico')['Valor'].sum().sort_values(ascending=False)
-    nao_categorizadas_bruto = df_processado.loc[df_processado['Subtopico'] == 'Não categorizado'].copy()
-    colunas_desejadas = ['Topico', 'Data', 'Descricao', 'Valor', 'origem_descricao']
-    nao_categorizadas_limpo = nao_categorizadas_bruto.reindex(columns=colunas_desejadas)
-    return total_receitas, total_despesas, saldo_liquido, resumo_despesas, nao_categorizadas_limpo, resumo_receitas
 
+# Acima disso o filtro por LIKE fica grande demais e é mais barato avaliar tudo.
+MAX_PALAVRAS_FILTRO_RECATEGORIZACAO = 100
 
 
+def _filtro_palavras_chave(palavras_chave):
+    """
+    Monta um filtro que seleciona as descrições que contêm alguma das palavras.
+    Retorna None quando não é possível filtrar com segurança no banco: o LIKE
+    do SQLite só ignora maiúsculas/minúsculas em caracteres ASCII.
+    """
+    palavras_chave = set(palavras_chave)
+    if len(palavras_chave) > MAX_PALAVRAS_FILTRO_RECATEGORIZACAO:
+        return None
+    filtro = Q()
+    for palavra_chave in palavras_chave:
+        if not palavra_chave.isascii():
+            return None
+        filtro |= Q(descricao__icontains=palavra_chave)
+    return filtro
 
-# --- FUNÇÃO PARA LER O RELATÓRIO "SEU CONDOMÍNIO" (TRATANDO COMO EXCEL) ---
-def _processar_relatorio_seu_condominio_csv(arquivo_csv):
+
+def recategorizar_transacoes(usuario, palavras_chave=None, extrato_id=None, tamanho_lote=None):
     """
-    Lê o relatório CSV do "Seu Condomínio", implementando corretamente a lógica de
-    "máquina de estados" para classificar Receitas e Despesas.
+    Reavalia a categoria das transações do usuário com as regras atuais e grava
+    apenas as que mudaram, com bulk_update.
+
+    Se `palavras_chave` for informado (palavras de regras criadas, editadas ou
+    apagadas), só as transações cuja descrição contém alguma delas são
+    reavaliadas: as demais não podem ter a categoria alterada pela mudança.
+    Transações com categorização manual nunca são tocadas.
     """
-    print("--- INICIANDO PROCESSAMENTO CSV (LÓGICA DE ESTADO CORRIGIDA) ---")
-    try:
-        arquivo_csv.seek(0)
-        arquivo_csv_texto = io.TextIOWrapper(arquivo_csv, encoding='utf-8')
-        reader = csv.reader(arquivo_csv_texto, delimiter=',', quotechar='"')
+    if tamanho_lote is None:
+        tamanho_lote = getattr(settings, 'TAMANHO_LOTE_TRANSACOES', 1000)
 
-        dados_limpos = []
-        current_tipo = '' # Inicia sem tipo definido
+    candidatas = Transacao.objects.filter(usuario=usuario, categorizacao_manual=False)
+    if extrato_id is not None:
+        candidatas = candidatas.filter(extrato_id=extrato_id)
+    if palavras_chave is not None:
+        if not palavras_chave:
+            return 0
+        filtro = _filtro_palavras_chave(palavras_chave)
+        if filtro is not None:
+            candidatas = candidatas.filter(filtro)
 
-        for i, row in enumerate(reader):
-            # Ignora linhas vazias ou o cabeçalho original
-            if not row or not row[0] or 'pagador_fornecedor' in row[0]:
-                continue
+    motor_regras = motor_regras_do_usuario(usuario)
+    alteradas = []
+    deltas = {}
+    campos = ('id', 'extrato_id', 'descricao', 'topico', 'subtopico', 'valor')
+    with estagio('categorizar', linhas=0) as registro:
+        for transacao_obj in candidatas.only(*campos).iterator(chunk_size=tamanho_lote):
+            registro.linhas += 1
+            nova_categoria = motor_regras.categorizar(transacao_obj.descricao)
+            if nova_categoria != transacao_obj.subtopico:
+                # O valor sai da categoria antiga e entra na nova no resumo do extrato
+                acumular_delta_resumo(deltas, transacao_obj.extrato_id, transacao_obj.topico, transacao_obj.subtopico, -1, -transacao_obj.valor)
+                acumular_delta_resumo(deltas, transacao_obj.extrato_id, transacao_obj.topico, nova_categoria, 1, transacao_obj.valor)
+                transacao_obj.subtopico = nova_categoria
+                alteradas.append(transacao_obj)
+
+    if alteradas:
+        with estagio('gravar_transacoes', linhas=len(alteradas)), transaction.atomic():
+            Transacao.objects.bulk_update(alteradas, ['subtopico'], batch_size=tamanho_lote)
+            aplicar_deltas_resumo(deltas)
+            invalidar(DADOS, usuario.id)
+    logger.debug("Recategorização concluída. %d transações alteradas.", len(alteradas))
+    return len(alteradas)
+
+
+# --- FUNÇÃO PARA LER O RELATÓRIO "SEU CONDOMÍNIO" (TRATANDO COMO EXCEL) ---
+def _linhas_seu_condominio_linha_a_linha(arquivo_csv):
+    """Implementação original: percorre o CSV linha a linha com o módulo csv."""
+    arquivo_csv.seek(0)
+    arquivo_csv_texto = io.TextIOWrapper(arquivo_csv, encoding='utf-8')
+    reader = csv.reader(arquivo_csv_texto, delimiter=',', quotechar='"')
+
+    dados_limpos = []
+    current_tipo = '' # Inicia sem tipo definido
 
-            primeira_coluna = row[0].upper()
+    for i, row in enumerate(reader):
+        # Ignora linhas vazias ou o cabeçalho original
+        if not row or not row[0] or 'pagador_fornecedor' in row[0]:
+            continue
 
-            # 1. MUDANÇA DE ESTADO: Procura por RECEITAS ou DESPESAS
-            if 'RECEITAS' in primeira_coluna:
-                current_tipo = 'Receita'
-                continue 
+        primeira_coluna = row[0].upper()
+
+        # 1. MUDANÇA DE ESTADO: Procura por RECEITAS ou DESPESAS
+        if 'RECEITAS' in primeira_coluna:
+            current_tipo = 'Receita'
+            continue 
+        
+        elif 'DESPESAS' in primeira_coluna:
+            current_tipo = 'Despesa'
+            continue
+
+        # 2. PROCESSAMENTO DE TRANSAÇÃO
+        # Uma transação válida tem 5 campos e uma data na 4ª posição (índice 3)
+        if len(row) >= 5 and '/' in row[3]:
+            descricao_item, _, fornecedor, data, valor_str = row[:5]
             
-            elif 'DESPESAS' in primeira_coluna:
-                current_tipo = 'Despesa'
+            # Ignora a linha de cabeçalho que pode ser confundida com uma transação
+            if "CONTABILIZADO" in data.upper():
                 continue
 
-            # 2. PROCESSAMENTO DE TRANSAÇÃO
-            # Uma transação válida tem 5 campos e uma data na 4ª posição (índice 3)
-            if len(row) >= 5 and '/' in row[3]:
-                descricao_item, _, fornecedor, data, valor_str = row[:5]
-                
-                # Ignora a linha de cabeçalho que pode ser confundida com uma transação
-                if "CONTABILIZADO" in data.upper():
-                    continue
-
-                valor_limpo = pd.to_numeric(valor_str, errors='coerce')
-
-                # Adiciona a transação à lista com o TIPO do estado atual
-                if current_tipo: # Só adiciona se já estivermos dentro de uma seção
-                    dados_limpos.append({
-                        'Tipo': current_tipo,
-                        'Data': data,
-                        'Descricao': descricao_item,
-                        'Fornecedor': fornecedor,
-                        'Valor': valor_limpo
-                    })
-
-        if not dados_limpos:
-            raise ValueError("Nenhuma linha de transação válida foi encontrada no arquivo CSV.")
-
-        df_final = pd.DataFrame(dados_limpos)
+            valor_limpo = pd.to_numeric(valor_str, errors='coerce')
+
+            # Adiciona a transação à lista com o TIPO do estado atual
+            if current_tipo: # Só adiciona se já estivermos dentro de uma seção
+                dados_limpos.append({
+                    'Tipo': current_tipo,
+                    'Data': data,
+                    'Descricao': descricao_item,
+                    'Fornecedor': fornecedor,
+                    'Valor': valor_limpo
+                })
+
+    if not dados_limpos:
+        raise ValueError("Nenhuma linha de transação válida foi encontrada no arquivo CSV.")
+    return pd.DataFrame(dados_limpos)
+
+
+def _ler_csv_seu_condominio(conteudo, engine):
+    with warnings.catch_warnings():
+        # Linhas com mais de 5 campos são esperadas: só os 5 primeiros importam.
+        warnings.simplefilter('ignore', pd.errors.ParserWarning)
+        return pd.read_csv(
+            io.BytesIO(conteudo), sep=',', quotechar='"', encoding='utf-8', engine=engine,
+            header=None, names=range(5), index_col=False,
+            # O parser em C só aceita a lista de colunas; o em Python só o callable
+            # (quando o arquivo inteiro tem menos de 5 campos por linha).
+            usecols=range(5) if engine == 'c' else (lambda coluna: coluna < 5),
+            dtype=str, keep_default_na=False, skip_blank_lines=False
+        )
+
+
+def _tem_menos_de_5_campos(linha_bruta):
+    return len(next(csv.reader([linha_bruta.decode('utf-8')]), [])) < 5
+
+
+def _linhas_seu_condominio_vetorizado(arquivo_csv):
+    """
+    Mesma máquina de estados, mas em colunas: o CSV é carregado inteiro pelo
+    pandas.read_csv, o tipo (Receita/Despesa) de cada linha vem de um
+    forward fill sobre as linhas de seção e os filtros são aplicados em bloco.
+    """
+    arquivo_csv.seek(0)
+    conteudo = arquivo_csv.read()
+    try:
+        df = _ler_csv_seu_condominio(conteudo, engine='c')
+        engine = 'c'
+    except pd.errors.ParserError:
+        # O parser em C recusa arquivos em que nenhuma linha chega a 5 campos
+        df = _ler_csv_seu_condominio(conteudo, engine='python')
+        engine = 'python'
+
+    # As descrições e datas se repetem muito: os testes de texto rodam só nos
+    # valores distintos e o resultado é espalhado de volta pelos códigos.
+    codigos_primeira, primeiras = pd.factorize(df[0].fillna(''))
+    primeiras = pd.Series(primeiras, dtype=object)
+    primeiras_maiusculas = primeiras.str.upper()
+    # Linhas vazias, sem primeira coluna ou com o cabeçalho original não mudam nada
+    considerada = ((primeiras != '') & ~primeiras.str.contains('pagador_fornecedor', regex=False)).to_numpy()[codigos_primeira]
+    e_receita = primeiras_maiusculas.str.contains('RECEITAS', regex=False).to_numpy()[codigos_primeira]
+    e_despesa = primeiras_maiusculas.str.contains('DESPESAS', regex=False).to_numpy()[codigos_primeira]
+    e_secao = considerada & (e_receita | e_despesa)
+
+    # 1. MUDANÇA DE ESTADO: o tipo de cada linha é o da última seção vista acima dela
+    tipo = pd.Series(np.where(e_receita, 'Receita', 'Despesa'), index=df.index, dtype=object)
+    tipo = tipo.where(e_secao).ffill().fillna('')
+
+    # 2. PROCESSAMENTO DE TRANSAÇÃO: 5 campos, data na 4ª posição, fora do cabeçalho
+    codigos_data, datas = pd.factorize(df[3].fillna(''))
+    datas = pd.Series(datas, dtype=object)
+    data_valida = (datas.str.contains('/', regex=False) & ~datas.str.upper().str.contains('CONTABILIZADO', regex=False)).to_numpy()[codigos_data]
+    e_transacao = pd.Series(considerada & ~e_secao & data_valida, index=df.index) & (tipo != '') & df[4].notna()
+
+    # O parser em C não diferencia "5º campo vazio" de "linha com só 4 campos".
+    # Essas linhas (raras) são conferidas uma a uma no texto original.
+    ambiguas = e_transacao & (df[4] == '') if engine == 'c' else None
+    if ambiguas is not None and ambiguas.any():
+        linhas_brutas = conteudo.splitlines()
+        if len(linhas_brutas) == len(df):
+            curtas = [indice for indice in df.index[ambiguas] if _tem_menos_de_5_campos(linhas_brutas[indice])]
+            e_transacao[curtas] = False
+        else:
+            # Há campos com quebra de linha: as linhas do arquivo não batem com as do DataFrame
+            return _linhas_seu_condominio_linha_a_linha(io.BytesIO(conteudo))
+
+    if not e_transacao.any():
+        raise ValueError("Nenhuma linha de transação válida foi encontrada no arquivo CSV.")
+
+    transacoes = df[e_transacao]
+    return pd.DataFrame({
+        'Tipo': tipo[e_transacao].astype(str),
+        'Data': transacoes[3],
+        'Descricao': transacoes[0],
+        'Fornecedor': transacoes[2],
+        'Valor': pd.to_numeric(transacoes[4], errors='coerce'),
+    }).reset_index(drop=True)
+
+
+@medir_estagio('ler_relatorio')
+def _processar_relatorio_seu_condominio_csv(arquivo_csv, vetorizado=True):
+    """
+    Lê o relatório CSV do "Seu Condomínio", implementando corretamente a lógica de
+    "máquina de estados" para classificar Receitas e Despesas.
+    Por padrão usa a versão vetorizada; `vetorizado=False` usa a leitura linha a linha.
+    """
+    print("--- INICIANDO PROCESSAMENTO CSV (LÓGICA DE ESTADO CORRIGIDA) ---")
+    try:
+        if vetorizado:
+            df_final = _linhas_seu_condominio_vetorizado(arquivo_csv)
+        else:
+            df_final = _linhas_seu_condominio_linha_a_linha(arquivo_csv)
+
         df_final['Data'] = pd.to_datetime(df_final['Data'], dayfirst=True, errors='coerce')
         df_final.dropna(subset=['Data'], inplace=True)
         df_final.fillna({'Valor': 0, 'Fornecedor': '', 'Descricao': ''}, inplace=True)
+        df_final['Valor'] = _centavos(df_final['Valor'])
+        df_final['Tipo'] = df_final['Tipo'].astype(TIPOS)
         
         print(f"--- PROCESSAMENTO CSV CONCLUÍDO. {len(df_final)} transações encontradas. ---")
         return df_final
@@ -299,8 +908,122 @@ def _processar_relatorio_seu_condominio_csv(arquivo_csv):
     
 
 
-def conciliar_dataframes(df_banco, df_relatorio):
-    """Compara os dois DataFrames e retorna as diferenças."""
+def _deslocamentos_de_data(tolerancia_dias):
+    """Deslocamentos de 0 a ±N dias, do mais próximo para o mais distante."""
+    return sorted(range(-tolerancia_dias, tolerancia_dias + 1), key=lambda d: (abs(d), -d))
+
+
+def _pares_valor_exato(banco, relatorio, deslocamento):
+    """
+    Casa as linhas com mesmo Tipo e mesmo valor cuja data no relatório é a data
+    do banco + `deslocamento` dias. Repetições do mesmo lançamento são pareadas
+    pela ordem de ocorrência, como no merge exato.
+    """
+    esquerda = banco.assign(Data=banco['Data'] + pd.Timedelta(days=deslocamento))
+    chaves = ['Tipo', 'Data', 'centavos']
+    esquerda['ocorrencia'] = esquerda.groupby(chaves, observed=True).cumcount()
+    direita = relatorio.assign(ocorrencia=relatorio.groupby(chaves, observed=True).cumcount())
+    return pd.merge(
+        esquerda[chaves + ['ocorrencia', 'indice_banco']],
+        direita[chaves + ['ocorrencia', 'indice_relatorio']],
+        on=chaves + ['ocorrencia'],
+    )[['indice_banco', 'indice_relatorio']]
+
+
+def _pares_valor_aproximado(banco, relatorio, deslocamento, tolerancia_centavos):
+    """
+    Para cada linha do banco, procura (merge_asof) o valor mais próximo no
+    relatório dentro de ±tolerancia_centavos, no mesmo Tipo e na data do banco +
+    `deslocamento` dias. Quando duas linhas do banco disputam a mesma linha do
+    relatório, fica a de menor diferença; as outras tentam de novo na próxima
+    rodada, já sem os pares aceitos.
+    """
+    esquerda = banco.assign(Data=banco['Data'] + pd.Timedelta(days=deslocamento)).sort_values('centavos')
+    direita = relatorio.assign(centavos_relatorio=relatorio['centavos']).sort_values('centavos')
+    candidatos = pd.merge_asof(
+        esquerda[['Tipo', 'Data', 'centavos', 'indice_banco']],
+        direita[['Tipo', 'Data', 'centavos', 'centavos_relatorio', 'indice_relatorio']],
+        on='centavos', by=['Tipo', 'Data'],
+        tolerance=tolerancia_centavos, direction='nearest',
+    ).dropna(subset=['indice_relatorio'])
+    if candidatos.empty:
+        return candidatos[['indice_banco', 'indice_relatorio']]
+
+    candidatos['diferenca'] = (candidatos['centavos_relatorio'] - candidatos['centavos']).abs()
+    candidatos = candidatos.sort_values(['diferenca', 'indice_banco'], kind='stable')
+    candidatos = candidatos.drop_duplicates('indice_relatorio')
+    candidatos['indice_relatorio'] = candidatos['indice_relatorio'].astype('int64')
+    return candidatos[['indice_banco', 'indice_relatorio']]
+
+
+def _conciliar_com_tolerancia(apenas_banco, apenas_relatorio, colunas_banco, colunas_relatorio,
+                              tolerancia_dias, tolerancia_valor):
+    """
+    Segunda etapa da conciliação: tenta casar o que sobrou do merge exato
+    aceitando diferença de até `tolerancia_dias` na data e `tolerancia_valor`
+    (em reais) no valor. Trabalha em blocos ordenados (Tipo + data deslocada),
+    sem produto cartesiano, e prioriza sempre a menor diferença de data.
+    Retorna (novas_conciliadas, apenas_banco, apenas_relatorio).
+    """
+    tolerancia_centavos = int(round(tolerancia_valor * 100))
+
+    banco = apenas_banco[['Tipo', 'Data', 'Valor']].dropna()
+    banco = pd.DataFrame({
+        'Tipo': banco['Tipo'], 'Data': banco['Data'],
+        'centavos': banco['Valor'], 'indice_banco': banco.index,
+    })
+    relatorio = apenas_relatorio[['Tipo', 'Data', 'Valor']].dropna()
+    relatorio = pd.DataFrame({
+        'Tipo': relatorio['Tipo'], 'Data': relatorio['Data'],
+        'centavos': relatorio['Valor'], 'indice_relatorio': relatorio.index,
+    })
+
+    lista_pares = []
+    for deslocamento in _deslocamentos_de_data(tolerancia_dias):
+        # O valor exato com deslocamento zero já foi resolvido pelo merge exato.
+        buscas = [] if deslocamento == 0 else [lambda b, r: _pares_valor_exato(b, r, deslocamento)]
+        if tolerancia_centavos > 0:
+            buscas.append(lambda b, r: _pares_valor_aproximado(b, r, deslocamento, tolerancia_centavos))
+
+        for buscar in buscas:
+            while not banco.empty and not relatorio.empty:
+                pares = buscar(banco, relatorio)
+                if pares.empty:
+                    break
+                lista_pares.append(pares)
+                banco = banco[~banco['indice_banco'].isin(pares['indice_banco'])]
+                relatorio = relatorio[~relatorio['indice_relatorio'].isin(pares['indice_relatorio'])]
+
+    if not lista_pares:
+        return None, apenas_banco, apenas_relatorio
+
+    pares = pd.concat(lista_pares, ignore_index=True)
+    lado_banco = apenas_banco.loc[pares['indice_banco'], colunas_banco].reset_index(drop=True)
+    lado_relatorio = apenas_relatorio.loc[pares['indice_relatorio'], ['Data', 'Valor'] + colunas_relatorio]
+    lado_relatorio = lado_relatorio.rename(columns={'Data': 'Data_relatorio', 'Valor': 'Valor_relatorio'}).reset_index(drop=True)
+
+    novas_conciliadas = pd.concat([lado_banco, lado_relatorio], axis=1)
+    # Mesmo dtype categórico do indicador do merge, para o concat não virar texto
+    novas_conciliadas['_merge'] = pd.Categorical(['both'] * len(novas_conciliadas), dtype=apenas_banco['_merge'].dtype)
+    logger.debug("%d pares conciliados dentro da tolerância.", len(novas_conciliadas))
+
+    apenas_banco = apenas_banco.drop(index=pares['indice_banco'])
+    apenas_relatorio = apenas_relatorio.drop(index=pares['indice_relatorio'])
+    return novas_conciliadas, apenas_banco, apenas_relatorio
+
+
+@medir_estagio('conciliar', linhas=lambda resultado: sum(len(df) for df in resultado))
+def conciliar_dataframes(df_banco, df_relatorio, tolerancia_dias=0, tolerancia_valor=0):
+    """
+    Compara os dois DataFrames e retorna as diferenças.
+
+    Primeiro casa os lançamentos idênticos (Data, Valor, Tipo), com Valor em
+    centavos e Tipo categórico (ver TIPOS). Se houver
+    tolerância, o que sobrou é casado de novo aceitando até `tolerancia_dias`
+    de diferença na data (compensação bancária) e `tolerancia_valor` reais no
+    valor. Toda linha conciliada registra Desvio_dias e Desvio_valor
+    (relatório - banco, em centavos).
+    """
     print("--- INICIANDO MOTOR DE CONCILIAÇÃO ---")
     banco_comp = df_banco.copy()
     banco_comp.rename(columns={'Topico': 'Tipo'}, inplace=True)
@@ -314,13 +1037,250 @@ def conciliar_dataframes(df_banco, df_relatorio):
 
     banco_comp['Data'] = pd.to_datetime(banco_comp['Data']).dt.normalize()
     relatorio_comp['Data'] = pd.to_datetime(relatorio_comp['Data']).dt.normalize()
-    banco_comp['Valor'] = banco_comp['Valor'].round(2)
-    relatorio_comp['Valor'] = relatorio_comp['Valor'].round(2)
-    banco_comp['id_unico'] = banco_comp.groupby(['Data', 'Valor', 'Tipo']).cumcount()
-    relatorio_comp['id_unico'] = relatorio_comp.groupby(['Data', 'Valor', 'Tipo']).cumcount()
+    # Valor já está em centavos (int64): a junção é exata, sem arredondar
+    banco_comp['Tipo'] = banco_comp['Tipo'].astype(TIPOS)
+    relatorio_comp['Tipo'] = relatorio_comp['Tipo'].astype(TIPOS)
+    banco_comp['id_unico'] = banco_comp.groupby(['Data', 'Valor', 'Tipo'], observed=True).cumcount()
+    relatorio_comp['id_unico'] = relatorio_comp.groupby(['Data', 'Valor', 'Tipo'], observed=True).cumcount()
     conciliacao_df = pd.merge(banco_comp, relatorio_comp, on=['Data', 'Valor', 'Tipo', 'id_unico'], how='outer', suffixes=('_banco', '_relatorio'), indicator=True)
-    conciliadas = conciliacao_df[conciliacao_df['_merge'] == 'both']
+    conciliadas = conciliacao_df[conciliacao_df['_merge'] == 'both'].copy()
     apenas_banco = conciliacao_df[conciliacao_df['_merge'] == 'left_only']
     apenas_relatorio = conciliacao_df[conciliacao_df['_merge'] == 'right_only']
+
+    conciliadas['Data_relatorio'] = conciliadas['Data']
+    conciliadas['Valor_relatorio'] = conciliadas['Valor']
+
+    if tolerancia_dias > 0 or tolerancia_valor > 0:
+        # Colunas que vieram de cada lado no merge (as chaves ficam com o banco).
+        chaves = ['Data', 'Valor', 'Tipo', 'id_unico']
+        colunas_banco = chaves + [
+            f"{coluna}_banco" if coluna in relatorio_comp.columns else coluna
+            for coluna in banco_comp.columns if coluna not in chaves
+        ]
+        colunas_relatorio = [
+            f"{coluna}_relatorio" if coluna in banco_comp.columns else coluna
+            for coluna in relatorio_comp.columns if coluna not in chaves
+        ]
+        novas_conciliadas, apenas_banco, apenas_relatorio = _conciliar_com_tolerancia(
+            apenas_banco, apenas_relatorio, colunas_banco, colunas_relatorio,
+            tolerancia_dias, tolerancia_valor
+        )
+        if novas_conciliadas is not None:
+            conciliadas = pd.concat([conciliadas, novas_conciliadas], ignore_index=True)
+            conciliadas = conciliadas.sort_values(['Data', 'Valor', 'Tipo'], kind='stable', ignore_index=True)
+
+    conciliadas['Desvio_dias'] = (conciliadas['Data_relatorio'] - conciliadas['Data']).dt.days
+    conciliadas['Desvio_valor'] = conciliadas['Valor_relatorio'] - conciliadas['Valor']
     print("--- CONCILIAÇÃO FINALIZADA ---")
-    return conciliadas, apenas_banco, apenas_relatorio
\ No newline at end of file
+    return conciliadas, apenas_banco, apenas_relatorio
+
+
+def _sem_progresso(etapa, percentual):
+    pass
+
+
+PALAVRAS_DESTAQUE = [
+    "taxa de condomínio", "taxas de condomínio", "arrec extra", "juros por atraso",
+    "multa por atraso", "consumo de gás", "(-) tarifas de recebimentos",
+    "(-) descontos nas cobranças", "fundo de reserva", "fundo reserva", "tar pix", "TAXA DE CONDOMÍNIO JUNHO/2025"
+]
+
+
+# Todas as palavras em um único padrão: uma busca por descrição em vez de um
+# teste `in` por palavra. Como a descrição é comparada em minúsculas, as
+# palavras também entram em minúsculas.
+PADRAO_DESTAQUE = re.compile('|'.join(re.escape(palavra.lower()) for palavra in PALAVRAS_DESTAQUE))
+
+
+def marcar_destaques(descricoes):
+    """Series booleana: quais descrições do relatório contêm alguma das PALAVRAS_DESTAQUE."""
+    return descricoes.str.lower().str.contains(PADRAO_DESTAQUE, na=False).astype(bool)
+
+
+def calcular_totais_conciliacao(conciliadas, apenas_banco):
+    """
+    Totais exibidos no relatório, calculados uma única vez sobre o que foi
+    apurado no extrato (conciliadas + apenas no banco): receitas, despesas e
+    tarifas de PIX.
+    """
+    # Os vazios ficam de fora do concat (evita o aviso do pandas sobre dtypes
+    # de frames vazios); sem nenhum lançamento apurado os totais são zero.
+    partes = [df[['Tipo', 'Valor', 'Descricao_banco']] for df in (conciliadas, apenas_banco) if not df.empty]
+    if not partes:
+        return {'total_receitas_apuradas': Decimal('0'), 'total_despesas_apuradas': Decimal('0'), 'total_tarifas_pix': Decimal('0')}
+    apuradas = pd.concat(partes)
+
+    somas_por_tipo = apuradas.groupby('Tipo', observed=True)['Valor'].sum()
+    e_tarifa_pix = (apuradas['Tipo'] == 'Despesa') & apuradas['Descricao_banco'].str.upper().str.contains('TAR PIX', na=False, regex=False)
+    return {
+        'total_receitas_apuradas': _reais(somas_por_tipo.get('Receita', 0)),
+        'total_despesas_apuradas': _reais(somas_por_tipo.get('Despesa', 0)),
+        'total_tarifas_pix': _reais(apuradas.loc[e_tarifa_pix, 'Valor'].sum()),
+    }
+
+
+def _data_ou_none(valor):
+    return None if pd.isna(valor) else pd.Timestamp(valor).date()
+
+
+def _reais_ou_none(centavos):
+    return None if pd.isna(centavos) else _reais(centavos)
+
+
+def _texto_ou_vazio(valor):
+    return '' if valor is None or (not isinstance(valor, str) and pd.isna(valor)) else str(valor)
+
+
+def _inteiro_ou_none(valor):
+    return None if pd.isna(valor) else int(valor)
+
+
+def _linhas_conciliacao(relatorio, df_resultado, secao):
+    """Converte uma seção do resultado (DataFrame) em objetos LinhaConciliacao, coluna a coluna."""
+    total = len(df_resultado)
+
+    def coluna(nome, conversor, padrao):
+        if nome not in df_resultado.columns:
+            return [padrao] * total
+        return [conversor(valor) for valor in df_resultado[nome].tolist()]
+
+    descricoes_relatorio = coluna('Descricao_relatorio', _texto_ou_vazio, '')
+    # O lado do banco nunca é destacado, só as descrições do relatório
+    if secao == LinhaConciliacao.APENAS_BANCO:
+        destaques = [False] * total
+    else:
+        destaques = marcar_destaques(pd.Series(descricoes_relatorio, dtype=object)).tolist()
+
+    colunas = zip(
+        coluna('Tipo', _texto_ou_vazio, ''),
+        coluna('Data', _data_ou_none, None),
+        coluna('Valor', _reais_ou_none, None),
+        coluna('Descricao_banco', _texto_ou_vazio, ''),
+        coluna('Data_relatorio', _data_ou_none, None),
+        coluna('Valor_relatorio', _reais_ou_none, None),
+        descricoes_relatorio,
+        coluna('Fornecedor', _texto_ou_vazio, ''),
+        coluna('Desvio_dias', _inteiro_ou_none, None),
+        coluna('Desvio_valor', _reais_ou_none, None),
+        destaques,
+    )
+    return [
+        LinhaConciliacao(
+            relatorio=relatorio, secao=secao, tipo=tipo,
+            data=data, valor=valor, descricao_banco=descricao_banco,
+            data_relatorio=data_relatorio, valor_relatorio=valor_relatorio,
+            descricao_relatorio=descricao_relatorio, fornecedor=fornecedor,
+            desvio_dias=desvio_dias, desvio_valor=desvio_valor, destaque=destaque
+        )
+        for (tipo, data, valor, descricao_banco, data_relatorio, valor_relatorio,
+             descricao_relatorio, fornecedor, desvio_dias, desvio_valor, destaque) in colunas
+    ]
+
+
+@medir_estagio('gravar_conciliacao', linhas=lambda r: r.total_conciliadas + r.total_apenas_banco + r.total_apenas_relatorio)
+def salvar_relatorio_conciliacao(usuario, mes_referencia, conciliadas, apenas_banco, apenas_relatorio):
+    """Grava o RelatorioConciliacao e as linhas das três seções em uma única transação."""
+    tamanho_lote = getattr(settings, 'TAMANHO_LOTE_TRANSACOES', 1000)
+    with transaction.atomic():
+        relatorio = RelatorioConciliacao.objects.create(
+            usuario=usuario,
+            mes_referencia=mes_referencia,
+            total_conciliadas=len(conciliadas),
+            total_apenas_banco=len(apenas_banco),
+            total_apenas_relatorio=len(apenas_relatorio),
+            **calcular_totais_conciliacao(conciliadas, apenas_banco)
+        )
+        for secao, df_resultado in [
+            (LinhaConciliacao.CONCILIADA, conciliadas),
+            (LinhaConciliacao.APENAS_BANCO, apenas_banco),
+            (LinhaConciliacao.APENAS_RELATORIO, apenas_relatorio),
+        ]:
+            LinhaConciliacao.objects.bulk_create(_linhas_conciliacao(relatorio, df_resultado, secao), batch_size=tamanho_lote)
+    return relatorio
+
+
+def _nome_do_upload(caminho):
+    """Nome original do arquivo (sem o prefixo de ordem que tarefas.salvar_uploads coloca)."""
+    nome = os.path.basename(caminho)
+    return re.sub(r'^\d{3}_', '', nome)
+
+
+def colunas_para_conciliacao(df_banco_bruto):
+    """Colunas do extrato padronizado que entram na conciliação."""
+    colunas_necessarias = ['Data', 'Descricao', 'Valor', 'Topico']
+    if all(col in df_banco_bruto.columns for col in colunas_necessarias):
+        return df_banco_bruto[colunas_necessarias]
+    raise ValueError(f"O processador do extrato não retornou as colunas esperadas. Encontradas: {df_banco_bruto.columns.tolist()}")
+
+
+def ler_arquivos_com_cache(arquivos, hashes, progresso):
+    """
+    Lê os (tipo, caminho) de `arquivos` e retorna [(DataFrame, erro)] na mesma
+    ordem. Os que já estão no cache de leitura (pelo hash do conteúdo) não são
+    lidos de novo; os demais vão para leitura_paralela e entram no cache.
+    """
+    with estagio('ler_cache') as registro:
+        resultados = [(cache_leitura.ler(tipo, hash_), None) for (tipo, _), hash_ in zip(arquivos, hashes)]
+        registro.linhas = sum(len(df) for df, erro in resultados if df is not None)
+    pendentes = [i for i, (df, erro) in enumerate(resultados) if df is None]
+    logger.debug("%d de %d arquivo(s) lidos do cache.", len(arquivos) - len(pendentes), len(arquivos))
+    if not pendentes:
+        return resultados
+
+    with estagio('ler_arquivos') as registro:
+        lidos = leitura_paralela.ler_arquivos(
+            [arquivos[i] for i in pendentes],
+            progresso=lambda lidos, total: progresso(f'Lendo os arquivos ({lidos} de {total})', 5 + 65 * lidos // total)
+        )
+        registro.linhas = sum(len(df) for df, erro in lidos if df is not None)
+    for i, (df, erro) in zip(pendentes, lidos):
+        resultados[i] = (df, erro)
+        if erro is None:
+            try:
+                cache_leitura.gravar(arquivos[i][0], hashes[i], df)
+            except OSError as e:
+                # Sem espaço em disco, por exemplo: a conciliação segue sem o cache.
+                logger.warning("Não foi possível gravar o cache de leitura: %s", e)
+    return resultados
+
+
+def executar_conciliacao(usuario, caminho_extrato, caminhos_relatorios, mes_referencia,
+                         tolerancia_dias=0, tolerancia_valor=0, hashes=None, progresso=None):
+    """
+    Fluxo completo da conciliação a partir de arquivos já salvos em disco:
+    lê o extrato, lê e junta os relatórios CSV, concilia e grava o
+    RelatorioConciliacao. `hashes` são os hashes do conteúdo de cada arquivo
+    (extrato primeiro), calculados no upload; se faltarem, são calculados aqui.
+    `progresso(etapa, percentual)` é chamado a cada etapa.
+    """
+    progresso = progresso or _sem_progresso
+
+    # Extrato e relatórios são lidos em paralelo (um processo por arquivo) e
+    # os resultados voltam na ordem do upload.
+    arquivos = [(leitura_paralela.EXTRATO, caminho_extrato)]
+    arquivos += [(leitura_paralela.RELATORIO, caminho) for caminho in caminhos_relatorios]
+    if not hashes:
+        hashes = [cache_leitura.hash_do_arquivo(caminho) for _, caminho in arquivos]
+    progresso('Lendo os arquivos', 5)
+    resultados = ler_arquivos_com_cache(arquivos, hashes, progresso)
+
+    erros = [
+        f"{_nome_do_upload(caminho)}: {erro}"
+        for (tipo, caminho), (df, erro) in zip(arquivos, resultados) if erro
+    ]
+    if erros:
+        raise ValueError(f"Falha ao ler {len(erros)} arquivo(s): " + " | ".join(erros))
+
+    # Detecta o layout do extrato (HTML, Caixa ou Sicoob) e o padroniza
+    df_banco = colunas_para_conciliacao(resultados[0][0])
+
+    df_seu_condominio = pd.concat([df for df, erro in resultados[1:]], ignore_index=True)
+
+    progresso('Conciliando', 70)
+    conciliadas, apenas_banco, apenas_relatorio = conciliar_dataframes(
+        df_banco, df_seu_condominio,
+        tolerancia_dias=tolerancia_dias, tolerancia_valor=tolerancia_valor
+    )
+
+    progresso('Salvando o relatório', 90)
+    return salvar_relatorio_conciliacao(usuario, mes_referencia, conciliadas, apenas_banco, apenas_relatorio)
@@ -0,0 +1,111 @@
+# motor_regras.py (CATEGORIZAÇÃO COM AUTÔMATO AHO-CORASICK)
+
+from collections import deque
+
+CATEGORIA_PADRAO = 'Não categorizado'
+
+
+class MotorRegras:
+    """
+    Compila as regras de um usuário (palavra-chave -> categoria) em um único
+    autômato Aho-Corasick. Cada descrição é percorrida uma única vez e o
+    resultado é o mesmo do laço antigo: a categoria da PRIMEIRA regra (na ordem
+    em que as regras foram informadas) cuja palavra-chave aparece na descrição,
+    sem diferenciar maiúsculas de minúsculas.
+    """
+
+    def __init__(self, regras):
+        # Mesma semântica do antigo dicionário {palavra_chave: categoria}:
+        # a prioridade é a da primeira ocorrência, a categoria é a da última.
+        regras_ordenadas = {}
+        for palavra_chave, categoria in regras:
+            regras_ordenadas[palavra_chave] = categoria
+
+        self.categorias = list(regras_ordenadas.values())
+        self.quantidade_regras = len(self.categorias)
+
+        # Cada nó do autômato: transições, link de falha e a menor prioridade
+        # (índice da regra) que termina nele ou em qualquer sufixo dele.
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._prioridade = [None]
+
+        for prioridade, palavra_chave in enumerate(regras_ordenadas):
+            self._inserir(palavra_chave.lower(), prioridade)
+        self._construir_links_de_falha()
+
+    def _inserir(self, palavra, prioridade):
+        no = 0
+        for caractere in palavra:
+            proximo = self._transicoes[no].get(caractere)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._prioridade.append(None)
+                self._transicoes[no][caractere] = proximo
+            no = proximo
+        if self._prioridade[no] is None or prioridade < self._prioridade[no]:
+            self._prioridade[no] = prioridade
+
+    def _construir_links_de_falha(self):
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            no = fila.popleft()
+            for caractere, filho in self._transicoes[no].items():
+                falha = self._falha[no]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[filho] = destino if destino != filho else 0
+
+                # Propaga a melhor prioridade do sufixo para não precisar
+                # seguir a cadeia de saídas durante a varredura.
+                herdada = self._prioridade[self._falha[filho]]
+                if herdada is not None and (self._prioridade[filho] is None or herdada < self._prioridade[filho]):
+                    self._prioridade[filho] = herdada
+                fila.append(filho)
+
+    def melhor_prioridade(self, descricao):
+        """Retorna o índice da primeira regra que casa com a descrição, ou None."""
+        transicoes, falha, prioridades = self._transicoes, self._falha, self._prioridade
+
+        # Uma palavra-chave vazia casa com qualquer descrição (como o operador 'in').
+        melhor = prioridades[0]
+        if melhor == 0:
+            return melhor
+
+        no = 0
+        for caractere in descricao.lower():
+            while no and caractere not in transicoes[no]:
+                no = falha[no]
+            no = transicoes[no].get(caractere, 0)
+            prioridade = prioridades[no]
+            if prioridade is not None and (melhor is None or prioridade < melhor):
+                melhor = prioridade
+                if melhor == 0:
+                    break
+        return melhor
+
+    def categorizar(self, descricao, padrao=CATEGORIA_PADRAO):
+        """Retorna a categoria da descrição, ou `padrao` se nenhuma regra casar."""
+        if not isinstance(descricao, str):
+            return padrao
+        prioridade = self.melhor_prioridade(descricao)
+        if prioridade is None:
+            return padrao
+        return self.categorias[prioridade]
+
+    def categorizar_serie(self, descricoes, padrao=CATEGORIA_PADRAO):
+        """
+        Categoriza uma Series do Pandas. Descrições repetidas (muito comuns em
+        extratos: tarifas, PIX do mesmo pagador...) são avaliadas uma única vez.
+        """
+        unicas = descricoes.drop_duplicates()
+        mapa = {descricao: self.categorizar(descricao, padrao) for descricao in unicas}
+        return descricoes.map(mapa)
+
+
+def compilar_regras(regras_queryset):
+    """Monta o MotorRegras a partir de um queryset de `Regra`."""
+    return MotorRegras(regras_queryset.values_list('palavra_chave', 'categoria'))
@@ -0,0 +1,75 @@
+# paginacao.py (PAGINAÇÃO POR CURSOR / KEYSET)
+#
+# As tabelas grandes (seções da conciliação, transações não categorizadas)
+# são lidas em páginas ordenadas por (data, id). Em vez de OFFSET, que obriga o
+# banco a percorrer todas as linhas anteriores, cada página continua a partir
+# da última linha da anterior: o cursor é "AAAA-MM-DD_id" (ou "_id" quando a
+# data é vazia). Linhas sem data vêm primeiro, em qualquer banco.
+
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
+
+ORDEM_KEYSET = (F('data').asc(nulls_first=True), 'id')
+
+
+def montar_cursor(data, id_):
+    return f"{data.isoformat() if data else ''}_{id_}"
+
+
+def cursor_de(objeto):
+    return montar_cursor(objeto.data, objeto.id)
+
+
+def ler_cursor(texto):
+    """Retorna (data, id) do cursor, ou None se ele estiver vazio ou for inválido."""
+    if not texto:
+        return None
+    data_texto, _, id_texto = texto.rpartition('_')
+    try:
+        data = parse_date(data_texto) if data_texto else None
+        if data_texto and data is None:
+            return None
+        return data, int(id_texto)
+    except ValueError:
+        return None
+
+
+def apos_cursor(queryset, cursor):
+    """Filtra as linhas que vêm depois do cursor na ordem (data, id)."""
+    posicao = ler_cursor(cursor)
+    if posicao is None:
+        return queryset
+    data, ultimo_id = posicao
+    if data is None:
+        return queryset.filter(Q(data__isnull=True, id__gt=ultimo_id) | Q(data__isnull=False))
+    # data >= X primeiro, para o banco percorrer o índice só a partir do cursor
+    return queryset.filter(data__gte=data).filter(Q(data__gt=data) | Q(id__gt=ultimo_id))
+
+
+def pagina_keyset(queryset, cursor, tamanho):
+    """
+    Retorna (linhas, próximo_cursor) da página que começa depois de `cursor`.
+    O próximo cursor é None quando não há mais linhas.
+    """
+    linhas = list(apos_cursor(queryset, cursor).order_by(*ORDEM_KEYSET)[:tamanho + 1])
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        return linhas, cursor_de(linhas[-1])
+    return linhas, None
+
+
+def renderizar_em_blocos(queryset, template, contexto, tamanho_bloco):
+    """
+    Gerador para StreamingHttpResponse: percorre o queryset com iterator()
+    (sem carregar tudo na memória) e renderiza `template` a cada bloco de
+    linhas, com as linhas em `contexto['linhas']`.
+    """
+    bloco = []
+    for linha in queryset.order_by(*ORDEM_KEYSET).iterator(chunk_size=tamanho_bloco):
+        bloco.append(linha)
+        if len(bloco) == tamanho_bloco:
+            yield render_to_string(template, {**contexto, 'linhas': bloco})
+            bloco = []
+    if bloco:
+        yield render_to_string(template, {**contexto, 'linhas': bloco})
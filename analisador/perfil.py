@@ -0,0 +1,282 @@
+# perfil.py (MEDIÇÃO DE DESEMPENHO POR REQUISIÇÃO E POR TAREFA)
+#
+# `estagio('nome')` (gerenciador de contexto) e `medir_estagio('nome')`
+# (decorador) registram tempo, linhas processadas e pico de memória de um
+# trecho do processamento: sanitizar, ler, categorizar, gravar, conciliar.
+#
+# Os estágios são anotados na EXECUÇÃO atual (ContextVar), aberta pelo
+# PerfilMiddleware em cada requisição e por tarefas.py em cada tarefa em
+# segundo plano. A execução também conta as consultas SQL e o tempo gasto
+# nelas (connection.execute_wrapper). Ao final viram uma linha de log em JSON
+# (logger 'analisador.perfil'), o cabeçalho Server-Timing da resposta e uma
+# entrada na lista das últimas execuções, vista no painel de desempenho.
+#
+# Em respostas em streaming o corpo é gerado depois que o cabeçalho já saiu:
+# o Server-Timing só tem a parte até a view retornar e a execução fica marcada
+# como parcial até o corpo terminar, quando recebe o tempo e as consultas dele.
+#
+# O pico de memória usa tracemalloc, que deixa o Python bem mais lento; só é
+# medido com settings.PERFIL_MEDIR_MEMORIA. Ele é do processo inteiro: com
+# tarefas rodando ao mesmo tempo, o pico de uma inclui a memória das outras.
+
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse
+from django.utils import timezone
+
+logger = logging.getLogger('analisador.perfil')
+
+_execucao_atual = ContextVar('perfil_execucao', default=None)
+# Estágios abertos (do mais externo para o mais interno) na thread/contexto atual
+_pilha_estagios = ContextVar('perfil_pilha_estagios', default=())
+
+_ultimas_execucoes = None
+_trava_execucoes = threading.Lock()
+
+
+def _medir_memoria():
+    return getattr(settings, 'PERFIL_MEDIR_MEMORIA', False)
+
+
+class Estagio:
+    """Resultado de um estágio. `linhas` pode ser preenchido dentro do bloco."""
+
+    def __init__(self, nome, linhas=None):
+        self.nome = nome
+        self.linhas = linhas
+        self.segundos = None
+        self.pico_bytes = None
+        # Maior pico visto pelos estágios internos (o tracemalloc só tem um pico)
+        self._pico_interno = 0
+        self._memoria_inicial = 0
+        self._iniciou_tracemalloc = False
+
+    @property
+    def linhas_por_segundo(self):
+        if not self.linhas or not self.segundos:
+            return None
+        return self.linhas / self.segundos
+
+    def como_dict(self):
+        return {
+            'estagio': self.nome,
+            'ms': round(self.segundos * 1000, 1),
+            'linhas': self.linhas,
+            'linhas_por_segundo': round(self.linhas_por_segundo) if self.linhas_por_segundo else None,
+            'pico_mb': round(self.pico_bytes / 1024 / 1024, 2) if self.pico_bytes is not None else None,
+        }
+
+
+class Execucao:
+    """Uma requisição ou tarefa: estágios, consultas SQL e tempo total."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.inicio = timezone.now()
+        self.estagios = []
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.segundos = None
+        self.status = None
+        # Corpo em streaming ainda não medido (ou interrompido pelo cliente)
+        self.parcial = False
+
+    def contar_consulta(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.segundos_sql += time.perf_counter() - inicio
+
+    def como_dict(self):
+        return {
+            'execucao': self.nome,
+            'inicio': self.inicio.isoformat(),
+            'status': self.status,
+            'ms': round(self.segundos * 1000, 1) if self.segundos is not None else None,
+            'parcial': self.parcial,
+            'consultas': self.consultas,
+            'sql_ms': round(self.segundos_sql * 1000, 1),
+            'estagios': [estagio.como_dict() for estagio in self.estagios],
+        }
+
+    def server_timing(self):
+        """Valor do cabeçalho Server-Timing (https://w3c.github.io/server-timing/)."""
+        partes = []
+        for estagio in self.estagios:
+            parte = f'{estagio.nome};dur={estagio.segundos * 1000:.1f}'
+            if estagio.linhas is not None:
+                parte += f';desc="{estagio.linhas} linhas"'
+            partes.append(parte)
+        partes.append(f'sql;dur={self.segundos_sql * 1000:.1f};desc="{self.consultas} consultas"')
+        if self.segundos is not None:
+            partes.append(f'total;dur={self.segundos * 1000:.1f}')
+        if self.parcial:
+            partes.append('parcial;desc="corpo em streaming fora da conta"')
+        return ', '.join(partes)
+
+
+def _iniciar_memoria(registro, pilha):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        registro._iniciou_tracemalloc = True
+    elif pilha:
+        # O pico vai ser zerado: guarda o do estágio externo até aqui
+        externo = pilha[-1]
+        externo._pico_interno = max(externo._pico_interno, tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    registro._memoria_inicial = tracemalloc.get_traced_memory()[0]
+
+
+def _encerrar_memoria(registro, pilha):
+    pico = max(registro._pico_interno, tracemalloc.get_traced_memory()[1])
+    registro.pico_bytes = max(pico - registro._memoria_inicial, 0)
+    if pilha:
+        externo = pilha[-1]
+        externo._pico_interno = max(externo._pico_interno, pico)
+    if registro._iniciou_tracemalloc:
+        tracemalloc.stop()
+
+
+@contextmanager
+def estagio(nome, linhas=None):
+    """
+    Mede o bloco como um estágio da execução atual:
+
+        with estagio('categorizar', linhas=len(df)) as registro:
+            ...
+    """
+    registro = Estagio(nome, linhas)
+    pilha = _pilha_estagios.get()
+    medir_memoria = _medir_memoria()
+    if medir_memoria:
+        _iniciar_memoria(registro, pilha)
+    atual = _execucao_atual.get()
+    if atual is not None:
+        # Anotado já na abertura: os estágios ficam na ordem em que começaram
+        atual.estagios.append(registro)
+    token = _pilha_estagios.set(pilha + (registro,))
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro.segundos = time.perf_counter() - inicio
+        _pilha_estagios.reset(token)
+        if medir_memoria and tracemalloc.is_tracing():
+            _encerrar_memoria(registro, pilha)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({'execucao': atual.nome if atual else None, **registro.como_dict()}, ensure_ascii=False))
+
+
+def medir_estagio(nome, linhas=len):
+    """
+    Decorador: mede cada chamada da função como um estágio. `linhas` recebe o
+    retorno da função e devolve quantas linhas foram processadas (None para não contar).
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with estagio(nome) as registro:
+                resultado = funcao(*args, **kwargs)
+                if linhas is not None:
+                    registro.linhas = linhas(resultado)
+                return resultado
+        return envolvida
+    return decorador
+
+
+def _guardar(execucao):
+    global _ultimas_execucoes
+    with _trava_execucoes:
+        if _ultimas_execucoes is None:
+            _ultimas_execucoes = deque(maxlen=getattr(settings, 'PERFIL_ULTIMAS_EXECUCOES', 100))
+        _ultimas_execucoes.append(execucao)
+
+
+def ultimas_execucoes():
+    """As últimas execuções deste processo, da mais recente para a mais antiga."""
+    with _trava_execucoes:
+        return list(reversed(_ultimas_execucoes or ()))
+
+
+@contextmanager
+def execucao(nome):
+    """Abre uma execução (requisição ou tarefa) para os estágios e consultas que rodarem dentro dela."""
+    atual = Execucao(nome)
+    token = _execucao_atual.set(atual)
+    inicio = time.perf_counter()
+    try:
+        with connection.execute_wrapper(atual.contar_consulta):
+            yield atual
+    except BaseException:
+        if atual.status is None:
+            atual.status = 'erro'
+        raise
+    finally:
+        atual.segundos = time.perf_counter() - inicio
+        _execucao_atual.reset(token)
+        _guardar(atual)
+        if not atual.parcial:
+            logger.info(json.dumps(atual.como_dict(), ensure_ascii=False))
+
+
+def _medir_corpo(atual, conteudo):
+    """
+    Repassa os blocos do corpo em streaming somando à execução o tempo e as
+    consultas de gerar cada um (o tempo de envio ao cliente fica de fora).
+    """
+    iterador = iter(conteudo)
+    try:
+        while True:
+            # A execução é reativada a cada bloco: entre eles o gerador pode
+            # estar parado em outro contexto.
+            token = _execucao_atual.set(atual)
+            inicio = time.perf_counter()
+            try:
+                with connection.execute_wrapper(atual.contar_consulta):
+                    bloco = next(iterador)
+            except StopIteration:
+                atual.parcial = False
+                return
+            finally:
+                atual.segundos += time.perf_counter() - inicio
+                _execucao_atual.reset(token)
+            yield bloco
+    finally:
+        logger.info(json.dumps(atual.como_dict(), ensure_ascii=False))
+
+
+class PerfilMiddleware:
+    """
+    Mede cada requisição e devolve o resultado no cabeçalho Server-Timing
+    (aparece na aba Rede do navegador). Em respostas em streaming o cabeçalho
+    sai antes do corpo: ele só conta até a view retornar e a medição do corpo
+    vai para o log e o painel de desempenho quando ele termina.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with execucao(f'{request.method} {request.path}') as atual:
+            resposta = self.get_response(request)
+            atual.status = resposta.status_code
+            # Arquivos (FileResponse) podem ir direto pelo wsgi.file_wrapper,
+            # sem passar pelo streaming_content; não há processamento no corpo.
+            medir_corpo = resposta.streaming and not resposta.is_async and not isinstance(resposta, FileResponse)
+            atual.parcial = medir_corpo
+        resposta['Server-Timing'] = atual.server_timing()
+        if medir_corpo:
+            resposta.streaming_content = _medir_corpo(atual, resposta.streaming_content)
+        return resposta
@@ -0,0 +1,166 @@
+# tarefas.py (EXECUÇÃO EM SEGUNDO PLANO, SEM BROKER EXTERNO)
+#
+# As tarefas ficam na tabela `Tarefa` e rodam em um pool de threads do próprio
+# processo do Django. Os arquivos enviados são gravados em disco antes de a
+# view responder, porque os UploadedFile deixam de existir ao fim do request.
+
+import logging
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import cache_leitura, perfil
+from .models import Tarefa
+from .importacao_lote import importar_lote
+from .motor_analise import executar_conciliacao
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_trava_executor = threading.Lock()
+
+# tipo da tarefa -> função(tarefa, progresso) que retorna o dicionário de resultado
+EXECUTORES = {}
+
+
+def registrar_executor(tipo):
+    """Decorador que associa uma função a um tipo de tarefa."""
+    def decorador(funcao):
+        EXECUTORES[tipo] = funcao
+        return funcao
+    return decorador
+
+
+def diretorio_da_tarefa(tarefa):
+    return Path(settings.DIRETORIO_TAREFAS) / str(tarefa.id)
+
+
+def salvar_uploads(tarefa, arquivos):
+    """
+    Grava os arquivos enviados no diretório da tarefa e retorna (caminhos,
+    hashes), na mesma ordem. O nome original é mantido (com prefixo de ordem)
+    porque os leitores escolhem o formato pela extensão. O hash do conteúdo
+    (chave do cache_leitura) é calculado sobre os mesmos pedaços gravados.
+    """
+    diretorio = diretorio_da_tarefa(tarefa)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    caminhos = []
+    hashes = []
+    for i, arquivo in enumerate(arquivos):
+        caminho = diretorio / f"{i:03d}_{get_valid_filename(arquivo.name)}"
+        resumo = cache_leitura.novo_hash()
+        with open(caminho, 'wb') as destino:
+            for pedaco in arquivo.chunks():
+                resumo.update(pedaco)
+                destino.write(pedaco)
+        caminhos.append(str(caminho))
+        hashes.append(resumo.hexdigest())
+    return caminhos, hashes
+
+
+def atualizar_progresso(tarefa_id, etapa, percentual):
+    logger.debug("Tarefa %s: %s (%s%%)", tarefa_id, etapa, percentual)
+    Tarefa.objects.filter(id=tarefa_id).update(etapa=etapa, progresso=percentual, data_atualizacao=timezone.now())
+
+
+def _executar(tarefa_id):
+    close_old_connections()
+    tarefa = None
+    try:
+        # "Reserva" a tarefa: se outra thread já a pegou, não roda de novo.
+        reservada = Tarefa.objects.filter(id=tarefa_id, status=Tarefa.PENDENTE).update(
+            status=Tarefa.EXECUTANDO, etapa='Iniciando', progresso=0, data_atualizacao=timezone.now()
+        )
+        if not reservada:
+            return
+        tarefa = Tarefa.objects.get(id=tarefa_id)
+
+        def progresso(etapa, percentual):
+            atualizar_progresso(tarefa_id, etapa, percentual)
+
+        with perfil.execucao(f'tarefa {tarefa.tipo} #{tarefa_id}') as execucao:
+            resultado = EXECUTORES[tarefa.tipo](tarefa, progresso)
+            execucao.status = Tarefa.CONCLUIDA
+        Tarefa.objects.filter(id=tarefa_id).update(
+            status=Tarefa.CONCLUIDA, etapa='Concluída', progresso=100, resultado=resultado or {},
+            data_atualizacao=timezone.now()
+        )
+    except Exception as e:
+        logger.exception("Erro na tarefa %s", tarefa_id)
+        Tarefa.objects.filter(id=tarefa_id).update(status=Tarefa.ERRO, erro=str(e), data_atualizacao=timezone.now())
+    finally:
+        if tarefa is not None:
+            shutil.rmtree(diretorio_da_tarefa(tarefa), ignore_errors=True)
+        close_old_connections()
+
+
+def _obter_executor():
+    global _executor
+    with _trava_executor:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TAREFAS_MAX_WORKERS', 2),
+                thread_name_prefix='tarefa'
+            )
+            _retomar_tarefas_interrompidas(_executor)
+        return _executor
+
+
+def _retomar_tarefas_interrompidas(executor):
+    """
+    Na primeira tarefa depois que o processo sobe: as 'pendentes' voltam para a
+    fila e as que estão 'executando' sem progresso há muito tempo são dadas como
+    perdidas (o processo que as rodava morreu). Com vários workers do gunicorn,
+    uma tarefa pendente pode ser enviada por mais de um deles; a reserva em
+    _executar garante que só um a execute.
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'TAREFAS_TEMPO_SEM_PROGRESSO', 1800))
+    Tarefa.objects.filter(status=Tarefa.EXECUTANDO, data_atualizacao__lt=limite).update(
+        status=Tarefa.ERRO, erro='A tarefa foi interrompida (o servidor foi reiniciado).',
+        data_atualizacao=timezone.now()
+    )
+    for tarefa_id in Tarefa.objects.filter(status=Tarefa.PENDENTE).values_list('id', flat=True):
+        executor.submit(_executar, tarefa_id)
+
+
+def enfileirar_tarefa(tarefa):
+    """Agenda a execução da tarefa assim que a transação atual for confirmada."""
+    transaction.on_commit(lambda: _obter_executor().submit(_executar, tarefa.id))
+    return tarefa
+
+
+@registrar_executor('conciliacao')
+def _executar_conciliacao(tarefa, progresso):
+    parametros = tarefa.parametros
+    relatorio = executar_conciliacao(
+        tarefa.usuario,
+        parametros['caminho_extrato'],
+        parametros['caminhos_relatorios'],
+        parametros['mes_referencia'],
+        tolerancia_dias=parametros.get('tolerancia_dias', 0),
+        tolerancia_valor=parametros.get('tolerancia_valor', 0),
+        hashes=parametros.get('hashes'),
+        progresso=progresso,
+    )
+    return {'relatorio_id': relatorio.id}
+
+
+@registrar_executor('importacao_lote')
+def _executar_importacao_lote(tarefa, progresso):
+    parametros = tarefa.parametros
+    return importar_lote(
+        tarefa.usuario,
+        parametros['caminho_zip'],
+        diretorio_da_tarefa(tarefa) / 'lote',
+        tolerancia_dias=parametros.get('tolerancia_dias', 0),
+        tolerancia_valor=parametros.get('tolerancia_valor', 0),
+        incremental=parametros.get('incremental', False),
+        progresso=progresso,
+    )
@@ -0,0 +1,70 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from analisador.busca import buscar_transacoes
+from analisador.models import Extrato, Transacao
+from analisador.tests.utilitarios import configuracoes_de_teste
+
+
+@configuracoes_de_teste
+class BuscaTextualTestes(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('ana', password='senha')
+        self.extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+
+    def criar(self, descricao):
+        return Transacao.objects.create(
+            extrato=self.extrato, usuario=self.usuario, data=datetime.date(2025, 7, 1), descricao=descricao,
+            valor=Decimal('10.00'), topico='Receita', subtopico='Não categorizado',
+        )
+
+    def ids(self, termo, usuario=None):
+        return [transacao.id for transacao in buscar_transacoes(usuario or self.usuario, termo)]
+
+    def test_insert(self):
+        transacao = self.criar('PIX RECEBIDO - MARIA SILVA')
+        Transacao.objects.bulk_create([Transacao(
+            extrato=self.extrato, usuario=self.usuario, data=datetime.date(2025, 7, 2), descricao='TED - JOAO SOUZA',
+            valor=Decimal('5.00'), topico='Receita', subtopico='Não categorizado',
+        )])
+        self.assertEqual(self.ids('maria'), [transacao.id])
+        self.assertEqual(len(self.ids('joao')), 1)
+        outro = User.objects.create_user('bia', password='senha')
+        self.assertEqual(self.ids('maria', outro), [])
+
+    def test_update(self):
+        transacao = self.criar('PIX RECEBIDO - MARIA SILVA')
+        transacao.descricao = 'PIX RECEBIDO - CARLOS LIMA'
+        transacao.save()
+        self.assertEqual(self.ids('maria'), [])
+        self.assertEqual(self.ids('carlos'), [transacao.id])
+        Transacao.objects.filter(id=transacao.id).update(descricao='TARIFA BANCARIA')
+        self.assertEqual(self.ids('carlos'), [])
+        self.assertEqual(self.ids('tarifa'), [transacao.id])
+
+    def test_delete(self):
+        transacao = self.criar('PIX RECEBIDO - MARIA SILVA')
+        self.criar('PIX RECEBIDO - ANA COSTA')
+        transacao.delete()
+        self.assertEqual(self.ids('maria'), [])
+        # DELETE em cascata (apagar o extrato) também sai do índice
+        self.extrato.delete()
+        self.assertEqual(self.ids('pix'), [])
+
+    def test_pagina_de_busca(self):
+        # Prefixo de palavra e texto com operadores do FTS5 não quebram a consulta;
+        # OR e NEAR viram palavras comuns, que também precisam aparecer
+        transacao = self.criar('PIX RECEBIDO - MARIA SILVA')
+        self.client.force_login(self.usuario)
+        for termo, esperado in (
+            ('mar', [transacao.id]), ('"maria" (silva*', [transacao.id]), ('maria OR NEAR(', []), ('***', []),
+        ):
+            with self.subTest(termo=termo):
+                resposta = self.client.get(reverse('buscar_transacoes'), {'q': termo})
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual([t.id for t in resposta.context['transacoes']], esperado)
@@ -0,0 +1,88 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from analisador import cache_analise
+from analisador.cache_analise import DADOS, REGRAS
+from analisador.models import Extrato, Regra, Transacao
+from analisador.tests.utilitarios import configuracoes_de_teste
+
+
+@configuracoes_de_teste
+class CacheAnaliseTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+        self.outro = User.objects.create_user('bia', password='senha')
+
+    def assertVersaoMuda(self, tipo, alterar):
+        antes = cache_analise.versao(tipo, self.usuario.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            alterar()
+        self.assertGreater(cache_analise.versao(tipo, self.usuario.id), antes)
+
+    def test_versao_e_estavel_sem_alteracoes(self):
+        self.assertEqual(cache_analise.versao(REGRAS, self.usuario.id), cache_analise.versao(REGRAS, self.usuario.id))
+
+    def test_invalidacao_sem_incr(self):
+        # Sem a chave da versão (ex.: descartada pelo cache) a invalidação a recria
+        cache.delete(cache_analise._chave_versao(DADOS, self.usuario.id))
+        cache_analise._incrementar_versao(DADOS, self.usuario.id)
+        self.assertIsNotNone(cache.get(cache_analise._chave_versao(DADOS, self.usuario.id)))
+
+    def test_sinais_de_regra(self):
+        regra = Regra.objects.create(usuario=self.usuario, palavra_chave='LUZ', categoria='Energia')
+        versao_dados = cache_analise.versao(DADOS, self.usuario.id)
+        versao_outro = cache_analise.versao(REGRAS, self.outro.id)
+        self.assertVersaoMuda(REGRAS, regra.save)
+        self.assertVersaoMuda(REGRAS, regra.delete)
+        # Só as regras deste usuário foram invalidadas
+        self.assertEqual(cache_analise.versao(DADOS, self.usuario.id), versao_dados)
+        self.assertEqual(cache_analise.versao(REGRAS, self.outro.id), versao_outro)
+
+    def test_sinais_de_dados(self):
+        extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        transacao = Transacao.objects.create(
+            extrato=extrato, usuario=self.usuario, data=datetime.date(2025, 7, 1),
+            descricao='LUZ', valor=Decimal('-80.00'), topico='Despesa', subtopico='Energia',
+        )
+        versao_regras = cache_analise.versao(REGRAS, self.usuario.id)
+        self.assertVersaoMuda(DADOS, transacao.save)
+        self.assertVersaoMuda(DADOS, extrato.save)
+        self.assertVersaoMuda(DADOS, extrato.delete)
+        self.assertEqual(cache_analise.versao(REGRAS, self.usuario.id), versao_regras)
+
+    def test_motor_recompilado_apos_alterar_regras(self):
+        Regra.objects.create(usuario=self.usuario, palavra_chave='LUZ', categoria='Energia')
+        antes = cache_analise.estatisticas_cache()['motor_regras']
+        cache_analise.motor_regras_do_usuario(self.usuario)
+        motor = cache_analise.motor_regras_do_usuario(self.usuario.id)
+        depois = cache_analise.estatisticas_cache()['motor_regras']
+        self.assertEqual((depois['falhas'] - antes['falhas'], depois['acertos'] - antes['acertos']), (1, 1))
+        self.assertEqual(motor.categorizar('CONTA AGUA'), 'Não categorizado')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Regra.objects.create(usuario=self.usuario, palavra_chave='AGUA', categoria='Água')
+        motor = cache_analise.motor_regras_do_usuario(self.usuario)
+        self.assertEqual(cache_analise.estatisticas_cache()['motor_regras']['falhas'] - antes['falhas'], 2)
+        self.assertEqual(motor.categorizar('CONTA AGUA'), 'Água')
+
+    def test_contexto_do_relatorio(self):
+        chamadas = []
+
+        def montar():
+            chamadas.append(1)
+            return {'total': len(chamadas)}
+
+        filtros = {'busca': 'luz'}
+        self.assertEqual(cache_analise.contexto_relatorio_em_cache(self.usuario.id, 1, filtros, montar), {'total': 1})
+        self.assertEqual(cache_analise.contexto_relatorio_em_cache(self.usuario.id, 1, filtros, montar), {'total': 1})
+        # Outros filtros são outra entrada
+        self.assertEqual(cache_analise.contexto_relatorio_em_cache(self.usuario.id, 1, {}, montar), {'total': 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            cache_analise.invalidar(DADOS, self.usuario.id)
+        self.assertEqual(cache_analise.contexto_relatorio_em_cache(self.usuario.id, 1, filtros, montar), {'total': 3})
@@ -0,0 +1,95 @@
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+
+from analisador import cache_leitura, leitura_paralela
+from analisador.motor_analise import (
+    TIPOS, _processar_relatorio_seu_condominio_csv, conciliar_dataframes, ler_arquivos_com_cache,
+)
+from analisador.tests.utilitarios import (
+    DIRETORIO_TESTES, configuracoes_de_teste, extrato_html, ler_extrato_html, relatorio_csv,
+)
+
+
+@configuracoes_de_teste
+class CacheLeituraTestes(SimpleTestCase):
+
+    def setUp(self):
+        # Um diretório por teste: o limite de tamanho conta todos os arquivos dele
+        diretorio = Path(tempfile.mkdtemp(dir=DIRETORIO_TESTES, prefix='cache_leitura_'))
+        configuracao = override_settings(DIRETORIO_CACHE_LEITURA=diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.df = ler_extrato_html(extrato_html(30))
+
+    def test_gravar_e_ler(self):
+        self.assertIsNone(cache_leitura.ler('extrato', 'abc'))
+        cache_leitura.gravar('extrato', 'abc', self.df)
+        self.assertEqual(cache_leitura.ler('extrato', 'abc').to_dict('records'), self.df.to_dict('records'))
+        # Outra versão dos leitores não enxerga a entrada
+        with mock.patch.object(cache_leitura, 'VERSAO_LEITORES', cache_leitura.VERSAO_LEITORES + 1):
+            self.assertIsNone(cache_leitura.ler('extrato', 'abc'))
+
+    def test_arquivo_corrompido_e_descartado(self):
+        caminho = cache_leitura._caminho('extrato', 'abc')
+        caminho.write_bytes(b'lixo')
+        self.assertIsNone(cache_leitura.ler('extrato', 'abc'))
+        self.assertFalse(caminho.exists())
+
+    def test_limite_descarta_os_usados_ha_mais_tempo(self):
+        for indice, hash_ in enumerate(('a', 'b', 'c')):
+            cache_leitura.gravar('extrato', hash_, self.df)
+            os.utime(cache_leitura._caminho('extrato', hash_), (1000 + indice, 1000 + indice))
+        # Ler 'a' o torna o mais recente: quem sai é 'b', depois 'c'
+        self.assertIsNotNone(cache_leitura.ler('extrato', 'a'))
+        tamanho = cache_leitura._caminho('extrato', 'a').stat().st_size
+        cache_leitura.aplicar_limite(2 * tamanho)
+        self.assertEqual([cache_leitura._caminho('extrato', h).exists() for h in 'abc'], [True, False, True])
+        cache_leitura.aplicar_limite(tamanho)
+        self.assertEqual([cache_leitura._caminho('extrato', h).exists() for h in 'abc'], [True, False, False])
+
+    def test_hash_do_arquivo(self):
+        caminho = DIRETORIO_TESTES / 'hash.html'
+        conteudo = extrato_html(30)
+        caminho.write_bytes(conteudo)
+        self.assertEqual(cache_leitura.hash_do_arquivo(caminho, tamanho_bloco=100), hashlib.sha256(conteudo).hexdigest())
+
+    def test_reenvio_identico_nao_e_lido_de_novo(self):
+        caminho = DIRETORIO_TESTES / 'reenvio.html'
+        caminho.write_bytes(extrato_html(30))
+        arquivos = [(leitura_paralela.EXTRATO, str(caminho))]
+        hashes = [cache_leitura.hash_do_arquivo(caminho)]
+        primeira = ler_arquivos_com_cache(arquivos, hashes, progresso=lambda *args: None)
+        with mock.patch.object(leitura_paralela, 'ler_arquivos') as ler_arquivos:
+            segunda = ler_arquivos_com_cache(arquivos, hashes, progresso=lambda *args: None)
+        ler_arquivos.assert_not_called()
+        self.assertEqual(len(segunda[0][0]), len(primeira[0][0]))
+        self.assertIsNone(segunda[0][1])
+
+    def test_tipos_das_colunas_preservados(self):
+        # Centavos em int64 e Topico/Tipo categóricos (com as categorias de TIPOS)
+        # voltam iguais do disco, em Parquet e no pickle usado sem o pyarrow.
+        extrato = self.df
+        relatorio = _processar_relatorio_seu_condominio_csv(io.BytesIO(relatorio_csv(20)))
+        self.assertEqual((extrato['Valor'].dtype, extrato['Topico'].dtype), ('int64', TIPOS))
+        formatos = ['pkl'] + (['parquet'] if cache_leitura.FORMATO == 'parquet' else [])
+        for formato in formatos:
+            with self.subTest(formato=formato), mock.patch.object(cache_leitura, 'FORMATO', formato):
+                cache_leitura.gravar('extrato', 'tipos', extrato)
+                cache_leitura.gravar('relatorio', 'tipos', relatorio)
+                extrato_lido = cache_leitura.ler('extrato', 'tipos')
+                relatorio_lido = cache_leitura.ler('relatorio', 'tipos')
+                pd.testing.assert_frame_equal(extrato_lido, extrato)
+                pd.testing.assert_frame_equal(relatorio_lido, relatorio)
+                # A conciliação com os DataFrames do cache dá o mesmo resultado
+                colunas = ['Data', 'Descricao', 'Valor', 'Topico']
+                esperado = conciliar_dataframes(extrato[colunas], relatorio, tolerancia_dias=2)
+                obtido = conciliar_dataframes(extrato_lido[colunas], relatorio_lido, tolerancia_dias=2)
+                for df_obtido, df_esperado in zip(obtido, esperado):
+                    pd.testing.assert_frame_equal(df_obtido, df_esperado)
@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+import pandas as pd
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from analisador.models import LinhaConciliacao
+from analisador.motor_analise import TIPOS, calcular_totais_conciliacao, conciliar_dataframes, salvar_relatorio_conciliacao
+
+
+def montar(linhas_banco, linhas_relatorio):
+    """Extrato e relatório como saem dos leitores: Valor em centavos (int64) e Tipo categórico."""
+    banco = pd.DataFrame(linhas_banco, columns=['Data', 'Descricao', 'Valor', 'Topico'])
+    banco['Data'] = pd.to_datetime(banco['Data'])
+    banco['Valor'] = banco['Valor'].astype('int64')
+    banco['Topico'] = banco['Topico'].astype(TIPOS)
+    relatorio = pd.DataFrame(linhas_relatorio, columns=['Tipo', 'Data', 'Descricao', 'Fornecedor', 'Valor'])
+    relatorio['Data'] = pd.to_datetime(relatorio['Data'])
+    relatorio['Valor'] = relatorio['Valor'].astype('int64')
+    relatorio['Tipo'] = relatorio['Tipo'].astype(TIPOS)
+    return banco, relatorio
+
+
+class ConciliacaoTestes(SimpleTestCase):
+
+    def test_conciliacao_exata(self):
+        banco, relatorio = montar(
+            [('2025-07-01', 'PIX A', 10000, 'Receita'), ('2025-07-01', 'PIX B', 10000, 'Receita'),
+             ('2025-07-02', 'TARIFA', 350, 'Despesa'), ('2025-07-03', 'SÓ NO BANCO', 999, 'Despesa')],
+            [('Receita', '2025-07-01', 'Cota', 'APTO 1', 10000), ('Receita', '2025-07-01', 'Cota', 'APTO 2', 10000),
+             ('Despesa', '2025-07-02', 'Tarifa', 'BANCO', 350), ('Despesa', '2025-07-05', 'Só no relatório', 'X', 123)],
+        )
+        conciliadas, apenas_banco, apenas_relatorio = conciliar_dataframes(banco, relatorio)
+        # As duas receitas iguais no mesmo dia formam dois pares, não quatro
+        self.assertEqual(len(conciliadas), 3)
+        self.assertEqual(apenas_banco['Descricao_banco'].tolist(), ['SÓ NO BANCO'])
+        self.assertEqual(apenas_relatorio['Descricao_relatorio'].tolist(), ['Só no relatório'])
+        self.assertEqual(conciliadas['Desvio_dias'].tolist(), [0, 0, 0])
+        self.assertEqual(conciliadas['Desvio_valor'].tolist(), [0, 0, 0])
+
+    def test_conciliacao_com_tolerancia(self):
+        banco, relatorio = montar(
+            [('2025-07-10', 'PIX', 10000, 'Receita'), ('2025-07-10', 'TARIFA', 350, 'Despesa')],
+            [('Receita', '2025-07-12', 'Cota', 'APTO 1', 10003), ('Despesa', '2025-07-14', 'Tarifa', 'BANCO', 350)],
+        )
+        conciliadas, apenas_banco, apenas_relatorio = conciliar_dataframes(banco, relatorio)
+        self.assertEqual((len(conciliadas), len(apenas_banco), len(apenas_relatorio)), (0, 2, 2))
+
+        conciliadas, apenas_banco, apenas_relatorio = conciliar_dataframes(
+            banco, relatorio, tolerancia_dias=2, tolerancia_valor=0.05
+        )
+        self.assertEqual(len(conciliadas), 1)
+        par = conciliadas.iloc[0]
+        self.assertEqual((par['Desvio_dias'], par['Desvio_valor']), (2, 3))
+        # A tarifa está 4 dias depois: fora da tolerância
+        self.assertEqual(apenas_banco['Descricao_banco'].tolist(), ['TARIFA'])
+        self.assertEqual(apenas_relatorio['Descricao_relatorio'].tolist(), ['Tarifa'])
+
+
+
+class TotaisConciliacaoTestes(TestCase):
+
+    def test_totais_do_que_foi_apurado_no_extrato(self):
+        banco, relatorio = montar(
+            [('2025-07-01', 'PIX RECEBIDO', 10000, 'Receita'), ('2025-07-02', 'TAR PIX ENVIADO', 150, 'Despesa'),
+             ('2025-07-03', 'Tar Pix Recebido', 50, 'Despesa'), ('2025-07-04', 'LUZ', 8000, 'Despesa')],
+            [('Receita', '2025-07-01', 'Cota', 'APTO 1', 10000), ('Despesa', '2025-07-20', 'Só no relatório', 'X', 999)],
+        )
+        conciliadas, apenas_banco, _ = conciliar_dataframes(banco, relatorio)
+        # O que só está no relatório não entra nos totais
+        self.assertEqual(calcular_totais_conciliacao(conciliadas, apenas_banco), {
+            'total_receitas_apuradas': Decimal('100.00'),
+            'total_despesas_apuradas': Decimal('82.00'),
+            'total_tarifas_pix': Decimal('2.00'),
+        })
+
+    def test_extrato_sem_lancamentos(self):
+        banco, relatorio = montar([], [('Receita', '2025-07-01', 'Cota', 'APTO 1', 10000)])
+        conciliadas, apenas_banco, apenas_relatorio = conciliar_dataframes(banco, relatorio)
+        self.assertEqual((len(conciliadas), len(apenas_banco), len(apenas_relatorio)), (0, 0, 1))
+        self.assertEqual(set(calcular_totais_conciliacao(conciliadas, apenas_banco).values()), {Decimal('0')})
+
+        usuario = User.objects.create_user('ana', password='senha')
+        relatorio_obj = salvar_relatorio_conciliacao(usuario, 'Julho/2025', conciliadas, apenas_banco, apenas_relatorio)
+        self.assertEqual((relatorio_obj.total_receitas_apuradas, relatorio_obj.total_apenas_relatorio), (0, 1))
+        self.assertEqual(relatorio_obj.linhas.filter(secao=LinhaConciliacao.APENAS_RELATORIO).count(), 1)
@@ -0,0 +1,100 @@
+import datetime
+import io
+from decimal import Decimal
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from analisador import exportacao
+from analisador.models import Extrato, LinhaConciliacao, RelatorioConciliacao, Transacao
+from analisador.tests.utilitarios import DIRETORIO_TESTES, configuracoes_de_teste
+
+
+@configuracoes_de_teste
+class ExportacaoTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+        self.client.force_login(self.usuario)
+        self.extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        for dia, descricao, valor, topico in ((2, 'LUZ; CONTA', '-80.50', 'Despesa'), (1, 'PIX RECEBIDO', '100.00', 'Receita')):
+            Transacao.objects.create(
+                extrato=self.extrato, usuario=self.usuario, data=datetime.date(2025, 7, dia), descricao=descricao,
+                valor=Decimal(valor), topico=topico, subtopico='Não categorizado',
+            )
+
+    def baixar(self, nome_url, formato, **kwargs):
+        resposta = self.client.get(reverse(nome_url, kwargs={**kwargs, 'formato': formato}))
+        self.assertEqual(resposta.status_code, 200)
+        return b''.join(resposta.streaming_content)
+
+    def arquivos_em_cache(self):
+        padrao = f'{exportacao.prefixo_extrato(self.extrato)}_v*'
+        return sorted(caminho.name for caminho in (DIRETORIO_TESTES / 'exportacoes').glob(padrao))
+
+    def test_csv_do_extrato(self):
+        corpo = self.baixar('exportar_extrato', 'csv', extrato_id=self.extrato.id).decode('utf-8')
+        linhas = corpo.lstrip('\ufeff').splitlines()
+        self.assertEqual(linhas[0].split(';')[:3], ['Data', 'Descrição', 'Valor'])
+        # Ordem por data, vírgula decimal e o ';' da descrição entre aspas
+        self.assertEqual(linhas[1].split(';')[:3], ['01/07/2025', 'PIX RECEBIDO', '100,00'])
+        self.assertTrue(linhas[2].startswith('02/07/2025;"LUZ; CONTA";-80,50;'))
+
+    def test_arquivo_reaproveitado_ate_os_dados_mudarem(self):
+        primeiro = self.baixar('exportar_extrato', 'csv', extrato_id=self.extrato.id)
+        arquivos = self.arquivos_em_cache()
+        self.assertEqual(len(arquivos), 1)
+        self.assertEqual(self.baixar('exportar_extrato', 'csv', extrato_id=self.extrato.id), primeiro)
+        self.assertEqual(self.arquivos_em_cache(), arquivos)
+
+        transacao = Transacao.objects.get(descricao='PIX RECEBIDO')
+        transacao.descricao = 'PIX RECEBIDO - MARIA'
+        with self.captureOnCommitCallbacks(execute=True):
+            transacao.save()
+        self.assertIn(b'PIX RECEBIDO - MARIA', self.baixar('exportar_extrato', 'csv', extrato_id=self.extrato.id))
+        # A versão nova substitui a antiga no disco
+        self.assertEqual(len(self.arquivos_em_cache()), 1)
+        self.assertNotEqual(self.arquivos_em_cache(), arquivos)
+
+    def test_xlsx_do_extrato(self):
+        pasta = openpyxl.load_workbook(io.BytesIO(self.baixar('exportar_extrato', 'xlsx', extrato_id=self.extrato.id)))
+        linhas = list(pasta['Transações'].iter_rows(values_only=True))
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual(linhas[1][1:3], ('PIX RECEBIDO', 100))
+
+    def test_conciliacao(self):
+        relatorio = RelatorioConciliacao.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        LinhaConciliacao.objects.bulk_create([
+            LinhaConciliacao(relatorio=relatorio, secao=LinhaConciliacao.CONCILIADA, tipo='Receita',
+                             data=datetime.date(2025, 7, 1), valor=Decimal('100.00'), descricao_banco='PIX RECEBIDO'),
+            LinhaConciliacao(relatorio=relatorio, secao=LinhaConciliacao.APENAS_RELATORIO, tipo='Despesa',
+                             data_relatorio=datetime.date(2025, 7, 5), valor_relatorio=Decimal('30.00'),
+                             descricao_relatorio='Jardinagem'),
+        ])
+        pasta = openpyxl.load_workbook(io.BytesIO(self.baixar('exportar_conciliacao', 'xlsx', relatorio_id=relatorio.id)))
+        self.assertEqual(pasta.sheetnames, ['Conciliada', 'Apenas no banco', 'Apenas no relatório'])
+        self.assertEqual([pasta[aba].max_row for aba in pasta.sheetnames], [2, 1, 2])
+
+        resposta = self.client.get(
+            reverse('exportar_conciliacao', kwargs={'relatorio_id': relatorio.id, 'formato': 'csv'}),
+            {'secao': 'apenas_relatorio'},
+        )
+        corpo = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertIn('Jardinagem', corpo)
+        self.assertNotIn('PIX RECEBIDO', corpo)
+
+    def test_formato_secao_e_usuario_invalidos(self):
+        outro = User.objects.create_user('bia', password='senha')
+        extrato_outro = Extrato.objects.create(usuario=outro, mes_referencia='Julho/2025')
+        relatorio = RelatorioConciliacao.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        for url in (
+            reverse('exportar_extrato', kwargs={'extrato_id': self.extrato.id, 'formato': 'pdf'}),
+            reverse('exportar_extrato', kwargs={'extrato_id': extrato_outro.id, 'formato': 'csv'}),
+            reverse('exportar_conciliacao', kwargs={'relatorio_id': relatorio.id, 'formato': 'csv'}) + '?secao=x',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,58 @@
+import io
+import random
+
+from django.test import SimpleTestCase
+
+from analisador.motor_analise import (
+    _processar_formato_sicoob_html, _processar_relatorio_seu_condominio_csv, ler_extrato_excel,
+)
+from analisador.tests.utilitarios import DIRETORIO_TESTES
+from benchmarks import gerador
+from benchmarks.bench_estagios import comparar_com_base
+
+LEITORES = {
+    gerador.CAIXA_XLSX: ler_extrato_excel,
+    gerador.SICOOB_XLSX: ler_extrato_excel,
+    gerador.SICOOB_HTML: _processar_formato_sicoob_html,
+    gerador.CSV_SEU_CONDOMINIO: _processar_relatorio_seu_condominio_csv,
+}
+
+
+class GeradorTestes(SimpleTestCase):
+
+    def test_arquivos_lidos_pelo_motor(self):
+        # O que vai direto para o disco é igual ao gerado na memória, e o motor lê todas as linhas
+        for formato in gerador.FORMATOS:
+            with self.subTest(formato=formato):
+                caminho = DIRETORIO_TESTES / f'gerado.{formato}'
+                gerador.gravar_arquivo(formato, 120, random.Random(3), caminho)
+                conteudo = gerador.GERADORES[formato](120, random.Random(3))
+                if isinstance(conteudo, str):
+                    conteudo = conteudo.encode('utf-8')
+                if not formato.endswith('xlsx'):
+                    self.assertEqual(caminho.read_bytes(), conteudo)
+                self.assertEqual(len(LEITORES[formato](io.BytesIO(conteudo))), 120)
+
+    def test_mesma_semente_mesmo_arquivo(self):
+        self.assertEqual(gerador.gerar_csv_seu_condominio(50, random.Random(9)),
+                         gerador.gerar_csv_seu_condominio(50, random.Random(9)))
+        self.assertNotEqual(gerador.gerar_csv_seu_condominio(50, random.Random(9)),
+                            gerador.gerar_csv_seu_condominio(50, random.Random(10)))
+
+
+class ComparacaoComBaseTestes(SimpleTestCase):
+
+    def test_regressoes(self):
+        base = {
+            'leitura': {'linhas_por_segundo': 1000.0, 'pico_mb': 10.0},
+            'conciliacao': {'linhas_por_segundo': 1000.0, 'pico_mb': 10.0},
+        }
+        resultados = {
+            'leitura': {'linhas_por_segundo': 850.0, 'pico_mb': 11.0},
+            'conciliacao': {'linhas_por_segundo': 700.0, 'pico_mb': 20.0},
+            'novo_estagio': {'linhas_por_segundo': 1.0, 'pico_mb': 99.0},
+        }
+        regressoes = comparar_com_base(resultados, base, limite=0.2)
+        # Dentro do limite não conta; estágio sem base é só avisado
+        self.assertEqual(len(regressoes), 2)
+        self.assertTrue(all(regressao.startswith('conciliacao:') for regressao in regressoes))
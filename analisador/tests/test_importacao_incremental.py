@@ -0,0 +1,99 @@
+import io
+import zipfile
+from unittest import mock
+
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from analisador import tarefas
+from analisador.importacao_lote import importar_lote
+from analisador.models import Extrato, Tarefa, Transacao
+from analisador.motor_analise import salvar_transacoes_em_lote
+from analisador.tests.utilitarios import (
+    DIRETORIO_TESTES, agregados_das_transacoes, agregados_do_resumo, configuracoes_de_teste, extrato_html,
+    ler_extrato_html, relatorio_csv,
+)
+
+
+@configuracoes_de_teste
+class ImportacaoIncrementalTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+
+    def test_reenvio_do_mesmo_extrato_nao_grava_nada(self):
+        extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        conteudo = extrato_html(50)
+        primeira = salvar_transacoes_em_lote(ler_extrato_html(conteudo), extrato, self.usuario, incremental=True)
+        segunda = salvar_transacoes_em_lote(ler_extrato_html(conteudo), extrato, self.usuario, incremental=True)
+        self.assertEqual((primeira, segunda), (50, 0))
+        self.assertEqual(Transacao.objects.filter(extrato=extrato).count(), 50)
+        self.assertEqual(agregados_do_resumo(extrato), agregados_das_transacoes(extrato))
+
+    def test_extrato_atualizado_grava_so_as_linhas_novas(self):
+        extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        df = ler_extrato_html(extrato_html(50))
+        salvar_transacoes_em_lote(df.head(30).copy(), extrato, self.usuario, incremental=True)
+        self.assertEqual(salvar_transacoes_em_lote(df, extrato, self.usuario, incremental=True), 20)
+        self.assertEqual(Transacao.objects.filter(extrato=extrato).count(), 50)
+
+    def test_categorizacao_manual_preservada(self):
+        extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        df = ler_extrato_html(extrato_html(40))
+        salvar_transacoes_em_lote(df.head(25).copy(), extrato, self.usuario, incremental=True)
+        Transacao.objects.filter(extrato=extrato).update(subtopico='Manual', categorizacao_manual=True)
+        salvar_transacoes_em_lote(df, extrato, self.usuario, incremental=True)
+        self.assertEqual(Transacao.objects.filter(extrato=extrato, categorizacao_manual=True).count(), 25)
+        self.assertEqual(Transacao.objects.filter(extrato=extrato).count(), 40)
+
+    def test_linhas_repetidas_no_arquivo(self):
+        # Dois lançamentos iguais no mesmo dia são duas transações, não uma linha já importada
+        extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        df = ler_extrato_html(extrato_html(10))
+        repetido = pd.concat([df, df.tail(1)], ignore_index=True)
+        salvar_transacoes_em_lote(df, extrato, self.usuario, incremental=True)
+        self.assertEqual(salvar_transacoes_em_lote(repetido, extrato, self.usuario, incremental=True), 1)
+        self.assertEqual(salvar_transacoes_em_lote(repetido, extrato, self.usuario, incremental=True), 0)
+        self.assertEqual(agregados_do_resumo(extrato), agregados_das_transacoes(extrato))
+
+    def test_reenvio_do_mesmo_zip(self):
+        caminho_zip = DIRETORIO_TESTES / 'lote_incremental.zip'
+        with zipfile.ZipFile(caminho_zip, 'w') as z:
+            z.writestr('extrato_2025_07.html', extrato_html(40))
+            z.writestr('relatorio_2025_07.csv', relatorio_csv(30))
+
+        primeira = importar_lote(self.usuario, caminho_zip, DIRETORIO_TESTES / 'lote1', incremental=True)
+        total = Transacao.objects.filter(usuario=self.usuario).count()
+        segunda = importar_lote(self.usuario, caminho_zip, DIRETORIO_TESTES / 'lote2', incremental=True)
+
+        self.assertEqual((primeira['erros'], segunda['erros']), (0, 0))
+        self.assertEqual(total, 40)
+        self.assertEqual(Transacao.objects.filter(usuario=self.usuario).count(), total)
+        self.assertEqual(Extrato.objects.filter(usuario=self.usuario).count(), 1)
+        extrato_linha = next(linha for linha in segunda['arquivos'] if linha['tipo'] == 'extrato')
+        self.assertTrue(extrato_linha['mensagem'].startswith('0 lançamento(s) novo(s)'))
+
+    def test_opcao_incremental_do_formulario(self):
+        self.client.force_login(self.usuario)
+        conteudo = io.BytesIO()
+        with zipfile.ZipFile(conteudo, 'w') as z:
+            z.writestr('extrato_2025_07.html', extrato_html(20))
+        for _ in range(2):
+            with self.captureOnCommitCallbacks():
+                self.client.post(reverse('importar_lote'), {
+                    'arquivo_zip': SimpleUploadedFile('lote.zip', conteudo.getvalue()),
+                    'incremental': 'on',
+                })
+            tarefa = Tarefa.objects.filter(usuario=self.usuario).latest('id')
+            self.assertTrue(tarefa.parametros['incremental'])
+            # _executar fecha as conexões antigas, o que derrubaria a transação do teste
+            with mock.patch('analisador.tarefas.close_old_connections'):
+                tarefas._executar(tarefa.id)
+        self.assertEqual(Extrato.objects.filter(usuario=self.usuario).count(), 1)
+        self.assertEqual(Transacao.objects.filter(usuario=self.usuario).count(), 20)
@@ -0,0 +1,115 @@
+import io
+import random
+import zipfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from analisador import tarefas
+from analisador.importacao_lote import extrair_zip, importar_lote
+from analisador.models import Extrato, RelatorioConciliacao, Tarefa
+from analisador.tests.utilitarios import DIRETORIO_TESTES, configuracoes_de_teste, extrato_html, relatorio_csv
+from benchmarks import gerador
+
+
+def gravar_zip(nome, membros):
+    caminho = DIRETORIO_TESTES / nome
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as z:
+        for membro, conteudo in membros.items():
+            z.writestr(membro, conteudo)
+    return caminho
+
+
+@configuracoes_de_teste
+class ExtrairZipTestes(TestCase):
+
+    def test_so_o_nome_de_cada_arquivo(self):
+        caminho_zip = gravar_zip('nomes.zip', {
+            '../../fora.html': b'<html></html>',
+            'julho/relatorio.csv': b'a;b',
+            '__MACOSX/julho/._relatorio.csv': b'',
+            'leia-me.txt': b'texto',
+        })
+        diretorio = DIRETORIO_TESTES / 'extraidos_nomes'
+        arquivos = extrair_zip(caminho_zip, diretorio)
+        self.assertEqual([(a['nome'], a['tipo']) for a in arquivos],
+                         [('fora.html', 'extrato'), ('relatorio.csv', 'relatorio'), ('leia-me.txt', None)])
+        # Nada é gravado fora do diretório da tarefa, nem os arquivos desconhecidos
+        self.assertEqual(sorted(p.name for p in diretorio.iterdir()), ['000_fora.html', '001_relatorio.csv'])
+        self.assertIsNone(arquivos[2]['caminho'])
+
+    def test_limites(self):
+        caminho_zip = gravar_zip('limites.zip', {f'extrato_{i}.html': b'x' * 4096 for i in range(3)})
+        limites = (({'LIMITE_ARQUIVOS_LOTE': 2}, 'limite é 2'), ({'LIMITE_TAMANHO_LOTE_MB': 0}, 'passa de 0 MB'))
+        for configuracao, mensagem in limites:
+            with self.subTest(configuracao=configuracao), override_settings(**configuracao):
+                diretorio = DIRETORIO_TESTES / 'extraidos_limites'
+                with self.assertRaisesMessage(ValueError, mensagem):
+                    extrair_zip(caminho_zip, diretorio)
+                self.assertFalse(diretorio.exists())
+
+    def test_zip_invalido(self):
+        caminho = DIRETORIO_TESTES / 'invalido.zip'
+        caminho.write_bytes(b'nao sou um zip')
+        with self.assertRaisesMessage(ValueError, 'não é um ZIP válido'):
+            extrair_zip(caminho, DIRETORIO_TESTES / 'extraidos_invalido')
+
+
+@configuracoes_de_teste
+class ImportacaoLoteTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+        self.client.force_login(self.usuario)
+
+    def test_meses_e_conciliacao(self):
+        caminho_zip = gravar_zip('lote.zip', {
+            'julho/extrato.html': extrato_html(30),
+            'julho/relatorio.csv': relatorio_csv(20),
+            'relatorio_2025_08.csv': gerador.gerar_csv_seu_condominio(10, random.Random(5), mes='08/2025'),
+            'corrompido.html': b'<html>sem tabela</html>',
+        })
+        resumo = importar_lote(self.usuario, caminho_zip, DIRETORIO_TESTES / 'lote_meses')
+        situacoes = {linha['arquivo']: (linha['mes'], linha['situacao']) for linha in resumo['arquivos']}
+        self.assertEqual(situacoes['extrato.html'], ('Julho/2025', 'importado'))
+        self.assertEqual(situacoes['relatorio.csv'], ('Julho/2025', 'importado'))
+        self.assertEqual(situacoes['relatorio_2025_08.csv'], ('Agosto/2025', 'sem_extrato'))
+        self.assertEqual(situacoes['corrompido.html'][1], 'erro')
+        self.assertEqual((resumo['extratos'], resumo['conciliacoes'], resumo['erros']), (1, 1, 1))
+        self.assertEqual(Extrato.objects.get(usuario=self.usuario).transacao_set.count(), 30)
+        self.assertEqual(RelatorioConciliacao.objects.get(usuario=self.usuario).mes_referencia, 'Julho/2025')
+
+    def test_importacao_em_segundo_plano(self):
+        conteudo = io.BytesIO()
+        with zipfile.ZipFile(conteudo, 'w') as z:
+            z.writestr('extrato_2025_07.html', extrato_html(20))
+        with self.captureOnCommitCallbacks() as agendadas:
+            resposta = self.client.post(reverse('importar_lote'), {
+                'arquivo_zip': SimpleUploadedFile('lote.zip', conteudo.getvalue()),
+            })
+        tarefa = Tarefa.objects.get(usuario=self.usuario)
+        self.assertRedirects(resposta, f"{reverse('importar_lote')}?tarefa={tarefa.id}")
+        self.assertEqual((tarefa.tipo, len(agendadas)), ('importacao_lote', 1))
+
+        # _executar fecha as conexões antigas, o que derrubaria a transação do teste
+        with mock.patch('analisador.tarefas.close_old_connections'):
+            tarefas._executar(tarefa.id)
+        dados = self.client.get(reverse('status_tarefa', kwargs={'tarefa_id': tarefa.id})).json()
+        self.assertEqual(dados['status'], Tarefa.CONCLUIDA)
+        self.assertEqual(dados['resultado']['extratos'], 1)
+        self.assertEqual(dados['url_resultado'], f"{reverse('importar_lote')}?tarefa={tarefa.id}")
+        resposta = self.client.get(dados['url_resultado'])
+        self.assertContains(resposta, 'extrato_2025_07.html')
+
+    def test_pagina_com_tarefa_invalida(self):
+        conciliacao = Tarefa.objects.create(usuario=self.usuario, tipo='conciliacao')
+        for valor in ('abc', '-1', '', str(conciliacao.id)):
+            with self.subTest(tarefa=valor):
+                resposta = self.client.get(reverse('importar_lote'), {'tarefa': valor})
+                self.assertEqual(resposta.status_code, 200)
+                self.assertIsNone(resposta.context['tarefa'])
@@ -0,0 +1,56 @@
+import io
+import random
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from analisador.motor_analise import (
+    _ler_linhas_sicoob_html, _ler_linhas_sicoob_html_bs4, _processar_formato_sicoob_html,
+    _processar_relatorio_seu_condominio_csv,
+)
+from analisador.tests.utilitarios import extrato_html
+from benchmarks import gerador
+
+
+class LeitorSicoobHTMLTestes(SimpleTestCase):
+
+    def test_html_em_streaming_igual_ao_beautifulsoup(self):
+        conteudo = extrato_html(300)
+        novo = _processar_formato_sicoob_html(io.BytesIO(conteudo), streaming=True)
+        antigo = _processar_formato_sicoob_html(io.BytesIO(conteudo), streaming=False)
+        pd.testing.assert_frame_equal(novo, antigo)
+
+    def test_html_com_blocos_cortando_as_tags(self):
+        conteudo = extrato_html(50)
+        esperado = list(_ler_linhas_sicoob_html_bs4(io.BytesIO(conteudo)))
+        self.assertEqual(list(_ler_linhas_sicoob_html(io.BytesIO(conteudo), tamanho_bloco=7)), esperado)
+
+    def test_html_sem_tabela_de_lancamentos(self):
+        with self.assertRaises(ValueError):
+            _processar_formato_sicoob_html(io.BytesIO(b'<html><table><tr><td>nada</td></tr></table></html>'))
+
+
+class LeitorSeuCondominioCSVTestes(SimpleTestCase):
+
+    def test_csv_vetorizado_igual_ao_linha_a_linha(self):
+        conteudo = gerador.gerar_csv_seu_condominio(300, random.Random(3), proporcao_valor_vazio=0.1)
+        novo = _processar_relatorio_seu_condominio_csv(io.BytesIO(conteudo), vetorizado=True)
+        antigo = _processar_relatorio_seu_condominio_csv(io.BytesIO(conteudo), vetorizado=False)
+        pd.testing.assert_frame_equal(novo, antigo)
+        self.assertEqual(set(novo['Tipo']), {'Receita', 'Despesa'})
+
+    def test_secoes_de_receitas_e_despesas(self):
+        conteudo = (
+            'pagador_fornecedor,conta,fornecedor,data,valor\n'
+            'RECEITAS,,,,\n'
+            'Descrição,Conta,Fornecedor,Contabilizado em,Valor\n'
+            'Cota,Conta 1,APTO 1,05/07/2025,100.50\n'
+            'Total de receitas,,,,\n'
+            'DESPESAS,,,,\n'
+            'Luz,Conta 2,ENERGIA,06/07/2025,80.00\n'
+        ).encode('utf-8')
+        for vetorizado in (True, False):
+            with self.subTest(vetorizado=vetorizado):
+                df = _processar_relatorio_seu_condominio_csv(io.BytesIO(conteudo), vetorizado=vetorizado)
+                self.assertEqual(df['Tipo'].tolist(), ['Receita', 'Despesa'])
+                self.assertEqual(df['Valor'].tolist(), [10050, 8000])
@@ -0,0 +1,40 @@
+import random
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from analisador.motor_regras import MotorRegras
+from benchmarks.bench_regras import categorizar_laco_antigo, gerar_descricoes, gerar_regras
+
+
+class MotorRegrasTestes(SimpleTestCase):
+
+    def assertMesmoResultadoDoLacoAntigo(self, regras, descricoes):
+        serie = pd.Series(descricoes, dtype=object)
+        esperado = categorizar_laco_antigo(serie, regras).tolist()
+        motor = MotorRegras(regras)
+        self.assertEqual(motor.categorizar_serie(serie).tolist(), esperado)
+        self.assertEqual([motor.categorizar(descricao) for descricao in descricoes], esperado)
+
+    def test_regras_aleatorias(self):
+        rng = random.Random(7)
+        regras = gerar_regras(200, rng)
+        self.assertMesmoResultadoDoLacoAntigo(regras, gerar_descricoes(2000, regras, rng))
+
+    def test_palavra_chave_repetida(self):
+        # A prioridade é a da primeira ocorrência; a categoria, a da última
+        regras = [('PIX', 'Primeira'), ('TED', 'Transferência'), ('PIX', 'Última'), ('pix', 'Minúscula')]
+        descricoes = ['PIX RECEBIDO', 'TED PIX', 'pix enviado', 'ted', 'boleto']
+        self.assertMesmoResultadoDoLacoAntigo(regras, descricoes)
+        self.assertEqual(MotorRegras(regras).categorizar('TED PIX'), 'Última')
+
+    def test_palavra_chave_vazia(self):
+        # '' está contida em qualquer texto: vale para tudo a partir da sua posição
+        regras = [('TARIFA', 'Tarifas'), ('', 'Todas'), ('PIX', 'Pix')]
+        descricoes = ['TARIFA PIX', 'PIX RECEBIDO', '', 'qualquer coisa', None]
+        self.assertMesmoResultadoDoLacoAntigo(regras, descricoes)
+        self.assertEqual(MotorRegras(regras).categorizar('PIX RECEBIDO'), 'Todas')
+
+    def test_sem_regras(self):
+        self.assertMesmoResultadoDoLacoAntigo([], ['PIX', '', None])
+
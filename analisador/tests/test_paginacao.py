@@ -0,0 +1,113 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from analisador.models import Extrato, Transacao
+from analisador.paginacao import ORDEM_KEYSET, ler_cursor, pagina_keyset
+from analisador.tests.utilitarios import configuracoes_de_teste
+
+
+@configuracoes_de_teste
+class PaginacaoKeysetTestes(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('ana', password='senha')
+        self.extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        rng = random.Random(5)
+        Transacao.objects.bulk_create([
+            Transacao(
+                extrato=self.extrato, usuario=self.usuario,
+                # Poucas datas distintas (muitos empates) e algumas vazias
+                data=None if i % 11 == 0 else datetime.date(2025, 7, rng.randint(1, 4)),
+                descricao=f'LANCAMENTO {i}', valor=Decimal('1.00'), topico='Receita', subtopico='Não categorizado',
+            )
+            for i in range(75)
+        ])
+        self.transacoes = Transacao.objects.filter(extrato=self.extrato)
+
+    def percorrer(self, tamanho):
+        ids, cursor = [], None
+        while True:
+            linhas, cursor = pagina_keyset(self.transacoes, cursor, tamanho)
+            ids += [linha.id for linha in linhas]
+            if cursor is None:
+                return ids
+
+    def test_paginas_cobrem_tudo_na_ordem(self):
+        esperado = list(self.transacoes.order_by(*ORDEM_KEYSET).values_list('id', flat=True))
+        for tamanho in (1, 7, 75, 100):
+            with self.subTest(tamanho=tamanho):
+                self.assertEqual(self.percorrer(tamanho), esperado)
+
+    def test_ordem_estavel_com_insercao_antes_do_cursor(self):
+        primeira, cursor = pagina_keyset(self.transacoes, None, 10)
+        # Uma linha nova que cai antes do cursor não desloca as páginas seguintes
+        Transacao.objects.create(
+            extrato=self.extrato, usuario=self.usuario, data=None, descricao='NOVA',
+            valor=Decimal('1.00'), topico='Receita', subtopico='Não categorizado',
+        )
+        restantes = []
+        while cursor is not None:
+            linhas, cursor = pagina_keyset(self.transacoes, cursor, 10)
+            restantes += [linha.id for linha in linhas]
+        esperado = list(self.transacoes.order_by(*ORDEM_KEYSET).exclude(descricao='NOVA').values_list('id', flat=True))
+        self.assertEqual([linha.id for linha in primeira] + restantes, esperado)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        primeira, _ = pagina_keyset(self.transacoes, None, 10)
+        for cursor in ('', 'abc', '2025-13-40_1', '2025-07-01_x'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(ler_cursor(cursor))
+                self.assertEqual(pagina_keyset(self.transacoes, cursor, 10)[0], primeira)
+
+
+
+@configuracoes_de_teste
+class RelatorioTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+        self.client.force_login(self.usuario)
+        self.extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        for descricao in ('PIX (AGENDADO)', 'PIX RECEBIDO', 'TED.ENVIADA'):
+            Transacao.objects.create(
+                extrato=self.extrato, usuario=self.usuario, data=datetime.date(2025, 7, 1), descricao=descricao,
+                valor=Decimal('10.00'), topico='Receita', subtopico='Não categorizado',
+            )
+
+    def buscar(self, termo):
+        url = reverse('pagina_relatorio', kwargs={'extrato_id': self.extrato.id})
+        resposta = self.client.get(url, {'q': termo})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.context['nao_categorizadas']
+
+    def test_busca_literal_sem_regex(self):
+        self.assertEqual(len(self.buscar('(')), 1)
+        self.assertEqual(len(self.buscar('.')), 1)
+        self.assertEqual(len(self.buscar('pix')), 2)
+
+    def test_primeira_pagina_e_seguintes_usam_o_mesmo_filtro(self):
+        url = reverse('linhas_nao_categorizadas', kwargs={'extrato_id': self.extrato.id})
+        resposta = self.client.get(url, {'q': '.', 'completo': '1'})
+        corpo = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertIn('TED.ENVIADA', corpo)
+        self.assertNotIn('PIX RECEBIDO', corpo)
+
+    @override_settings(TAMANHO_PAGINA_TRANSACOES=2)
+    def test_paginas_sob_demanda(self):
+        # Cada fragmento aponta para o próximo até a última página
+        url = reverse('linhas_nao_categorizadas', kwargs={'extrato_id': self.extrato.id})
+        resposta = self.client.get(url, {'q': 'pix'})
+        self.assertEqual(len(resposta.context['linhas']), 2)
+        self.assertIsNone(resposta.context['url_proxima'])
+        resposta = self.client.get(url)
+        self.assertEqual(len(resposta.context['linhas']), 2)
+        resposta = self.client.get(resposta.context['url_proxima'])
+        self.assertEqual([t.descricao for t in resposta.context['linhas']], ['TED.ENVIADA'])
+        self.assertIsNone(resposta.context['url_proxima'])
@@ -0,0 +1,89 @@
+import datetime
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from analisador import perfil
+from analisador.models import Extrato, Transacao
+from analisador.tests.utilitarios import configuracoes_de_teste
+
+
+@configuracoes_de_teste
+class PerfilTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+
+    def test_estagios_e_consultas_da_execucao(self):
+        @perfil.medir_estagio('contar')
+        def contar():
+            return list(User.objects.all())
+
+        with self.assertLogs('analisador.perfil', 'INFO') as logs:
+            with perfil.execucao('teste') as atual:
+                with perfil.estagio('externo', linhas=10):
+                    with perfil.estagio('interno'):
+                        User.objects.count()
+                contar()
+        self.assertEqual([estagio.nome for estagio in atual.estagios], ['externo', 'interno', 'contar'])
+        self.assertEqual([estagio.linhas for estagio in atual.estagios], [10, None, 1])
+        self.assertEqual(atual.consultas, 2)
+        self.assertIsNone(atual.estagios[0].pico_bytes)
+        registro = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((registro['execucao'], registro['consultas']), ('teste', 2))
+        self.assertIs(perfil.ultimas_execucoes()[0], atual)
+
+    def test_estagio_fora_de_execucao(self):
+        # Sem execução aberta o estágio só mede o próprio bloco
+        with perfil.estagio('solto') as registro:
+            pass
+        self.assertIsNotNone(registro.segundos)
+
+    @override_settings(PERFIL_MEDIR_MEMORIA=True)
+    def test_pico_de_memoria(self):
+        with self.assertLogs('analisador.perfil', 'INFO'):
+            with perfil.execucao('memoria') as atual:
+                with perfil.estagio('alocar'):
+                    bloco = bytearray(5 * 1024 * 1024)
+                    del bloco
+        self.assertGreaterEqual(atual.estagios[0].pico_bytes, 5 * 1024 * 1024)
+
+    def test_execucao_com_erro(self):
+        with self.assertLogs('analisador.perfil', 'INFO'), self.assertRaises(ValueError):
+            with perfil.execucao('falha'):
+                raise ValueError
+        self.assertEqual(perfil.ultimas_execucoes()[0].status, 'erro')
+
+    def test_cabecalho_server_timing(self):
+        self.client.force_login(self.usuario)
+        with self.assertLogs('analisador.perfil', 'INFO'):
+            resposta = self.client.get(reverse('historico'))
+        self.assertEqual(resposta.status_code, 200)
+        partes = [parte.split(';')[0] for parte in resposta['Server-Timing'].split(', ')]
+        self.assertEqual(partes[-2:], ['sql', 'total'])
+
+    def test_resposta_em_streaming(self):
+        # O cabeçalho sai marcado como parcial; a execução se completa com o corpo
+        self.client.force_login(self.usuario)
+        extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        Transacao.objects.create(
+            extrato=extrato, usuario=self.usuario, data=datetime.date(2025, 7, 1), descricao='PIX RECEBIDO',
+            valor=Decimal('10.00'), topico='Receita', subtopico='Não categorizado',
+        )
+        url = reverse('linhas_nao_categorizadas', kwargs={'extrato_id': extrato.id})
+        with self.assertLogs('analisador.perfil', 'INFO') as logs:
+            resposta = self.client.get(url, {'completo': '1'})
+            self.assertIn('parcial;desc=', resposta['Server-Timing'])
+            atual = perfil.ultimas_execucoes()[0]
+            self.assertTrue(atual.parcial)
+            self.assertEqual(logs.records, [])
+            consultas_antes_do_corpo = atual.consultas
+            self.assertIn('PIX RECEBIDO', b''.join(resposta.streaming_content).decode('utf-8'))
+        self.assertFalse(atual.parcial)
+        self.assertGreater(atual.consultas, consultas_antes_do_corpo)
+        self.assertFalse(json.loads(logs.records[-1].getMessage())['parcial'])
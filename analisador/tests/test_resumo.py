@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from analisador.models import Extrato, Regra, Transacao
+from analisador.motor_analise import categorizar_extrato, recategorizar_transacoes, salvar_transacoes_em_lote
+from analisador.tests.utilitarios import (
+    agregados_das_transacoes, agregados_do_resumo, configuracoes_de_teste, extrato_html, ler_extrato_html,
+)
+
+
+@configuracoes_de_teste
+class ResumoExtratoTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+        Regra.objects.create(usuario=self.usuario, palavra_chave='PIX RECEBIDO', categoria='Pix')
+        self.extrato = Extrato.objects.create(usuario=self.usuario, mes_referencia='Julho/2025')
+        df = categorizar_extrato(ler_extrato_html(extrato_html(80)), self.usuario)
+        salvar_transacoes_em_lote(df, self.extrato, self.usuario)
+
+    def assertResumoIgualAsTransacoes(self):
+        self.assertEqual(agregados_do_resumo(self.extrato), agregados_das_transacoes(self.extrato))
+
+    def test_apos_importacao(self):
+        self.assertEqual(Transacao.objects.filter(extrato=self.extrato).count(), 80)
+        self.assertResumoIgualAsTransacoes()
+
+    def test_apos_recategorizacao(self):
+        Regra.objects.create(usuario=self.usuario, palavra_chave='CONDOMINO 1', categoria='Condômino 1')
+        Regra.objects.filter(palavra_chave='PIX RECEBIDO').delete()
+        alteradas = recategorizar_transacoes(self.usuario, palavras_chave=['CONDOMINO 1', 'PIX RECEBIDO'])
+        self.assertGreater(alteradas, 0)
+        self.assertResumoIgualAsTransacoes()
+        self.assertFalse(Transacao.objects.filter(extrato=self.extrato, subtopico='Pix').exists())
+
+    def test_apos_editar_transacao(self):
+        self.client.force_login(self.usuario)
+        transacao = Transacao.objects.filter(extrato=self.extrato).first()
+        resposta = self.client.post(
+            reverse('editar_transacao', kwargs={'transacao_id': transacao.id}),
+            {'descricao': transacao.descricao, 'subtopico': 'Manual'},
+        )
+        self.assertRedirects(resposta, reverse('pagina_relatorio', kwargs={'extrato_id': self.extrato.id}))
+        transacao.refresh_from_db()
+        self.assertTrue(transacao.categorizacao_manual)
+        self.assertResumoIgualAsTransacoes()
+
+    def test_relatorio_apos_editar_transacao(self):
+        # O contexto em cache do relatório não pode sobreviver à edição
+        self.client.force_login(self.usuario)
+        url = reverse('pagina_relatorio', kwargs={'extrato_id': self.extrato.id})
+        self.client.get(url)
+        transacao = Transacao.objects.filter(extrato=self.extrato, topico='Receita').first()
+        self.client.post(
+            reverse('editar_transacao', kwargs={'transacao_id': transacao.id}),
+            {'descricao': transacao.descricao, 'subtopico': 'Manual'},
+        )
+        resposta = self.client.get(url)
+        self.assertIn('Manual', list(resposta.context['resumo_receitas']['Subtópico']))
+
@@ -0,0 +1,50 @@
+import io
+import random
+import re
+import zipfile
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from analisador.motor_analise import _blocos_xml, ler_extrato_excel, sanitize_excel_file
+from benchmarks import gerador
+
+ATRIBUTO_R = re.compile(rb' r="\d+"')
+
+
+class SanitizacaoExcelTestes(SimpleTestCase):
+
+    def setUp(self):
+        self.planilha = gerador.gerar_xlsx_caixa(200, random.Random(4))
+
+    def membros(self, conteudo):
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as z:
+            return {item.filename: z.read(item) for item in z.infolist()}
+
+    def test_remove_o_atributo_r_so_das_planilhas(self):
+        originais = self.membros(self.planilha)
+        self.assertTrue(any(ATRIBUTO_R.search(dados) for nome, dados in originais.items() if 'worksheets/sheet' in nome))
+
+        sanitizados = self.membros(sanitize_excel_file(io.BytesIO(self.planilha)).read())
+        self.assertEqual(list(sanitizados), list(originais))
+        for nome, dados in sanitizados.items():
+            if nome.startswith('xl/worksheets/sheet'):
+                self.assertIsNone(ATRIBUTO_R.search(dados))
+                self.assertEqual(dados, ATRIBUTO_R.sub(b'', originais[nome]))
+            else:
+                self.assertEqual(dados, originais[nome])
+
+    def test_planilha_sanitizada_le_igual(self):
+        sanitizado = sanitize_excel_file(io.BytesIO(self.planilha))
+        pd.testing.assert_frame_equal(ler_extrato_excel(sanitizado), ler_extrato_excel(io.BytesIO(self.planilha)))
+
+    def test_sem_atributo_nao_reescreve(self):
+        sanitizado = io.BytesIO(sanitize_excel_file(io.BytesIO(self.planilha)).read())
+        self.assertIs(sanitize_excel_file(sanitizado), sanitizado)
+        self.assertEqual(sanitizado.tell(), 0)
+
+    def test_blocos_terminam_em_fim_de_tag(self):
+        xml = b'<row r="12"><c t="s"><v>1</v></c></row><row r="13"/>'
+        blocos = list(_blocos_xml(io.BytesIO(xml), tamanho_bloco=5))
+        self.assertEqual(b''.join(blocos), xml)
+        self.assertTrue(all(bloco.endswith(b'>') for bloco in blocos))
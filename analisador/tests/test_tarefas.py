@@ -0,0 +1,86 @@
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from analisador import tarefas
+from analisador.models import Tarefa
+from analisador.tests.utilitarios import configuracoes_de_teste, extrato_html, relatorio_csv
+
+
+@configuracoes_de_teste
+class TarefasTestes(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha')
+        self.client.force_login(self.usuario)
+
+    def status(self, tarefa):
+        resposta = self.client.get(reverse('status_tarefa', kwargs={'tarefa_id': tarefa.id}))
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def executar(self, tarefa):
+        # _executar fecha as conexões antigas, o que derrubaria a transação do teste
+        with mock.patch('analisador.tarefas.close_old_connections'):
+            tarefas._executar(tarefa.id)
+
+    def test_conciliacao_em_segundo_plano(self):
+        with self.captureOnCommitCallbacks() as agendadas:
+            resposta = self.client.post(reverse('home'), {
+                'mes_referencia': 'Julho/2025',
+                'tolerancia_dias': '1',
+                'tolerancia_valor': '0,05',
+                'arquivo_extrato': SimpleUploadedFile('extrato.html', extrato_html(30)),
+                'arquivos_seu_condominio': [SimpleUploadedFile('relatorio.csv', relatorio_csv(20))],
+            })
+        tarefa = Tarefa.objects.get(usuario=self.usuario)
+        self.assertRedirects(resposta, f"{reverse('home')}?tarefa={tarefa.id}")
+        self.assertEqual(len(agendadas), 1)
+        self.assertEqual((tarefa.tipo, tarefa.status), ('conciliacao', Tarefa.PENDENTE))
+        self.assertEqual((tarefa.parametros['tolerancia_dias'], tarefa.parametros['tolerancia_valor']), (1, 0.05))
+        self.assertTrue(all(Path(caminho).exists() for caminho in tarefa.parametros['caminhos_relatorios']))
+        self.assertEqual(self.status(tarefa)['status'], Tarefa.PENDENTE)
+
+        self.executar(tarefa)
+        dados = self.status(tarefa)
+        self.assertEqual((dados['status'], dados['progresso']), (Tarefa.CONCLUIDA, 100))
+        self.assertEqual(
+            dados['url_resultado'], reverse('ver_conciliacao', kwargs={'relatorio_id': dados['resultado']['relatorio_id']})
+        )
+        self.assertFalse(tarefas.diretorio_da_tarefa(tarefa).exists())
+
+    def test_tarefa_com_erro(self):
+        with self.captureOnCommitCallbacks():
+            self.client.post(reverse('home'), {
+                'mes_referencia': 'Julho/2025',
+                'arquivo_extrato': SimpleUploadedFile('extrato.html', b'<html>sem tabela</html>'),
+                'arquivos_seu_condominio': [SimpleUploadedFile('relatorio.csv', relatorio_csv(5))],
+            })
+        tarefa = Tarefa.objects.get(usuario=self.usuario)
+        self.executar(tarefa)
+        dados = self.status(tarefa)
+        self.assertEqual(dados['status'], Tarefa.ERRO)
+        self.assertIn('extrato.html', dados['erro'])
+        self.assertNotIn('url_resultado', dados)
+
+    def test_status_de_tarefa_de_outro_usuario(self):
+        outro = User.objects.create_user('bia', password='senha')
+        tarefa = Tarefa.objects.create(usuario=outro, tipo='conciliacao')
+        resposta = self.client.get(reverse('status_tarefa', kwargs={'tarefa_id': tarefa.id}))
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_pagina_inicial_com_tarefa_invalida(self):
+        tarefa = Tarefa.objects.create(usuario=self.usuario, tipo='conciliacao')
+        for valor in ('abc', '-1', '1.5', ''):
+            with self.subTest(tarefa=valor):
+                resposta = self.client.get(reverse('home'), {'tarefa': valor})
+                self.assertEqual(resposta.status_code, 200)
+                self.assertIsNone(resposta.context['tarefa'])
+        resposta = self.client.get(reverse('home'), {'tarefa': str(tarefa.id)})
+        self.assertEqual(resposta.context['tarefa'], tarefa)
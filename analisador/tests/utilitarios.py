@@ -0,0 +1,55 @@
+import atexit
+import io
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.db.models import Count, Sum
+from django.test import override_settings
+
+from analisador.models import ResumoExtrato, Transacao
+from analisador.motor_analise import _processar_formato_sicoob_html
+from benchmarks import gerador
+
+DIRETORIO_TESTES = Path(tempfile.mkdtemp(prefix='analisador_testes_'))
+atexit.register(shutil.rmtree, DIRETORIO_TESTES, ignore_errors=True)
+
+# Cache só deste processo, arquivos em um diretório temporário e leitura sem
+# processos filhos: os testes não dependem do que estiver em disco.
+configuracoes_de_teste = override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'}},
+    DIRETORIO_TAREFAS=DIRETORIO_TESTES / 'tarefas',
+    DIRETORIO_CACHE_LEITURA=DIRETORIO_TESTES / 'cache_leitura',
+    DIRETORIO_EXPORTACOES=DIRETORIO_TESTES / 'exportacoes',
+    PROCESSOS_LEITURA=1,
+    ALLOWED_HOSTS=['testserver'],
+)
+
+
+def extrato_html(quantidade=60, semente=1):
+    return gerador.gerar_html_sicoob(quantidade, random.Random(semente))
+
+
+def relatorio_csv(quantidade=40, semente=2):
+    return gerador.gerar_csv_seu_condominio(quantidade, random.Random(semente))
+
+
+def ler_extrato_html(conteudo):
+    return _processar_formato_sicoob_html(io.BytesIO(conteudo))
+
+
+def agregados_das_transacoes(extrato):
+    """{(tópico, subtópico): (quantidade, total)} calculado direto das transações."""
+    linhas = (
+        Transacao.objects.filter(extrato=extrato).values('topico', 'subtopico')
+        .annotate(quantidade=Count('id'), total=Sum('valor'))
+    )
+    return {(linha['topico'], linha['subtopico']): (linha['quantidade'], linha['total']) for linha in linhas}
+
+
+def agregados_do_resumo(extrato):
+    return {
+        (resumo.topico, resumo.subtopico): (resumo.quantidade, resumo.total)
+        for resumo in ResumoExtrato.objects.filter(extrato=extrato)
+    }
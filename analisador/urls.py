@@ -3,10 +3,17 @@ from . import views
 
 urlpatterns = [
     path('', views.pagina_inicial, name='home'),
+    path('importar/lote/', views.importar_lote, name='importar_lote'),
+    path('tarefas/<int:tarefa_id>/status/', views.status_tarefa, name='status_tarefa'),
+    path('cache/estatisticas/', views.estatisticas_do_cache, name='estatisticas_do_cache'),
+    path('desempenho/', views.painel_desempenho, name='painel_desempenho'),
     path('regras/', views.gerenciar_regras, name='gerenciar_regras'),
     path('historico/', views.historico_extratos, name='historico'),
+    path('busca/', views.buscar_transacoes, name='buscar_transacoes'),
     path('comparar/', views.comparar_extratos, name='comparar'),
     path('relatorio/<int:extrato_id>/', views.pagina_relatorio, name='pagina_relatorio'),
+    path('relatorio/<int:extrato_id>/nao-categorizadas/', views.linhas_nao_categorizadas, name='linhas_nao_categorizadas'),
+    path('relatorio/<int:extrato_id>/exportar/<str:formato>/', views.exportar_extrato, name='exportar_extrato'),
     path('relatorio/<int:extrato_id>/reprocessar/', views.reprocessar_relatorio, name='reprocessar_relatorio'),
     path('relatorio/<int:extrato_id>/categoria/<str:nome_categoria>/', views.detalhe_categoria, name='detalhe_categoria'),
     path('regras/criar-rapido/', views.criar_regra_rapida, name='criar_regra_rapida'),
@@ -17,5 +24,7 @@ urlpatterns = [
     path('cadastro/', views.cadastro_usuario, name='cadastro'),
     path('regras/criar-em-lote/', views.criar_regras_em_lote, name='criar_regras_em_lote'),
     path('conciliacao/<int:relatorio_id>/', views.ver_conciliacao, name='ver_conciliacao'), 
+    path('conciliacao/<int:relatorio_id>/secao/<str:nome_secao>/', views.linhas_conciliacao, name='linhas_conciliacao'),
+    path('conciliacao/<int:relatorio_id>/exportar/<str:formato>/', views.exportar_conciliacao, name='exportar_conciliacao'),
     path('conciliacao/apagar/<int:relatorio_id>/', views.apagar_conciliacao, name='apagar_conciliacao'),
 ]
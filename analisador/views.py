@@ -1,45 +1,57 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, Http404, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Sum
+from django.conf import settings
 from django.contrib.auth.decorators import login_required 
-from .motor_analise import processar_extrato
-from .models import Regra, Transacao, Extrato, RelatorioConciliacao
+from .motor_analise import recategorizar_transacoes, acumular_delta_resumo, aplicar_deltas_resumo
+from .models import Regra, Transacao, Extrato, RelatorioConciliacao, LinhaConciliacao, ResumoExtrato, Tarefa
 import pandas as pd
 from django.urls import reverse
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
+from itertools import chain
+from django.utils.dateparse import parse_date
 from django.contrib import messages # Importa o sistema de mensagens do Django
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
-from .motor_analise import (
-    _processar_formato_sicoob_html,
-    _processar_formato_caixa,
-    _processar_formato_sicoob,
-    _processar_relatorio_seu_condominio_csv,
-    conciliar_dataframes
-)
+from .tarefas import enfileirar_tarefa, salvar_uploads
+from .cache_analise import contexto_relatorio_em_cache, estatisticas_cache
+from . import busca
+from .paginacao import pagina_keyset, renderizar_em_blocos, montar_cursor
+from . import exportacao
+from . import perfil
+from django.contrib.admin.views.decorators import staff_member_required
 import numpy as np
 
 
-PALAVRAS_DESTAQUE = [
-    "taxa de condomínio", "taxas de condomínio", "arrec extra", "juros por atraso",
-    "multa por atraso", "consumo de gás", "(-) tarifas de recebimentos",
-    "(-) descontos nas cobranças", "fundo de reserva", "fundo reserva", "tar pix", "TAXA DE CONDOMÍNIO JUNHO/2025"
+# Seções do resultado da conciliação: (valor em LinhaConciliacao.secao, nome usado na página)
+SECOES_CONCILIACAO = [
+    (LinhaConciliacao.CONCILIADA, 'conciliadas'),
+    (LinhaConciliacao.APENAS_BANCO, 'apenas_banco'),
+    (LinhaConciliacao.APENAS_RELATORIO, 'apenas_relatorio'),
 ]
 
 
-def marcar_destaques(lista_transacoes, campo_descricao):
-    """
-    Percorre uma lista de transações e retorna uma NOVA LISTA com a chave 'destaque' adicionada.
-    """
-    nova_lista = []
-    if lista_transacoes: # Garante que a lista não está vazia
-        for transacao_original in lista_transacoes:
-            transacao_nova = transacao_original.copy() # Cria uma cópia do dicionário
-            descricao = transacao_nova.get(campo_descricao)
-            transacao_nova['destaque'] = False
-            if isinstance(descricao, str):
-                desc_lower = descricao.lower().strip()
-                if any(palavra in desc_lower for palavra in PALAVRAS_DESTAQUE):
-                    transacao_nova['destaque'] = True
-            nova_lista.append(transacao_nova)
-    return nova_lista
+# Cabeçalho das tabelas de cada seção na listagem completa (ver linhas_conciliacao)
+COLUNAS_SECOES = {
+    'conciliadas': ['Data', 'Descrição no Banco', 'Descrição no Relatório', 'Valor'],
+    'apenas_banco': ['Data', 'Descrição no Banco', 'Valor'],
+    'apenas_relatorio': ['Data', 'Descrição no Relatório', 'Fornecedor', 'Valor'],
+}
+COLUNAS_NAO_CATEGORIZADAS = ['Tópico', 'Data', 'Remetente/Destinatário', 'Valor', 'Origem', 'Ação']
+
+
+def formatar_reais(valor):
+    return f'R$ {valor:,.2f}'.replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _tarefa_da_url(request, **filtros):
+    """Tarefa do usuário indicada em ?tarefa=, ou None se o id faltar, não for um número ou não for dele."""
+    tarefa_id = request.GET.get('tarefa', '')
+    if not tarefa_id.isdigit():
+        return None
+    return Tarefa.objects.filter(id=int(tarefa_id), usuario=request.user, **filtros).first()
 
 
 @login_required
@@ -61,70 +73,119 @@ def pagina_inicial(request):
             return render(request, 'analisador/pagina_inicial.html', contexto)
         
         try:
-            # LÓGICA DE DETECÇÃO DO EXTRATO BANCÁRIO (continua igual)
-            print("Processando extrato do banco...")
-            df_banco = None
-            if arquivo_extrato.name.lower().endswith('.html'):
-                df_banco_bruto = _processar_formato_sicoob_html(arquivo_extrato)
-                df_banco = df_banco_bruto[['Data', 'Descricao', 'Valor', 'Topico']]
-            else:  # Assume .xlsx
-                df_com_skip = pd.read_excel(arquivo_extrato, skiprows=1)
-                df_banco_bruto = None
-                
-                if 'Data Lançamento' in df_com_skip.columns and 'Valor Lançamento' in df_com_skip.columns:
-                    df_banco_bruto = _processar_formato_caixa(df_com_skip)
-                elif 'DATA' in df_com_skip.columns and 'HISTÓRICO' in df_com_skip.columns:
-                    df_banco_bruto = _processar_formato_sicoob(df_com_skip)
-                
-                if df_banco_bruto is not None:
-                    colunas_necessarias = ['Data', 'Descricao', 'Valor', 'Topico']
-                    if all(col in df_banco_bruto.columns for col in colunas_necessarias):
-                        df_banco = df_banco_bruto[colunas_necessarias]
-                    else:
-                        raise ValueError(f"O processador do extrato não retornou as colunas esperadas. Encontradas: {df_banco_bruto.columns.tolist()}")
-                else:
-                    raise ValueError("Formato de extrato bancário Excel não reconhecido.")
-            
-            # --- MUDANÇA 2: Processar cada CSV e juntá-los ---
-            print(f"Processando {len(arquivos_seu_condominio)} relatório(s) 'Seu Condomínio'...")
-            
-            lista_de_dfs = []
-            for arquivo_csv in arquivos_seu_condominio:
-                # A sua função _processar_relatorio_seu_condominio_csv já faz o trabalho pesado para um arquivo.
-                df_individual = _processar_relatorio_seu_condominio_csv(arquivo_csv)
-                lista_de_dfs.append(df_individual)
-            
-            # Juntamos todos os DataFrames da lista em um só.
-            df_seu_condominio = pd.concat(lista_de_dfs, ignore_index=True)
-            
-            # O RESTO DO CÓDIGO CONTINUA IGUAL!
-            # Roda a conciliação
-            conciliadas, apenas_banco, apenas_relatorio = conciliar_dataframes(df_banco, df_seu_condominio)
-
-            # Prepara os dados para salvar
-            conciliadas = conciliadas.replace({np.nan: None})
-            apenas_banco = apenas_banco.replace({np.nan: None})
-            apenas_relatorio = apenas_relatorio.replace({np.nan: None})
-            for df_resultado in [conciliadas, apenas_banco, apenas_relatorio]:
-                if 'Data' in df_resultado.columns:
-                    df_resultado['Data'] = df_resultado['Data'].dt.strftime('%Y-%m-%d')
-
-            # Salva o relatório no banco de dados
-            novo_relatorio = RelatorioConciliacao.objects.create(
-                usuario=request.user,
-                mes_referencia=mes_referencia,
-                conciliadas=conciliadas.to_dict('records'),
-                apenas_banco=apenas_banco.to_dict('records'),
-                apenas_relatorio=apenas_relatorio.to_dict('records')
-            )
-            return redirect('ver_conciliacao', relatorio_id=novo_relatorio.id)
-
-        except Exception as e:
-            messages.error(request, f"Erro ao processar os arquivos: {e}")
+            # Tolerâncias opcionais (dias de compensação e diferença de valor em R$)
+            tolerancia_dias, tolerancia_valor = _tolerancias_do_formulario(request.POST)
+        except ValueError:
+            messages.error(request, 'As tolerâncias de data e valor precisam ser números.')
             return render(request, 'analisador/pagina_inicial.html', contexto)
-    
+
+        # O processamento roda em segundo plano (analisador/tarefas.py); aqui só
+        # guardamos os arquivos e devolvemos a página, que acompanha o progresso.
+        with transaction.atomic():
+            tarefa = Tarefa.objects.create(usuario=request.user, tipo='conciliacao')
+            caminhos, hashes = salvar_uploads(tarefa, [arquivo_extrato] + arquivos_seu_condominio)
+            tarefa.parametros = {
+                'mes_referencia': mes_referencia,
+                'tolerancia_dias': tolerancia_dias,
+                'tolerancia_valor': tolerancia_valor,
+                'caminho_extrato': caminhos[0],
+                'caminhos_relatorios': caminhos[1:],
+                'hashes': hashes,
+            }
+            tarefa.save(update_fields=['parametros'])
+            enfileirar_tarefa(tarefa)
+        return redirect(f"{reverse('home')}?tarefa={tarefa.id}")
+
+    contexto['tarefa'] = _tarefa_da_url(request)
     return render(request, 'analisador/pagina_inicial.html', contexto)
 
+@login_required
+def status_tarefa(request, tarefa_id):
+    """Status da tarefa em JSON, consultado periodicamente pela página inicial."""
+    tarefa = get_object_or_404(Tarefa, id=tarefa_id, usuario=request.user)
+    dados = {
+        'id': tarefa.id,
+        'status': tarefa.status,
+        'etapa': tarefa.etapa,
+        'progresso': tarefa.progresso,
+        'erro': tarefa.erro,
+        'resultado': tarefa.resultado,
+    }
+    relatorio_id = tarefa.resultado.get('relatorio_id')
+    if tarefa.status == Tarefa.CONCLUIDA and relatorio_id:
+        dados['url_resultado'] = reverse('ver_conciliacao', kwargs={'relatorio_id': relatorio_id})
+    elif tarefa.status == Tarefa.CONCLUIDA and tarefa.tipo == 'importacao_lote':
+        dados['url_resultado'] = f"{reverse('importar_lote')}?tarefa={tarefa.id}"
+    return JsonResponse(dados)
+
+
+def _tolerancias_do_formulario(post):
+    """(tolerância em dias, tolerância em R$) do formulário; ValueError se não forem números."""
+    tolerancia_dias = int(post.get('tolerancia_dias') or 0)
+    tolerancia_valor = float((post.get('tolerancia_valor') or '0').replace(',', '.'))
+    return tolerancia_dias, tolerancia_valor
+
+
+@login_required
+def importar_lote(request):
+    """
+    Recebe um ZIP com extratos e relatórios de vários meses e importa tudo em
+    segundo plano (analisador/importacao_lote.py). Com ?tarefa=, mostra o
+    progresso e, ao final, o resumo de cada arquivo.
+    """
+    contexto = {'active_page': 'importar_lote'}
+    if request.method == 'POST':
+        arquivo_zip = request.FILES.get('arquivo_zip')
+        if not arquivo_zip or not arquivo_zip.name.lower().endswith('.zip'):
+            messages.error(request, 'Envie um arquivo .zip com os extratos e relatórios.')
+            return render(request, 'analisador/importar_lote.html', contexto)
+        try:
+            tolerancia_dias, tolerancia_valor = _tolerancias_do_formulario(request.POST)
+        except ValueError:
+            messages.error(request, 'As tolerâncias de data e valor precisam ser números.')
+            return render(request, 'analisador/importar_lote.html', contexto)
+
+        with transaction.atomic():
+            tarefa = Tarefa.objects.create(usuario=request.user, tipo='importacao_lote')
+            caminhos, hashes = salvar_uploads(tarefa, [arquivo_zip])
+            tarefa.parametros = {
+                'caminho_zip': caminhos[0],
+                'tolerancia_dias': tolerancia_dias,
+                'tolerancia_valor': tolerancia_valor,
+                'incremental': request.POST.get('incremental') == 'on',
+            }
+            tarefa.save(update_fields=['parametros'])
+            enfileirar_tarefa(tarefa)
+        return redirect(f"{reverse('importar_lote')}?tarefa={tarefa.id}")
+
+    contexto['tarefa'] = _tarefa_da_url(request, tipo='importacao_lote')
+    return render(request, 'analisador/importar_lote.html', contexto)
+
+
+@staff_member_required
+def estatisticas_do_cache(request):
+    return JsonResponse(estatisticas_cache())
+
+
+@staff_member_required
+def painel_desempenho(request):
+    """Estágios, consultas SQL e tempo das últimas requisições e tarefas deste processo."""
+    execucoes = perfil.ultimas_execucoes()
+    so_com_estagios = request.GET.get('com_estagios') == '1'
+    if so_com_estagios:
+        execucoes = [execucao for execucao in execucoes if execucao.estagios]
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({'execucoes': [execucao.como_dict() for execucao in execucoes], 'cache': estatisticas_cache()})
+    contexto = {
+        'execucoes': [execucao.como_dict() for execucao in execucoes],
+        'so_com_estagios': so_com_estagios,
+        'estatisticas_cache': estatisticas_cache(),
+        'mede_memoria': getattr(settings, 'PERFIL_MEDIR_MEMORIA', False),
+        'active_page': 'desempenho',
+    }
+    return render(request, 'analisador/desempenho.html', contexto)
+
+
 @login_required
 def gerenciar_regras(request):
     extrato_id_origem = request.GET.get('from_report')
@@ -139,6 +200,7 @@ def gerenciar_regras(request):
                 palavra_chave=nova_palavra,
                 categoria=nova_categoria
             )
+            recategorizar_transacoes(request.user, palavras_chave=[nova_palavra])
         
         if extrato_id_origem:
             return redirect(f"{reverse('gerenciar_regras')}?from_report={extrato_id_origem}")
@@ -160,25 +222,16 @@ def detalhe_categoria(request, extrato_id, nome_categoria):
         extrato_id=extrato_id, 
         usuario=request.user, 
         subtopico=nome_categoria
-    ).order_by('data')
+    ).only('id', 'data', 'descricao', 'valor', 'topico').order_by('data', 'id')
 
-
-    # Para cada transação, criamos um novo atributo com a data já formatada
-    for t in transacoes:
-        # Usamos o 'pd.to_datetime' que é robusto para converter os dados
-        data_obj = pd.to_datetime(t.data, errors='coerce')
-        
-        # Verificamos se a data é válida antes de formatar
-        if pd.notna(data_obj):
-            t.data_formatada = data_obj.strftime('%d/%m/%Y')
-        else:
-            t.data_formatada = 'Data Inválida' # Ou pode deixar em branco: ''
-    # =======================================================================
+    # A data já vem do banco como date; a formatação fica no template.
+    total_categoria = transacoes.aggregate(total=Sum('valor'))['total'] or 0
 
     contexto = {
         'extrato': extrato,
         'nome_categoria': nome_categoria,
-        'transacoes': transacoes 
+        'transacoes': transacoes,
+        'total_categoria': total_categoria,
     }
     return render(request, 'analisador/detalhe_categoria.html', contexto)
 
@@ -196,52 +249,148 @@ def historico_extratos(request):
     return render(request, 'analisador/historico.html', contexto)
 
 
+def _data_do_filtro(texto):
+    """Converte o filtro 'AAAA-MM-DD' da página em date (None se vazio ou inválido)."""
+    try:
+        return parse_date(texto) if texto else None
+    except ValueError:
+        return None
+
+
+def limpar_descricao_para_exibicao(d):
+    d_str = str(d or '')
+    if ' - ' in d_str: return d_str.split(' - ')[-1].strip()
+    return d_str
+
+
+def _tamanho_pagina_transacoes():
+    return getattr(settings, 'TAMANHO_PAGINA_TRANSACOES', 200)
+
+
+def _url_linhas_nao_categorizadas(extrato_id, filtros, **extras):
+    parametros = {chave: valor for chave, valor in {**filtros, **extras}.items() if valor}
+    url = reverse('linhas_nao_categorizadas', kwargs={'extrato_id': extrato_id})
+    return f"{url}?{urlencode(parametros)}" if parametros else url
+
+
+def _primeira_pagina_nao_categorizadas(nao_cat_df, extrato, filtros, tamanho_pagina):
+    """
+    Corta as não categorizadas (já na ordem data, id) na primeira página e
+    retorna (DataFrame, URL da próxima página ou None).
+    """
+    if len(nao_cat_df) <= tamanho_pagina:
+        return nao_cat_df, None
+    ultima = nao_cat_df.iloc[tamanho_pagina - 1]
+    data = None if pd.isna(ultima['data']) else ultima['data']
+    url = _url_linhas_nao_categorizadas(extrato.id, filtros, apos=montar_cursor(data, int(ultima['id'])))
+    return nao_cat_df.head(tamanho_pagina), url
+
+
+def _transacoes_filtradas(extrato, search_query, data_inicio, data_fim):
+    """
+    Transações do extrato com os filtros da página do relatório. A primeira
+    página e as páginas seguintes (linhas_nao_categorizadas) usam este mesmo
+    filtro, então a busca é sempre um 'contém' literal, sem regex.
+    """
+    transacoes = Transacao.objects.filter(extrato=extrato)
+    data_inicio_obj = _data_do_filtro(data_inicio)
+    data_fim_obj = _data_do_filtro(data_fim)
+    if data_inicio_obj:
+        transacoes = transacoes.filter(data__gte=data_inicio_obj)
+    if data_fim_obj:
+        transacoes = transacoes.filter(data__lte=data_fim_obj)
+    if search_query:
+        transacoes = transacoes.filter(descricao__icontains=search_query)
+    return transacoes
+
+
+def _nao_categorizadas_filtradas(extrato, search_query, data_inicio, data_fim):
+    return _transacoes_filtradas(extrato, search_query, data_inicio, data_fim).filter(subtopico='Não categorizado')
+
+
+def _contexto_relatorio_pelo_resumo(extrato, resumos, transacoes):
+    """
+    Monta o mesmo contexto de pagina_relatorio a partir das linhas do
+    ResumoExtrato (poucas linhas por extrato) e das transações não
+    categorizadas, sem carregar o extrato inteiro.
+    """
+    df_resumo = pd.DataFrame(resumos).rename(columns={'subtopico': 'Subtópico', 'total': 'Valor'})
+    df_resumo['Valor'] = df_resumo['Valor'].astype(float)
+
+    resumo_d_series = df_resumo[df_resumo['topico'] == 'Despesa'].groupby('Subtópico')['Valor'].sum().sort_values(ascending=False)
+    resumo_r_series = df_resumo[df_resumo['topico'] == 'Receita'].groupby('Subtópico')['Valor'].sum().sort_values(ascending=False)
+    total_r, total_d = resumo_r_series.sum(), resumo_d_series.sum()
+    saldo_l = total_r - total_d
+
+    # Só a primeira página das não categorizadas; o resto vem de linhas_nao_categorizadas
+    tamanho_pagina = _tamanho_pagina_transacoes()
+    nao_cat_df = pd.DataFrame(list(
+        transacoes.filter(subtopico='Não categorizado')
+        .values('id', 'data', 'descricao', 'valor', 'topico', 'origem_descricao')[:tamanho_pagina + 1]
+    ), columns=['id', 'data', 'descricao', 'valor', 'topico', 'origem_descricao'])
+    nao_cat_df, url_mais_nao_categorizadas = _primeira_pagina_nao_categorizadas(nao_cat_df, extrato, {}, tamanho_pagina)
+    nao_cat_df['Valor'] = pd.to_numeric(nao_cat_df['valor'], errors='coerce').fillna(0)
+    nao_cat_df['Data'] = pd.to_datetime(nao_cat_df['data'], errors='coerce').dt.strftime('%d/%m/%Y')
+    nao_cat_df['Remetente_Destinatario'] = nao_cat_df['descricao'].apply(limpar_descricao_para_exibicao)
+    nao_cat_df = nao_cat_df.rename(columns={'topico': 'Tópico'})
+    colunas_desejadas = ['Tópico', 'Data', 'Remetente_Destinatario', 'Valor', 'origem_descricao']
+    nao_cat = nao_cat_df.reindex(columns=colunas_desejadas).fillna('')
+
+    return {
+        'extrato': extrato, 'total_receitas': f'{total_r:,.2f}', 'total_despesas': f'{abs(total_d):,.2f}', 'saldo_liquido': f'{saldo_l:,.2f}',
+        'resumo_despesas': resumo_d_series.reset_index(), 'resumo_receitas': resumo_r_series.reset_index(), 'nao_categorizadas': nao_cat,
+        'valor_total_despesas_detalhe': total_d, 'valor_total_receitas_detalhe': total_r,
+        'labels_grafico': list(resumo_d_series.index), 'dados_grafico': [float(valor) for valor in resumo_d_series.abs().values],
+        'labels_grafico_receitas': list(resumo_r_series.index), 'dados_grafico_receitas': [float(valor) for valor in resumo_r_series.abs().values],
+        'url_mais_nao_categorizadas': url_mais_nao_categorizadas,
+        'search_query': None, 'data_inicio': None, 'data_fim': None,
+    }
+
+
 @login_required
 def pagina_relatorio(request, extrato_id):
     extrato = Extrato.objects.get(id=extrato_id, usuario=request.user)
-    transacoes = Transacao.objects.filter(extrato=extrato)
 
-    
     search_query = request.GET.get('q')
     data_inicio = request.GET.get('data_inicio')
     data_fim = request.GET.get('data_fim')
 
+    # O contexto fica em cache por (usuário, extrato, filtros) até os dados do usuário mudarem
+    contexto = contexto_relatorio_em_cache(
+        request.user.id, extrato.id, (search_query, data_inicio, data_fim),
+        lambda: _montar_contexto_relatorio(extrato, search_query, data_inicio, data_fim)
+    )
+    return render(request, 'analisador/relatorio.html', contexto)
+
+
+def _montar_contexto_relatorio(extrato, search_query, data_inicio, data_fim):
+    # Filtros e ordenação rodam no banco (índice extrato + data), com o mesmo
+    # filtro das páginas seguintes das não categorizadas
+    transacoes = _transacoes_filtradas(extrato, search_query, data_inicio, data_fim).order_by('data', 'id')
+
+    # Sem filtros, os totais e gráficos vêm do resumo materializado (ResumoExtrato)
+    if not (search_query or _data_do_filtro(data_inicio) or _data_do_filtro(data_fim)):
+        resumos = list(ResumoExtrato.objects.filter(extrato=extrato).values('topico', 'subtopico', 'total'))
+        if resumos:
+            return _contexto_relatorio_pelo_resumo(extrato, resumos, transacoes)
+
     # Se não houver transações, retorna um contexto vazio
     if not transacoes.exists():
         contexto_vazio = {
             'extrato': extrato, 'total_receitas': '0,00', 'total_despesas': '0,00', 'saldo_liquido': '0,00',
             'resumo_despesas': pd.DataFrame(), 'resumo_receitas': pd.DataFrame(), 'nao_categorizadas': pd.DataFrame(),
             'labels_grafico': [], 'dados_grafico': [], 'valor_total_despesas_detalhe': 0, 'valor_total_receitas_detalhe': 0,
-            'labels_grafico_receitas': [], 'dados_grafico_receitas': []
+            'labels_grafico_receitas': [], 'dados_grafico_receitas': [], 'url_mais_nao_categorizadas': None,
+            'search_query': search_query, 'data_inicio': data_inicio, 'data_fim': data_fim,
         }
-        return render(request, 'analisador/relatorio.html', contexto_vazio)
+        return contexto_vazio
 
     # --- Início do processamento com Pandas ---
-    df = pd.DataFrame(list(transacoes.values('data', 'descricao', 'valor', 'topico', 'subtopico', 'origem_descricao')))
-
-    # ETAPA DE FILTRO: Aplicar filtros ANTES de qualquer cálculo
-    if not df.empty:
-        df['data_dt'] = pd.to_datetime(df['data'], errors='coerce') # Coluna técnica para filtrar
-        if search_query:
-            df = df[df['descricao'].str.contains(search_query, case=False, na=False)]
-        if data_inicio:
-            df = df[df['data_dt'] >= pd.to_datetime(data_inicio)]
-        if data_fim:
-            df = df[df['data_dt'] <= pd.to_datetime(data_fim)]
-
-    # Se o DataFrame ficou vazio após o filtro, trate como se não houvesse transações
-    if df.empty:
-        # (código para contexto vazio aqui, omitido por brevidade, mas pode ser adicionado se necessário)
-        pass
-
-    # --- Continuação do processamento com o DataFrame (agora já filtrado) ---
+    df = pd.DataFrame(list(transacoes.values('id', 'data', 'descricao', 'valor', 'topico', 'subtopico', 'origem_descricao')))
+
     df['valor'] = pd.to_numeric(df['valor'], errors='coerce').fillna(0)
     df['Data'] = pd.to_datetime(df['data'], errors='coerce').dt.strftime('%d/%m/%Y')
 
-    def limpar_descricao_para_exibicao(d):
-        d_str = str(d or '')
-        if ' - ' in d_str: return d_str.split(' - ')[-1].strip()
-        return d_str
     df['DescricaoLimpa'] = df['descricao'].apply(limpar_descricao_para_exibicao)
 
     df = df.rename(columns={'subtopico': 'Subtópico', 'valor': 'Valor', 'topico': 'Tópico', 'DescricaoLimpa': 'Remetente_Destinatario'})
@@ -257,6 +406,9 @@ def pagina_relatorio(request, extrato_id):
     resumo_r = resumo_r_series.reset_index()
     
     nao_cat_df = df[df['Subtópico'] == 'Não categorizado'].copy()
+    # Só a primeira página vai para o template; o resto vem de linhas_nao_categorizadas
+    filtros = {'q': search_query, 'data_inicio': data_inicio, 'data_fim': data_fim}
+    nao_cat_df, url_mais_nao_categorizadas = _primeira_pagina_nao_categorizadas(nao_cat_df, extrato, filtros, _tamanho_pagina_transacoes())
     colunas_desejadas = ['Tópico', 'Data', 'Remetente_Destinatario', 'Valor', 'origem_descricao']
     nao_cat = nao_cat_df.reindex(columns=colunas_desejadas).fillna('')
     
@@ -275,14 +427,51 @@ def pagina_relatorio(request, extrato_id):
         # Variáveis para os dois gráficos
         'labels_grafico': labels_grafico, 'dados_grafico': dados_grafico,
         'labels_grafico_receitas': labels_grafico_receitas, 'dados_grafico_receitas': dados_grafico_receitas,
+        'url_mais_nao_categorizadas': url_mais_nao_categorizadas,
         # Devolve os filtros para manter os campos preenchidos
         'search_query': search_query, 'data_inicio': data_inicio, 'data_fim': data_fim,
     }
-    return render(request, 'analisador/relatorio.html', contexto)
+    return contexto
+
+
+
 
 
 
+@login_required
+def linhas_nao_categorizadas(request, extrato_id):
+    """
+    Transações não categorizadas do extrato (com os mesmos filtros da página
+    do relatório) a partir do cursor `?apos=`, como fragmento HTML. Com
+    `?completo=1` devolve todas em uma página enviada aos poucos.
+    """
+    extrato = get_object_or_404(Extrato, id=extrato_id, usuario=request.user)
+    filtros = {chave: request.GET.get(chave) for chave in ('q', 'data_inicio', 'data_fim')}
+    transacoes = _nao_categorizadas_filtradas(extrato, filtros['q'], filtros['data_inicio'], filtros['data_fim'])
+    template_linhas = 'analisador/linhas_nao_categorizadas.html'
+
+    if request.GET.get('completo'):
+        titulo = f"Não categorizadas - {extrato.mes_referencia}"
+        url_voltar = reverse('pagina_relatorio', kwargs={'extrato_id': extrato.id})
+        return _listagem_em_streaming(transacoes, template_linhas, titulo, COLUNAS_NAO_CATEGORIZADAS, url_voltar)
 
+    linhas, proximo_cursor = pagina_keyset(transacoes, request.GET.get('apos'), _tamanho_pagina_transacoes())
+    url_proxima = _url_linhas_nao_categorizadas(extrato.id, filtros, apos=proximo_cursor) if proximo_cursor else None
+    return render(request, template_linhas, {'linhas': linhas, 'url_proxima': url_proxima})
+
+
+@login_required
+def buscar_transacoes(request):
+    # Busca em todos os extratos do usuário, pelo índice FTS5, ordenada por relevância
+    termo = request.GET.get('q', '').strip()
+    transacoes = busca.buscar_transacoes(request.user, termo) if termo else []
+    contexto = {
+        'termo': termo,
+        'transacoes': transacoes,
+        'limite': busca.LIMITE_RESULTADOS,
+        'active_page': 'busca',
+    }
+    return render(request, 'analisador/busca.html', contexto)
 
 
 @login_required
@@ -293,19 +482,23 @@ def comparar_extratos(request):
         if len(ids_selecionados) < 2:
             return redirect('comparar')
 
-        transacoes_selecionadas = Transacao.objects.filter(extrato_id__in=ids_selecionados, usuario=request.user)
-        df_transacoes = pd.DataFrame(list(transacoes_selecionadas.values('extrato__mes_referencia', 'subtopico', 'valor', 'topico')))
-        
-        df_transacoes = df_transacoes.rename(columns={'extrato__mes_referencia': 'mes_referencia'})
-        df_despesas = df_transacoes[df_transacoes['topico'] == 'Despesa']
+        # A soma por (categoria, mês) é feita no banco; só a matriz agregada vem para o Pandas.
+        totais = (
+            Transacao.objects.filter(extrato_id__in=ids_selecionados, usuario=request.user, topico='Despesa')
+            .values('subtopico', 'extrato__mes_referencia')
+            .annotate(total=Sum('valor'))
+            .order_by()
+        )
+        df_totais = pd.DataFrame(list(totais), columns=['subtopico', 'extrato__mes_referencia', 'total'])
 
-        if df_despesas.empty:
+        if df_totais.empty:
             tabela_comparativa = pd.DataFrame()
         else:
-            tabela_comparativa = df_despesas.pivot_table(
+            df_totais['total'] = df_totais['total'].astype(float)
+            tabela_comparativa = df_totais.pivot_table(
                 index='subtopico',
-                columns='mes_referencia',
-                values='valor',
+                columns='extrato__mes_referencia',
+                values='total',
                 aggfunc='sum'
             ).fillna(0)
             tabela_comparativa = tabela_comparativa.rename_axis(index='Categoria', columns=None)
@@ -330,25 +523,9 @@ def comparar_extratos(request):
 
 @login_required
 def reprocessar_relatorio(request, extrato_id):
-    # ... (a preparação das regras continua a mesma)
-    regras_do_usuario = Regra.objects.filter(usuario=request.user)
-    regras_de_categorizacao = { regra.palavra_chave: regra.categoria for regra in regras_do_usuario }
-
-    def categorizar_transacao(descricao):
-        # ... (a função de categorizar continua a mesma)
-        if not isinstance(descricao, str): return 'Descrição Inválida'
-        for palavra_chave, categoria in regras_de_categorizacao.items():
-            if palavra_chave.lower() in descricao.lower():
-                return categoria
-        return 'Não categorizado'
-
-    transacoes_para_atualizar = Transacao.objects.filter(extrato_id=extrato_id, usuario=request.user)
-
-    for transacao in transacoes_para_atualizar:
-        # SÓ REPROCESSA SE A TRANSAÇÃO NÃO ESTIVER "TRAVADA"
-        if not transacao.categorizacao_manual:
-            transacao.subtopico = categorizar_transacao(transacao.descricao)
-            transacao.save()
+    # Reprocessa o extrato inteiro. Só grava as transações cuja categoria mudou
+    # e ignora as que estão "travadas" (categorização manual).
+    recategorizar_transacoes(request.user, extrato_id=extrato_id)
 
     messages.success(request, "O relatório foi reprocessado com sucesso!")
     return redirect('pagina_relatorio', extrato_id=extrato_id)
@@ -361,14 +538,17 @@ def criar_regra_rapida(request):
         extrato_id = request.POST.get('extrato_id')
 
         if palavra_chave and categoria:
-            Regra.objects.get_or_create(
+            _, criada = Regra.objects.get_or_create(
                 usuario=request.user,
                 palavra_chave=palavra_chave,
                 defaults={'categoria': categoria}
             )
+            if criada:
+                # Recategoriza só o que a nova regra pode afetar, em todos os extratos do usuário
+                recategorizar_transacoes(request.user, palavras_chave=[palavra_chave])
         
         if extrato_id:
-            return redirect('reprocessar_relatorio', extrato_id=extrato_id)
+            return redirect('pagina_relatorio', extrato_id=extrato_id)
 
     return redirect('home')
 
@@ -376,6 +556,7 @@ def criar_regra_rapida(request):
 def apagar_extrato(request, extrato_id):
     if request.method == 'POST':
         extrato = Extrato.objects.get(id=extrato_id, usuario=request.user)
+        exportacao.descartar_exportacoes(exportacao.prefixo_extrato(extrato))
         extrato.delete()
     
     return redirect('historico')
@@ -387,10 +568,13 @@ def editar_regra(request, regra_id):
     regra = Regra.objects.get(id=regra_id, usuario=request.user)
 
     if request.method == 'POST':
+        palavra_antiga = regra.palavra_chave
         # Pega os novos dados do formulário
         regra.palavra_chave = request.POST.get('palavra_chave')
         regra.categoria = request.POST.get('categoria')
         regra.save() # Salva as alterações
+        # Transações que casavam com a palavra antiga ou casam com a nova podem mudar
+        recategorizar_transacoes(request.user, palavras_chave=[palavra_antiga, regra.palavra_chave])
         return redirect('gerenciar_regras')
 
     contexto = {
@@ -405,6 +589,7 @@ def apagar_regra(request, regra_id):
     if request.method == 'POST':
         regra = Regra.objects.get(id=regra_id, usuario=request.user)
         regra.delete()
+        recategorizar_transacoes(request.user, palavras_chave=[regra.palavra_chave])
     return redirect('gerenciar_regras')
 
 
@@ -414,13 +599,21 @@ def editar_transacao(request, transacao_id):
     transacao = Transacao.objects.get(id=transacao_id, usuario=request.user)
 
     if request.method == 'POST':
+        subtopico_anterior = transacao.subtopico
         transacao.descricao = request.POST.get('descricao')
         transacao.subtopico = request.POST.get('subtopico')
 
         # ATIVA A "TRAVA"
         transacao.categorizacao_manual = True
 
-        transacao.save()
+        with transaction.atomic():
+            transacao.save()
+            if transacao.subtopico != subtopico_anterior:
+                # Move o valor entre as categorias no resumo do extrato
+                deltas = {}
+                acumular_delta_resumo(deltas, transacao.extrato_id, transacao.topico, subtopico_anterior, -1, -transacao.valor)
+                acumular_delta_resumo(deltas, transacao.extrato_id, transacao.topico, transacao.subtopico, 1, transacao.valor)
+                aplicar_deltas_resumo(deltas)
         # Redireciona de volta para o relatório do extrato original
         return redirect('pagina_relatorio', extrato_id=transacao.extrato.id)
 
@@ -469,68 +662,115 @@ def criar_regras_em_lote(request):
                     palavra_chave=palavra,
                     defaults={'categoria': nova_categoria}
                 )
+
+            # Uma única recategorização incremental para todas as palavras novas
+            recategorizar_transacoes(request.user, palavras_chave=palavras_chave)
             
             messages.success(request, f'{len(palavras_chave)} regras foram criadas/atualizadas com a categoria "{nova_categoria}".')
-            # Redireciona para reprocessar o relatório e ver o resultado imediatamente
-            return redirect('reprocessar_relatorio', extrato_id=extrato_id)
+            return redirect('pagina_relatorio', extrato_id=extrato_id)
 
     # Se algo der errado, ou se não for POST, volta para a home
     messages.error(request, 'Ocorreu um erro ao processar a solicitação.')
     return redirect('home')
 
 
+def _tamanho_pagina_conciliacao():
+    return getattr(settings, 'TAMANHO_PAGINA_CONCILIACAO', 200)
+
+
+def _pagina_da_secao(relatorio, secao, nome, cursor=None):
+    """Uma página (keyset) de uma seção, com a URL da próxima quando houver."""
+    linhas, proximo_cursor = pagina_keyset(
+        LinhaConciliacao.objects.filter(relatorio=relatorio, secao=secao), cursor, _tamanho_pagina_conciliacao()
+    )
+    url_proxima = None
+    if proximo_cursor:
+        url = reverse('linhas_conciliacao', kwargs={'relatorio_id': relatorio.id, 'nome_secao': nome})
+        url_proxima = f"{url}?{urlencode({'apos': proximo_cursor})}"
+    return {'linhas': linhas, 'url_proxima': url_proxima}
+
+
 @login_required
 def ver_conciliacao(request, relatorio_id):
-    """Exibe um relatório de conciliação salvo no banco de dados."""
-    relatorio = RelatorioConciliacao.objects.get(id=relatorio_id, usuario=request.user)
-
-    # 1. Carrega os dados originais do banco.
-    conciliadas_originais = relatorio.conciliadas
-    apenas_banco_originais = relatorio.apenas_banco
-    apenas_relatorio_originais = relatorio.apenas_relatorio
+    """
+    Exibe um relatório de conciliação salvo no banco de dados.
+    Contagens, totais e destaques foram calculados quando a conciliação foi
+    gerada; aqui só são lidos. Cada seção traz só a primeira página de linhas;
+    as seguintes são carregadas pela página conforme a rolagem (linhas_conciliacao).
+    """
+    relatorio = get_object_or_404(RelatorioConciliacao, id=relatorio_id, usuario=request.user)
 
-    # 2. Cria NOVAS listas com a lógica de destaque aplicada.
-    lista_conciliadas = marcar_destaques(conciliadas_originais, 'Descricao_relatorio')
-    lista_apenas_relatorio = marcar_destaques(apenas_relatorio_originais, 'Descricao_relatorio')
-    
-    # Usa a lista original do banco, pois ela não tem a coluna de descrição do relatório.
-    lista_apenas_banco = apenas_banco_originais
-
-    # 3. Calcula os totais.
-    transacoes_apuradas = lista_conciliadas + lista_apenas_banco
-    total_receitas_apuradas = 0
-    total_despesas_apuradas = 0
-    total_tarifas_pix = 0
-
-    if transacoes_apuradas:
-        df_apurado = pd.DataFrame(transacoes_apuradas)
-        somas_por_tipo = df_apurado.groupby('Tipo')['Valor'].sum()
-        total_receitas_apuradas = somas_por_tipo.get('Receita', 0)
-        total_despesas_apuradas = somas_por_tipo.get('Despesa', 0)
-        
-        despesas_df = df_apurado[df_apurado['Tipo'] == 'Despesa']
-        if 'Descricao_banco' in despesas_df.columns:
-            tarifas_df = despesas_df[despesas_df['Descricao_banco'].str.upper().str.contains('TAR PIX', na=False)]
-            total_tarifas_pix = tarifas_df['Valor'].sum()
-
-    # 4. Converte as datas para exibição.
-    for item in lista_apenas_banco: item['Data'] = pd.to_datetime(item['Data'])
-    for item in lista_apenas_relatorio: item['Data'] = pd.to_datetime(item['Data'])
-    for item in lista_conciliadas: item['Data'] = pd.to_datetime(item['Data'])
-        
-    # 5. Envia as listas NOVAS e MODIFICADAS para o template.
     contexto = {
-        'conciliadas': lista_conciliadas,
-        'apenas_banco': lista_apenas_banco,
-        'apenas_relatorio': lista_apenas_relatorio,
-        'total_receitas_apuradas': f'R$ {total_receitas_apuradas:,.2f}'.replace(",", "X").replace(".", ",").replace("X", "."),
-        'total_despesas_apuradas': f'R$ {total_despesas_apuradas:,.2f}'.replace(",", "X").replace(".", ",").replace("X", "."),
-        'total_tarifas_pix': f'R$ {total_tarifas_pix:,.2f}'.replace(",", "X").replace(".", ",").replace("X", "."),
+        'relatorio': relatorio,
+        'total_receitas_apuradas': formatar_reais(relatorio.total_receitas_apuradas),
+        'total_despesas_apuradas': formatar_reais(relatorio.total_despesas_apuradas),
+        'total_tarifas_pix': formatar_reais(relatorio.total_tarifas_pix),
         'active_page': 'home',
     }
+    for secao, nome in SECOES_CONCILIACAO:
+        total = getattr(relatorio, f'total_{nome}')
+        contexto[f'total_{nome}'] = total
+        contexto[nome] = _pagina_da_secao(relatorio, secao, nome) if total else None
     return render(request, 'analisador/relatorio.html', contexto)
 
 
+@login_required
+def linhas_conciliacao(request, relatorio_id, nome_secao):
+    """
+    Linhas de uma seção da conciliação a partir do cursor `?apos=`, como
+    fragmento HTML (<tr>...) para a rolagem infinita de ver_conciliacao.
+    Com `?completo=1` devolve a seção inteira em uma página própria, enviada
+    aos poucos (StreamingHttpResponse): a memória do servidor e o tempo até o
+    primeiro byte não dependem do tamanho da seção.
+    """
+    relatorio = get_object_or_404(RelatorioConciliacao, id=relatorio_id, usuario=request.user)
+    secao = dict((nome, secao) for secao, nome in SECOES_CONCILIACAO).get(nome_secao)
+    if secao is None:
+        raise Http404("Seção inexistente.")
+    template_linhas = f'analisador/linhas_{nome_secao}.html'
+
+    if request.GET.get('completo'):
+        linhas = LinhaConciliacao.objects.filter(relatorio=relatorio, secao=secao)
+        titulo = f"{dict(LinhaConciliacao.SECAO_CHOICES)[secao]} - {relatorio.mes_referencia}"
+        url_voltar = reverse('ver_conciliacao', kwargs={'relatorio_id': relatorio.id})
+        return _listagem_em_streaming(linhas, template_linhas, titulo, COLUNAS_SECOES[nome_secao], url_voltar)
+
+    pagina = _pagina_da_secao(relatorio, secao, nome_secao, request.GET.get('apos'))
+    return render(request, template_linhas, pagina)
+
+
+def _listagem_em_streaming(linhas, template_linhas, titulo, colunas, url_voltar):
+    tamanho_bloco = getattr(settings, 'TAMANHO_BLOCO_STREAMING', 500)
+    inicio = render_to_string('analisador/listagem_completa_inicio.html', {
+        'titulo': titulo, 'colunas': colunas, 'url_voltar': url_voltar,
+    })
+    fim = render_to_string('analisador/listagem_completa_fim.html')
+    return StreamingHttpResponse(
+        chain([inicio], renderizar_em_blocos(linhas, template_linhas, {}, tamanho_bloco), [fim]),
+        content_type='text/html; charset=utf-8'
+    )
+
+
+@login_required
+def exportar_extrato(request, extrato_id, formato):
+    if formato not in exportacao.FORMATOS:
+        raise Http404("Formato inválido.")
+    extrato = get_object_or_404(Extrato, id=extrato_id, usuario=request.user)
+    return exportacao.exportar_extrato(extrato, formato)
+
+
+@login_required
+def exportar_conciliacao(request, relatorio_id, formato):
+    """Exporta as três seções (ou só `?secao=<seção>`) da conciliação."""
+    if formato not in exportacao.FORMATOS:
+        raise Http404("Formato inválido.")
+    relatorio = get_object_or_404(RelatorioConciliacao, id=relatorio_id, usuario=request.user)
+    titulos = dict(LinhaConciliacao.SECAO_CHOICES)
+    secoes = [(secao, titulos[secao]) for secao, nome in SECOES_CONCILIACAO
+              if request.GET.get('secao') in (None, '', nome)]
+    if not secoes:
+        raise Http404("Seção inexistente.")
+    return exportacao.exportar_conciliacao(relatorio, secoes, formato)
 
 
 @login_required
@@ -540,6 +780,7 @@ def apagar_conciliacao(request, relatorio_id):
         # Encontra o relatório, garantindo que ele pertence ao usuário logado
         try:
             relatorio = RelatorioConciliacao.objects.get(id=relatorio_id, usuario=request.user)
+            exportacao.descartar_exportacoes(exportacao.prefixo_conciliacao(relatorio))
             relatorio.delete()
             messages.success(request, "Relatório de conciliação apagado com sucesso!")
         except RelatorioConciliacao.DoesNotExist:
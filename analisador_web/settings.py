@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'analisador.perfil.PerfilMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -135,4 +136,81 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/contas/login/'
 
-STATIC_ROOT = BASE_DIR / 'staticfiles'
\ No newline at end of file
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Quantidade de transações gravadas por INSERT ao importar um extrato.
+TAMANHO_LOTE_TRANSACOES = 1000
+
+# Tarefas em segundo plano (analisador/tarefas.py): threads do próprio processo
+# e pasta onde os uploads ficam até a tarefa terminar.
+TAREFAS_MAX_WORKERS = 2
+TAREFAS_TEMPO_SEM_PROGRESSO = 1800  # segundos até uma tarefa 'executando' ser dada como perdida
+DIRETORIO_TAREFAS = BASE_DIR / 'tarefas'
+
+# Processos usados para ler os arquivos de um upload em paralelo
+# (analisador/leitura_paralela.py). None = um por núcleo.
+PROCESSOS_LEITURA = None
+PROCESSOS_LEITURA_CONTEXTO = 'spawn'
+
+# Linhas por página em cada seção do resultado da conciliação.
+TAMANHO_PAGINA_CONCILIACAO = 200
+
+# Cache das análises (regras compiladas, contexto dos relatórios e as versões
+# usadas na invalidação, ver analisador/cache_analise.py). Fica em disco para
+# ser compartilhado pelos workers do gunicorn: com um cache em memória cada
+# processo teria as próprias versões e uma regra alterada num worker não
+# invalidaria o que os outros guardaram. TIMEOUT em segundos. O descarte do
+# FileBasedCache NÃO é LRU: ao passar de MAX_ENTRIES ele apaga primeiro os
+# arquivos expirados e depois uma fração (1/CULL_FREQUENCY) escolhida ao acaso,
+# o que pode levar também a chave de uma versão (tratado em cache_analise.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_django',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    }
+}
+
+# Páginas por cursor (analisador/paginacao.py): linhas por página das
+# transações não categorizadas e linhas por bloco nas listagens completas
+# enviadas com StreamingHttpResponse.
+TAMANHO_PAGINA_TRANSACOES = 200
+TAMANHO_BLOCO_STREAMING = 500
+
+# Arquivos CSV/XLSX já exportados (analisador/exportacao.py), reaproveitados
+# enquanto os dados não mudam.
+DIRETORIO_EXPORTACOES = BASE_DIR / 'exportacoes'
+
+# Medição de desempenho (analisador/perfil.py): quantas requisições/tarefas
+# ficam no painel de desempenho e se o pico de memória de cada estágio é
+# medido (tracemalloc; deixa o processamento bem mais lento).
+PERFIL_ULTIMAS_EXECUCOES = 100
+PERFIL_MEDIR_MEMORIA = False
+
+# Uma linha JSON por requisição/tarefa no console (nível DEBUG: uma por estágio).
+# As mensagens de depuração do processamento (lotes gravados, progresso das
+# tarefas, cache de leitura...) vão para o logger 'analisador': aparecem
+# trocando o nível dele para 'DEBUG'.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'analisador.perfil': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'analisador': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# DataFrames dos arquivos já lidos (analisador/cache_leitura.py), pelo hash do
+# conteúdo: um reenvio do mesmo arquivo não é lido de novo. Ao passar do
+# limite, os usados há mais tempo são apagados.
+DIRETORIO_CACHE_LEITURA = BASE_DIR / 'cache_leitura'
+LIMITE_CACHE_LEITURA_MB = 512
+
+# Importação em lote (analisador/importacao_lote.py): limites do ZIP enviado,
+# em quantidade de arquivos e tamanho total descompactado.
+LIMITE_ARQUIVOS_LOTE = 100
+LIMITE_TAMANHO_LOTE_MB = 500
@@ -0,0 +1,235 @@
+"""
+Mede cada estágio do motor_analise em arquivos gerados pelo benchmarks.gerador:
+sanitização do .xlsx, leitura de cada formato, categorização, gravação no
+banco (completa e incremental) e conciliação. Para cada estágio registra o throughput (linhas/s, o
+melhor de --repeticoes execuções) e o pico de memória (tracemalloc, em uma
+execução separada, porque ele distorce o tempo).
+
+Com --salvar-base os números viram a base de comparação em base_estagios.json
+(uma entrada por número de linhas). Sem ele, o resultado é comparado com a
+base e o script termina com erro se algum estágio ficar mais lento ou usar
+mais memória do que a base além de --limite. A base depende da máquina:
+gere-a de novo ao trocar de máquina.
+
+Uso: python -m benchmarks.bench_estagios --linhas 20000
+     python -m benchmarks.bench_estagios --linhas 20000 --salvar-base
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'analisador_web.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import pandas as pd  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from analisador.models import Extrato  # noqa: E402
+from analisador.motor_analise import (  # noqa: E402
+    _processar_formato_sicoob_html, _processar_relatorio_seu_condominio_csv, conciliar_dataframes,
+    ler_extrato_excel, salvar_transacoes_em_lote, sanitize_excel_file,
+)
+from analisador.motor_regras import MotorRegras  # noqa: E402
+from benchmarks import gerador  # noqa: E402
+
+BASE_PADRAO = Path(__file__).with_name('base_estagios.json')
+
+# Folga absoluta no pico de memória: em estágios que usam poucos KB, uma
+# variação pequena não deve contar como regressão.
+FOLGA_MEMORIA_MB = 0.5
+
+QUANTIDADE_REGRAS = 300
+
+
+def gerar_regras(quantidade, rng):
+    """Regras com as contrapartes do gerador (que casam) e palavras aleatórias (que não casam)."""
+    regras = [(contraparte.split()[0], f'Categoria {i}') for i, contraparte in enumerate(gerador.CONTRAPARTES)]
+    while len(regras) < quantidade:
+        palavra = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(5, 12)))
+        regras.append((palavra, f'Categoria {len(regras) % 40}'))
+    return regras
+
+
+def montar_relatorio(df_banco, df_csv, rng):
+    """
+    Relatório para a conciliação: 80% dos lançamentos do banco (alguns com a
+    data deslocada em até 2 dias, para a fase com tolerância) e linhas do CSV
+    que não existem no banco.
+    """
+    amostra = df_banco.sample(frac=0.8, random_state=rng.randint(0, 10**6))
+    relatorio = pd.DataFrame({
+        'Data': amostra['Data'].to_numpy(),
+        'Descricao': amostra['Descricao'].to_numpy(),
+        'Fornecedor': '',
+        'Valor': amostra['Valor'].to_numpy(),
+        'Tipo': amostra['Topico'].array,
+    })
+    deslocadas = relatorio.sample(frac=0.1, random_state=rng.randint(0, 10**6)).index
+    relatorio.loc[deslocadas, 'Data'] += pd.to_timedelta([rng.randint(1, 2) for _ in deslocadas], unit='D')
+    extras = df_csv.sample(n=min(len(df_csv), len(df_banco) // 10), random_state=rng.randint(0, 10**6))
+    return pd.concat([relatorio, extras[relatorio.columns]], ignore_index=True)
+
+
+def preparar_estagios(linhas, rng, usuario):
+    """
+    Gera os arquivos e retorna {estágio: (função, linhas processadas)}.
+    Cada estágio recebe a saída já pronta do anterior, para medir só ele.
+    """
+    caixa = gerador.gerar_xlsx_caixa(linhas, rng)
+    sicoob = gerador.gerar_xlsx_sicoob(linhas, rng)
+    html = gerador.gerar_html_sicoob(linhas, rng)
+    relatorio_csv = gerador.gerar_csv_seu_condominio(linhas, rng)
+
+    caixa_sanitizado = sanitize_excel_file(io.BytesIO(caixa)).read()
+    df_banco = ler_extrato_excel(io.BytesIO(caixa_sanitizado))
+    df_csv = _processar_relatorio_seu_condominio_csv(io.BytesIO(relatorio_csv))
+    motor = MotorRegras(gerar_regras(QUANTIDADE_REGRAS, rng))
+    df_banco['Descricao'] = df_banco['Descricao'].fillna('').astype(str)
+    df_banco['Subtopico'] = motor.categorizar_serie(df_banco['Descricao'])
+    df_relatorio = montar_relatorio(df_banco, df_csv, rng)
+    colunas_banco = ['Data', 'Descricao', 'Valor', 'Topico']
+
+    def gravar():
+        extrato = Extrato.objects.create(usuario=usuario, mes_referencia='Julho/2025')
+        salvar_transacoes_em_lote(df_banco, extrato, usuario)
+
+    # Reenvio do mesmo extrato no modo incremental: todas as linhas já existem,
+    # então mede só as impressões digitais e a consulta pelo índice.
+    extrato_importado = Extrato.objects.create(usuario=usuario, mes_referencia='Julho/2025')
+    salvar_transacoes_em_lote(df_banco, extrato_importado, usuario)
+
+    return {
+        'sanitizar': (lambda: sanitize_excel_file(io.BytesIO(caixa)), linhas),
+        'ler_caixa_xlsx': (lambda: ler_extrato_excel(io.BytesIO(caixa_sanitizado)), linhas),
+        'ler_sicoob_xlsx': (lambda: ler_extrato_excel(io.BytesIO(sicoob)), linhas),
+        'ler_sicoob_html': (lambda: _processar_formato_sicoob_html(io.BytesIO(html)), linhas),
+        'ler_csv_seu_condominio': (lambda: _processar_relatorio_seu_condominio_csv(io.BytesIO(relatorio_csv)), linhas),
+        'categorizar': (lambda: motor.categorizar_serie(df_banco['Descricao']), len(df_banco)),
+        'gravar': (gravar, len(df_banco)),
+        'gravar_incremental': (lambda: salvar_transacoes_em_lote(df_banco, extrato_importado, usuario, incremental=True), len(df_banco)),
+        'conciliar': (
+            lambda: conciliar_dataframes(df_banco[colunas_banco], df_relatorio, tolerancia_dias=2, tolerancia_valor=0.05),
+            len(df_banco) + len(df_relatorio),
+        ),
+    }
+
+
+def medir(funcao, linhas, repeticoes):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+
+        tracemalloc.start()
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    segundos = min(tempos)
+    return {
+        'linhas': linhas,
+        'segundos': round(segundos, 4),
+        'linhas_por_segundo': round(linhas / segundos, 1),
+        'pico_mb': round(pico / 1024 / 1024, 2),
+    }
+
+
+def comparar_com_base(resultados, base, limite):
+    """Retorna a lista de regressões (texto) de cada estágio em relação à base."""
+    regressoes = []
+    for estagio, atual in resultados.items():
+        referencia = base.get(estagio)
+        if referencia is None:
+            print(f"  {estagio}: sem base para comparar")
+            continue
+        minimo_throughput = referencia['linhas_por_segundo'] * (1 - limite)
+        maximo_memoria = referencia['pico_mb'] * (1 + limite) + FOLGA_MEMORIA_MB
+        if atual['linhas_por_segundo'] < minimo_throughput:
+            regressoes.append(
+                f"{estagio}: {atual['linhas_por_segundo']:.0f} linhas/s, base {referencia['linhas_por_segundo']:.0f}"
+            )
+        if atual['pico_mb'] > maximo_memoria:
+            regressoes.append(f"{estagio}: pico de {atual['pico_mb']:.1f} MB, base {referencia['pico_mb']:.1f} MB")
+    return regressoes
+
+
+@contextlib.contextmanager
+def banco_de_teste():
+    """Banco SQLite de teste em arquivo temporário (com as migrações e as triggers da busca)."""
+    diretorio = tempfile.mkdtemp()
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(diretorio, 'bench.sqlite3')
+    nome_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nome_original, verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=20000)
+    parser.add_argument('--estagios', nargs='+', help="Só estes estágios (padrão: todos).")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--limite', type=float, default=0.25,
+                        help="Regressão tolerada: 0.25 = até 25%% menos linhas/s ou 25%% mais memória.")
+    parser.add_argument('--base', type=Path, default=BASE_PADRAO)
+    parser.add_argument('--salvar-base', action='store_true', help="Grava o resultado como base em vez de comparar.")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    with banco_de_teste():
+        usuario = User.objects.create_user('benchmark', password='benchmark')
+        with contextlib.redirect_stdout(io.StringIO()):
+            estagios = preparar_estagios(args.linhas, random.Random(args.semente), usuario)
+
+        desconhecidos = set(args.estagios or []) - set(estagios)
+        if desconhecidos:
+            raise SystemExit(f"ERRO: estágios desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+        resultados = {}
+        print(f"Linhas: {args.linhas} | repetições: {args.repeticoes}")
+        for estagio, (funcao, linhas) in estagios.items():
+            if args.estagios and estagio not in args.estagios:
+                continue
+            resultados[estagio] = medir(funcao, linhas, args.repeticoes)
+            r = resultados[estagio]
+            print(f"{estagio:24} {r['segundos']:8.3f} s | {r['linhas_por_segundo']:11.0f} linhas/s | pico {r['pico_mb']:7.1f} MB")
+
+    bases = json.loads(args.base.read_text(encoding='utf-8')) if args.base.exists() else {}
+    chave = str(args.linhas)
+
+    if args.salvar_base:
+        bases[chave] = {**bases.get(chave, {}), **resultados}
+        args.base.write_text(json.dumps(bases, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f"Base gravada em {args.base} ({chave} linhas).")
+        return
+
+    if chave not in bases:
+        print(f"Sem base para {chave} linhas em {args.base}; rode com --salvar-base para criar.")
+        return
+
+    print(f"Comparando com a base (limite de {args.limite:.0%}):")
+    regressoes = comparar_com_base(resultados, bases[chave], args.limite)
+    if regressoes:
+        raise SystemExit("ERRO: regressão de desempenho\n  " + "\n  ".join(regressoes))
+    print("Nenhuma regressão.")
+
+
+if __name__ == '__main__':
+    main()
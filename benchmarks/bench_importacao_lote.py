@@ -0,0 +1,80 @@
+"""
+Mede a importação em lote (analisador/importacao_lote.py) com um ZIP de
+vários meses gerado pelo benchmarks.gerador: um extrato por mês (alternando
+Caixa .xlsx, Sicoob .xlsx e Sicoob .html) e um relatório CSV por mês.
+Reporta a vazão em arquivos por minuto e confere o resumo de cada arquivo.
+
+Uso: python -m benchmarks.bench_importacao_lote --meses 12 --linhas 5000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'analisador_web.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from analisador.importacao_lote import IMPORTADO, importar_lote  # noqa: E402
+from benchmarks import gerador  # noqa: E402
+from benchmarks.bench_estagios import banco_de_teste  # noqa: E402
+
+FORMATOS_EXTRATO = [
+    (gerador.CAIXA_XLSX, 'xlsx'),
+    (gerador.SICOOB_XLSX, 'xlsx'),
+    (gerador.SICOOB_HTML, 'html'),
+]
+
+
+def gerar_zip(caminho, meses, linhas, rng):
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as z:
+        for i in range(meses):
+            mes = f"{i % 12 + 1:02d}/{2024 + i // 12}"
+            formato, extensao = FORMATOS_EXTRATO[i % len(FORMATOS_EXTRATO)]
+            nome = mes.replace('/', '_')
+            z.writestr(f'extratos/extrato_{nome}.{extensao}', gerador.GERADORES[formato](linhas, rng, mes=mes))
+            z.writestr(f'relatorios/relatorio_{nome}.csv', gerador.gerar_csv_seu_condominio(linhas, rng, mes=mes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--meses', type=int, default=12)
+    parser.add_argument('--linhas', type=int, default=5000, help="Lançamentos por arquivo.")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    diretorio = Path(tempfile.mkdtemp())
+    caminho_zip = diretorio / 'lote.zip'
+    gerar_zip(caminho_zip, args.meses, args.linhas, random.Random(args.semente))
+    print(f"ZIP: {caminho_zip.stat().st_size / 1024 / 1024:.1f} MB, {args.meses * 2} arquivos de {args.linhas} linhas")
+
+    # Cache de leitura vazio, em diretório temporário: a segunda rodada mede o reenvio do mesmo ZIP.
+    with banco_de_teste(), override_settings(DIRETORIO_CACHE_LEITURA=diretorio / 'cache_leitura'):
+        usuario = User.objects.create_user('benchmark', password='benchmark')
+        for rodada in ('sem cache', 'com cache'):
+            with contextlib.redirect_stdout(io.StringIO()):
+                inicio = time.perf_counter()
+                resumo = importar_lote(usuario, caminho_zip, diretorio / rodada.replace(' ', '_'))
+                duracao = time.perf_counter() - inicio
+            nao_importados = [linha for linha in resumo['arquivos'] if linha['situacao'] != IMPORTADO]
+            if nao_importados:
+                raise SystemExit(f"ERRO: arquivos não importados: {nao_importados}")
+            print(
+                f"{rodada:10} {duracao:7.2f} s | {len(resumo['arquivos']) * 60 / duracao:7.1f} arquivos/min | "
+                f"{resumo['extratos']} extratos, {resumo['conciliacoes']} conciliações"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compara a leitura serial de um lote de uploads (1 extrato HTML do Sicoob +
+N relatórios CSV do "Seu Condomínio") com a leitura em paralelo de
+analisador.leitura_paralela, e confere que os DataFrames saem iguais e na
+mesma ordem.
+
+Uso: python -m benchmarks.bench_leitura_paralela --relatorios 12 --processos 4
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'analisador_web.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from analisador import leitura_paralela  # noqa: E402
+from benchmarks.gerador import gerar_csv_seu_condominio, gerar_html_sicoob  # noqa: E402
+
+
+def gerar_lote(diretorio, quantidade_relatorios, linhas, rng):
+    caminho_extrato = os.path.join(diretorio, 'extrato.html')
+    with open(caminho_extrato, 'wb') as arquivo:
+        arquivo.write(gerar_html_sicoob(linhas, rng))
+    arquivos = [(leitura_paralela.EXTRATO, caminho_extrato)]
+    for i in range(quantidade_relatorios):
+        caminho = os.path.join(diretorio, f'relatorio_{i:02d}.csv')
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(gerar_csv_seu_condominio(linhas, rng))
+        arquivos.append((leitura_paralela.RELATORIO, caminho))
+    return arquivos
+
+
+def ler_serial(arquivos):
+    return [leitura_paralela._ler_arquivo(tipo, caminho) for tipo, caminho in arquivos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--relatorios', type=int, default=12)
+    parser.add_argument('--linhas', type=int, default=20000, help='linhas por arquivo')
+    parser.add_argument('--processos', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    settings.PROCESSOS_LEITURA = args.processos
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivos = gerar_lote(diretorio, args.relatorios, args.linhas, rng)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Aquece o pool (a criação dos processos é paga uma vez por servidor)
+            leitura_paralela.ler_arquivos(arquivos[:2])
+
+            inicio = time.perf_counter()
+            serial = ler_serial(arquivos)
+            tempo_serial = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            paralelo = leitura_paralela.ler_arquivos(arquivos)
+            tempo_paralelo = time.perf_counter() - inicio
+
+    assert all(erro is None for _, erro in paralelo), [erro for _, erro in paralelo if erro]
+    assert all(a.equals(b) for a, (b, _) in zip(serial, paralelo)), "resultados diferentes"
+
+    print(f"Arquivos: 1 extrato + {args.relatorios} relatórios, {args.linhas} linhas cada")
+    print(f"Serial:              {tempo_serial:7.2f} s")
+    print(f"Paralelo ({args.processos} proc.):  {tempo_paralelo:7.2f} s")
+    print(f"Ganho: {tempo_serial / tempo_paralelo:.1f}x (núcleos disponíveis: {os.cpu_count()})")
+
+
+if __name__ == '__main__':
+    main()
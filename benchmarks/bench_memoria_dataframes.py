@@ -0,0 +1,87 @@
+"""
+Mede a memória dos DataFrames que o motor_analise mantém (memory_usage com
+deep=True, que conta também o conteúdo das strings), nos arquivos gerados
+pelo benchmarks.gerador: o extrato padronizado de cada formato, o relatório
+CSV, o extrato categorizado e o resultado da conciliação.
+
+Uso: python -m benchmarks.bench_memoria_dataframes --linhas 20000
+     python -m benchmarks.bench_memoria_dataframes --linhas 20000 --colunas
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'analisador_web.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from analisador.motor_analise import (  # noqa: E402
+    _processar_formato_sicoob_html, _processar_relatorio_seu_condominio_csv, conciliar_dataframes,
+    ler_extrato_excel, sanitize_excel_file,
+)
+from analisador.motor_regras import MotorRegras  # noqa: E402
+from benchmarks import gerador  # noqa: E402
+from benchmarks.bench_estagios import QUANTIDADE_REGRAS, gerar_regras, montar_relatorio  # noqa: E402
+
+
+def megabytes(df):
+    return df.memory_usage(index=True, deep=True).sum() / 1024 / 1024
+
+
+def montar_dataframes(linhas, rng):
+    """{nome: DataFrame ou lista de DataFrames} com as saídas de cada etapa."""
+    caixa = sanitize_excel_file(io.BytesIO(gerador.gerar_xlsx_caixa(linhas, rng))).read()
+    sicoob = gerador.gerar_xlsx_sicoob(linhas, rng)
+    html = gerador.gerar_html_sicoob(linhas, rng)
+    relatorio_csv = gerador.gerar_csv_seu_condominio(linhas, rng)
+
+    df_caixa = ler_extrato_excel(io.BytesIO(caixa))
+    df_csv = _processar_relatorio_seu_condominio_csv(io.BytesIO(relatorio_csv))
+    dataframes = {
+        'extrato_caixa_xlsx': df_caixa.copy(),
+        'extrato_sicoob_xlsx': ler_extrato_excel(io.BytesIO(sicoob)),
+        'extrato_sicoob_html': _processar_formato_sicoob_html(io.BytesIO(html)),
+        'relatorio_csv': df_csv,
+    }
+
+    # Mesma categorização do categorizar_extrato, sem passar pelo banco
+    motor = MotorRegras(gerar_regras(QUANTIDADE_REGRAS, rng))
+    df_caixa['Descricao'] = df_caixa['Descricao'].fillna('').astype(str)
+    df_caixa['Subtopico'] = motor.categorizar_serie(df_caixa['Descricao'])
+    dataframes['extrato_categorizado'] = df_caixa
+
+    df_relatorio = montar_relatorio(df_caixa, df_csv, rng)
+    dataframes['conciliacao'] = list(conciliar_dataframes(
+        df_caixa[['Data', 'Descricao', 'Valor', 'Topico']], df_relatorio, tolerancia_dias=2, tolerancia_valor=0.05
+    ))
+    return dataframes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=20000)
+    parser.add_argument('--colunas', action='store_true', help="Mostra também a memória de cada coluna.")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        dataframes = montar_dataframes(args.linhas, random.Random(args.semente))
+
+    print(f"Linhas: {args.linhas}")
+    for nome, df in dataframes.items():
+        partes = df if isinstance(df, list) else [df]
+        linhas = sum(len(parte) for parte in partes)
+        print(f"{nome:24} {sum(megabytes(parte) for parte in partes):8.2f} MB | {linhas:7} linhas")
+        if args.colunas:
+            for parte in partes:
+                for coluna, tamanho in parte.memory_usage(index=False, deep=True).items():
+                    print(f"    {coluna:22} {str(parte[coluna].dtype):10} {tamanho / 1024 / 1024:8.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
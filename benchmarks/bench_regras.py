@@ -0,0 +1,83 @@
+"""
+Compara o laço antigo de categorização (uma busca por regra, por transação)
+com o autômato do MotorRegras.
+
+Uso: python -m benchmarks.bench_regras --regras 500 --transacoes 20000
+"""
+
+import argparse
+import random
+import string
+import time
+
+import pandas as pd
+
+from analisador.motor_regras import MotorRegras
+
+
+def gerar_regras(quantidade, rng):
+    regras = []
+    for i in range(quantidade):
+        palavra = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(4, 12)))
+        regras.append((palavra, f'Categoria {i % 40}'))
+    return regras
+
+
+def gerar_descricoes(quantidade, regras, rng):
+    descricoes = []
+    for _ in range(quantidade):
+        partes = ['PIX RECEBIDO', ''.join(rng.choices(string.ascii_uppercase + ' ', k=rng.randint(10, 40)))]
+        # Aproximadamente metade das descrições contém alguma palavra-chave.
+        if rng.random() < 0.5:
+            partes.append(rng.choice(regras)[0].lower())
+        descricoes.append(' - '.join(partes))
+    return descricoes
+
+
+def categorizar_laco_antigo(descricoes, regras):
+    regras_de_categorizacao = {palavra_chave: categoria for palavra_chave, categoria in regras}
+
+    def categorizar_transacao(descricao):
+        if not isinstance(descricao, str): return 'Não categorizado'
+        for palavra_chave, categoria in regras_de_categorizacao.items():
+            if palavra_chave.lower() in descricao.lower(): return categoria
+        return 'Não categorizado'
+
+    return descricoes.apply(categorizar_transacao)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--regras', type=int, default=500)
+    parser.add_argument('--transacoes', type=int, default=20000)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    regras = gerar_regras(args.regras, rng)
+    descricoes = pd.Series(gerar_descricoes(args.transacoes, regras, rng))
+
+    inicio = time.perf_counter()
+    resultado_antigo = categorizar_laco_antigo(descricoes, regras)
+    tempo_antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    motor = MotorRegras(regras)
+    tempo_compilacao = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultado_novo = motor.categorizar_serie(descricoes)
+    tempo_novo = time.perf_counter() - inicio
+
+    if not resultado_antigo.equals(resultado_novo):
+        raise SystemExit("ERRO: o autômato retornou categorias diferentes do laço antigo.")
+
+    print(f"Regras: {args.regras} | Transações: {args.transacoes}")
+    print(f"Laço antigo:          {tempo_antigo:8.3f} s")
+    print(f"Compilação autômato:  {tempo_compilacao:8.3f} s")
+    print(f"Varredura autômato:   {tempo_novo:8.3f} s")
+    print(f"Ganho:                {tempo_antigo / max(tempo_novo + tempo_compilacao, 1e-9):8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compara o parser em streaming do extrato Sicoob HTML com a implementação
+original (árvore completa do BeautifulSoup) em arquivos de vários MB.
+Mede tempo e pico de memória (tracemalloc) da extração das linhas em cada
+modo; a padronização posterior (datas, valores) é a mesma nos dois.
+
+Uso: python -m benchmarks.bench_sicoob_html --linhas 20000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'analisador_web.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from analisador.motor_analise import _ler_linhas_sicoob_html, _ler_linhas_sicoob_html_bs4  # noqa: E402
+from benchmarks.gerador import gerar_html_sicoob  # noqa: E402
+
+
+def medir(conteudo, leitor):
+    # Tempo e memória em execuções separadas: o tracemalloc distorce o tempo.
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        linhas = list(leitor(io.BytesIO(conteudo)))
+        duracao = time.perf_counter() - inicio
+
+        tracemalloc.start()
+        list(leitor(io.BytesIO(conteudo)))
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return linhas, duracao, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--linhas', type=int, default=20000)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    conteudo = gerar_html_sicoob(args.linhas, random.Random(args.semente))
+    print(f"Arquivo: {len(conteudo) / 1024 / 1024:.1f} MB, {args.linhas} transações")
+
+    linhas_bs4, tempo_bs4, pico_bs4 = medir(conteudo, _ler_linhas_sicoob_html_bs4)
+    linhas_stream, tempo_stream, pico_stream = medir(conteudo, _ler_linhas_sicoob_html)
+
+    if linhas_bs4 != linhas_stream:
+        raise SystemExit("ERRO: os dois modos produziram linhas diferentes.")
+
+    print(f"BeautifulSoup: {tempo_bs4:7.2f} s | pico {pico_bs4 / 1024 / 1024:7.1f} MB")
+    print(f"Streaming:     {tempo_stream:7.2f} s | pico {pico_stream / 1024 / 1024:7.1f} MB")
+    print(f"Ganho: {tempo_bs4 / tempo_stream:.1f}x em tempo, {pico_bs4 / pico_stream:.1f}x em memória")
+
+
+if __name__ == '__main__':
+    main()
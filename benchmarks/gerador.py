@@ -0,0 +1,190 @@
+"""
+Gera extratos e relatórios sintéticos nos formatos que o motor_analise lê:
+Caixa (.xlsx), Sicoob (.xlsx), Sicoob (.html) e relatório CSV do
+"Seu Condomínio", de 1 mil a 1 milhão de linhas. Os arquivos grandes são
+escritos aos poucos (as planilhas com o openpyxl em modo write-only).
+
+Uso: python -m benchmarks.gerador --formato caixa_xlsx --linhas 100000 --saida extrato.xlsx
+"""
+
+import argparse
+import io
+import random
+
+import openpyxl
+
+CAIXA_XLSX = 'caixa_xlsx'
+SICOOB_XLSX = 'sicoob_xlsx'
+SICOOB_HTML = 'sicoob_html'
+CSV_SEU_CONDOMINIO = 'csv_seu_condominio'
+FORMATOS = (CAIXA_XLSX, SICOOB_XLSX, SICOOB_HTML, CSV_SEU_CONDOMINIO)
+
+# Mês/ano dos lançamentos gerados ('mm/aaaa').
+MES_PADRAO = '07/2025'
+
+DESCRICOES_RECEITA = ['Taxa de condomínio', 'Fundo de reserva', 'Juros por atraso', 'Multa por atraso', '"Consumo de gás, bloco A"']
+DESCRICOES_DESPESA = ['Energia elétrica', 'Água e esgoto', 'Manutenção elevador', 'Salários', '(-) Tarifas de recebimentos']
+
+# Vocabulário dos extratos em Excel: históricos do banco e contrapartes.
+HISTORICOS_CREDITO = ['PIX RECEBIDO', 'CRED TED', 'DEP DINHEIRO', 'CRED COBRANCA']
+HISTORICOS_DEBITO = ['PIX ENVIADO', 'PAGTO BOLETO', 'DEB AUTOMATICO', 'TARIFA PIX', 'TAR MANUT CONTA']
+CONTRAPARTES = [
+    'CEMIG DISTRIBUICAO SA', 'COPASA MG', 'ELEVADORES ATLAS', 'SEU CONDOMINIO LTDA', 'LIMPEZA TOTAL SERVICOS',
+    'JARDINAGEM VERDE', 'SEGURANCA NOTURNA ME', 'PADARIA SAO JOSE', 'CONDOMINO', 'ADMINISTRADORA PREDIAL',
+]
+
+
+def _formatar_reais(valor):
+    return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _lancamento(i, rng, mes=MES_PADRAO):
+    """Um lançamento genérico: (data 'dd/mm/aaaa', histórico, contraparte, valor com sinal)."""
+    data = f"{rng.randint(1, 28):02d}/{mes}"
+    credito = rng.random() < 0.5
+    historico = rng.choice(HISTORICOS_CREDITO if credito else HISTORICOS_DEBITO)
+    contraparte = rng.choice(CONTRAPARTES)
+    if contraparte == 'CONDOMINO':
+        contraparte = f"CONDOMINO {rng.randint(1, 500)} - APTO {rng.randint(1, 300)}"
+    valor = rng.randint(1, 9999999) / 100
+    return data, historico, contraparte, valor if credito else -valor
+
+
+# --- SICOOB HTML ---
+
+def _pedacos_html_sicoob(quantidade, rng, mes=MES_PADRAO):
+    yield (
+        "<html><body><table><tr><td>SICOOB - Extrato de Conta Corrente</td></tr></table>"
+        "<table><thead><tr><th>DATA</th><th>DOCUMENTO</th><th>HISTÓRICO</th><th>VALOR</th></tr></thead><tbody>\n"
+    )
+    linhas = []
+    for i in range(quantidade):
+        data = f"{rng.randint(1, 28):02d}/{mes}"
+        valor = _formatar_reais(rng.randint(1, 9999999) / 100)
+        valor += rng.choice('CD')
+        if i % 25 == 0:
+            linhas.append(f"<tr><td>{data}</td><td></td><td>SALDO DO DIA</td><td>{valor}</td></tr>")
+        descricao = f"PIX RECEBIDO - OUTRA IF<br>DOC.: {i:08d}<br>CONDOMINO {rng.randint(1, 500)} - APTO {rng.randint(1, 300)}"
+        linhas.append(f"<tr><td>{data}</td><td>{i:08d}</td><td>{descricao}</td><td>{valor}</td></tr>")
+        if len(linhas) >= 10000:
+            yield "\n".join(linhas) + "\n"
+            linhas = []
+    if linhas:
+        yield "\n".join(linhas) + "\n"
+    yield "</tbody></table></body></html>"
+
+
+def gerar_html_sicoob(quantidade, rng, mes=MES_PADRAO):
+    return ''.join(_pedacos_html_sicoob(quantidade, rng, mes)).encode('utf-8')
+
+
+# --- RELATÓRIO CSV "SEU CONDOMÍNIO" ---
+
+def _pedacos_csv_seu_condominio(quantidade, rng, proporcao_valor_vazio=0.0, mes=MES_PADRAO):
+    linhas = ['pagador_fornecedor,conta,fornecedor,data,valor', 'Relatório de Receitas e Despesas,,,,', 'RECEITAS,,,,',
+              'Descrição,Conta,Fornecedor,Contabilizado em,Valor']
+    for i in range(quantidade):
+        if i == quantidade // 2:
+            linhas += ['Total de receitas,,,,', 'DESPESAS,,,,']
+        descricoes = DESCRICOES_RECEITA if i < quantidade // 2 else DESCRICOES_DESPESA
+        valor = '' if rng.random() < proporcao_valor_vazio else f"{rng.uniform(1, 5000):.2f}"
+        linhas.append(f"{rng.choice(descricoes)},Conta {i % 7},FORNECEDOR {i % 300},{rng.randint(1, 28):02d}/{mes},{valor}")
+        if len(linhas) >= 10000:
+            yield '\n'.join(linhas) + '\n'
+            linhas = []
+    if linhas:
+        yield '\n'.join(linhas) + '\n'
+
+
+def gerar_csv_seu_condominio(quantidade, rng, proporcao_valor_vazio=0.0, mes=MES_PADRAO):
+    return ''.join(_pedacos_csv_seu_condominio(quantidade, rng, proporcao_valor_vazio, mes)).encode('utf-8')
+
+
+# --- PLANILHAS (CAIXA E SICOOB) ---
+
+def _linhas_caixa(quantidade, rng, mes=MES_PADRAO):
+    yield ['Extrato de Conta Corrente - CAIXA']
+    yield ['Agência: 0001 | Conta: 00012345-6']
+    yield []
+    yield ['Data Lançamento', 'Nº Documento', 'Histórico', 'Nome/Razão Social', 'Valor Lançamento', 'Saldo']
+    yield [f'01/{mes}', '', 'SALDO ANTERIOR', '', 0, 10000.0]
+    saldo = 10000.0
+    for i in range(quantidade):
+        data, historico, contraparte, valor = _lancamento(i, rng, mes)
+        # Parte dos lançamentos vem sem contraparte (o processamento usa o histórico)
+        nome = '' if historico.startswith('TAR') or rng.random() < 0.15 else contraparte
+        saldo = round(saldo + valor, 2)
+        yield [data, f'{i:06d}', historico, nome, valor, saldo]
+
+
+def _linhas_sicoob(quantidade, rng, mes=MES_PADRAO):
+    yield ['SICOOB - Sistema de Cooperativas de Crédito do Brasil']
+    yield ['Extrato de Conta Corrente']
+    yield []
+    yield ['DATA', 'DOCUMENTO', 'HISTÓRICO', 'VALOR']
+    for i in range(quantidade):
+        data, historico, contraparte, valor = _lancamento(i, rng, mes)
+        valor_texto = _formatar_reais(abs(valor)) + ('C' if valor > 0 else 'D')
+        yield [data, f'{i:08d}', f'{historico} - {contraparte}', valor_texto]
+
+
+def _gravar_planilha(destino, linhas):
+    pasta = openpyxl.Workbook(write_only=True)
+    planilha = pasta.create_sheet('Extrato')
+    for linha in linhas:
+        planilha.append(linha)
+    pasta.save(destino)
+
+
+def gerar_xlsx_caixa(quantidade, rng, mes=MES_PADRAO):
+    destino = io.BytesIO()
+    _gravar_planilha(destino, _linhas_caixa(quantidade, rng, mes))
+    return destino.getvalue()
+
+
+def gerar_xlsx_sicoob(quantidade, rng, mes=MES_PADRAO):
+    destino = io.BytesIO()
+    _gravar_planilha(destino, _linhas_sicoob(quantidade, rng, mes))
+    return destino.getvalue()
+
+
+GERADORES = {
+    CAIXA_XLSX: gerar_xlsx_caixa,
+    SICOOB_XLSX: gerar_xlsx_sicoob,
+    SICOOB_HTML: gerar_html_sicoob,
+    CSV_SEU_CONDOMINIO: gerar_csv_seu_condominio,
+}
+
+
+def gravar_arquivo(formato, quantidade, rng, caminho, mes=MES_PADRAO):
+    """Grava direto em disco, sem montar o arquivo inteiro na memória."""
+    if formato == CAIXA_XLSX:
+        _gravar_planilha(caminho, _linhas_caixa(quantidade, rng, mes))
+        return
+    if formato == SICOOB_XLSX:
+        _gravar_planilha(caminho, _linhas_sicoob(quantidade, rng, mes))
+        return
+    if formato == SICOOB_HTML:
+        pedacos = _pedacos_html_sicoob(quantidade, rng, mes)
+    else:
+        pedacos = _pedacos_csv_seu_condominio(quantidade, rng, mes=mes)
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        for pedaco in pedacos:
+            arquivo.write(pedaco)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--formato', choices=FORMATOS, required=True)
+    parser.add_argument('--linhas', type=int, default=10000)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--mes', default=MES_PADRAO, help="Mês dos lançamentos, 'mm/aaaa'.")
+    parser.add_argument('--saida', required=True)
+    args = parser.parse_args()
+
+    gravar_arquivo(args.formato, args.linhas, random.Random(args.semente), args.saida, args.mes)
+    print(f"{args.saida}: {args.linhas} lançamentos ({args.formato})")
+
+
+if __name__ == '__main__':
+    main()